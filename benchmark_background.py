@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# coding: utf-8
+import os
+__doc__ = """
+Compare the background models (see count_with_pi.py --background) on
+recorded frames.
+
+All the models process the same frames. For each model the time per frame,
+the part of the frame that is foreground, the overlap of the fgmask with
+the fgmask of the reference model and the number of tracks found are
+printed. Choose the cheapest model, that still finds the same tracks as
+the reference.
+
+Usage:
+    {filename} [options] <image_directory> [--verbose|--debug]
+
+Options:
+    -h, --help                      This help message.
+    -d, --debug                     Output a lot of info..
+    -v, --verbose                   Output less less info.
+    --log-filename=logfilename      Name of the log file.
+    --from=<time>                   Only use the frames from this time.
+                                    See count_with_images.py.
+    --to=<time>                     Only use the frames until this time.
+    --engines=<engines>             Comma separated list of the models to
+                                    compare. Default: All.
+    --reference=<engine>            The fgmasks are compared with the
+                                    fgmasks of this model. [default: mog].
+    --max-frames=<n>                Stop after this many frames.
+    --track-match-radius=<radius>   Track match radius. See
+                                    count_with_images.py. [default: 25]
+    --roi=<roi>                     Region of interest. See count_with_pi.py.
+""".format(filename=os.path.basename(__file__))
+
+import time
+import itertools
+import numpy as np
+import objecttracker
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+
+def read_frames(path, time_from=None, time_to=None):
+    """
+    Yields (frame, timestamp) for the frames (png files or segments)
+    in path.
+    """
+    if len(objecttracker.segment.segment_prefixes(path)) > 0:
+        for frame, timestamp in objecttracker.segment.read_frames(
+                path, time_from, time_to):
+            yield frame, timestamp
+        return
+
+    files = None
+    if time_from is not None and time_to is not None:
+        files = objecttracker.manifest.frame_files(path, time_from, time_to)
+    for frame, timestamp in objecttracker.frame_source.DirectoryFrameSource(
+            path, files=files):
+        yield frame, timestamp
+
+
+class EngineResult(object):
+    """
+    The measurements of one background model.
+    """
+    def __init__(self, engine, pipeline):
+        self.engine = engine
+        self.pipeline = pipeline
+        self.seconds = 0.0
+        self.frames = 0
+        self.foreground_pixels = 0
+        self.pixels = 0
+        self.intersection = 0
+        self.union = 0
+        self.tracks = 0
+
+    def add(self, seconds, number_of_tracks, reference_fgmask):
+        fgmask = self.pipeline.fgmask > 0
+        reference = reference_fgmask > 0
+        self.seconds += seconds
+        self.frames += 1
+        self.tracks += number_of_tracks
+        self.foreground_pixels += np.count_nonzero(fgmask)
+        self.pixels += fgmask.size
+        self.intersection += np.count_nonzero(fgmask & reference)
+        self.union += np.count_nonzero(fgmask | reference)
+
+    def __str__(self):
+        frames = max(self.frames, 1)
+        overlap = 1.0
+        if self.union > 0:
+            overlap = float(self.intersection) / self.union
+        return "%-22s %8.2f %10.2f%% %10.2f %8i" % (
+            self.engine,
+            1000 * self.seconds / frames,
+            100.0 * self.foreground_pixels / max(self.pixels, 1),
+            overlap,
+            self.tracks)
+
+
+if __name__ == "__main__":
+    import docopt
+    args = docopt.docopt(__doc__, version="1.0")
+
+    if args["--debug"]:
+        logging.basicConfig(filename=args["--log-filename"],
+                            level=logging.DEBUG)
+    elif args["--verbose"]:
+        logging.basicConfig(filename=args["--log-filename"],
+                            level=logging.INFO)
+    else:
+        logging.basicConfig(filename=args["--log-filename"],
+                            level=logging.WARNING)
+    LOG.info(args)
+
+    engines = sorted(objecttracker.background.ENGINES)
+    if args["--engines"] is not None:
+        engines = args["--engines"].split(",")
+    reference_engine = args["--reference"]
+    if reference_engine not in engines:
+        engines.insert(0, reference_engine)
+    track_match_radius = int(args["--track-match-radius"])
+
+    time_from = time_to = None
+    if args["--from"] is not None:
+        time_from = objecttracker.manifest.parse_time(args["--from"])
+    if args["--to"] is not None:
+        time_to = objecttracker.manifest.parse_time(args["--to"])
+
+    frames = read_frames(args["<image_directory>"], time_from, time_to)
+    if args["--max-frames"] is not None:
+        frames = itertools.islice(frames, int(args["--max-frames"]))
+
+    results = None
+    for raw_frame, timestamp in frames:
+        if results is None:
+            # The region of interest needs the frame size.
+            roi = None
+            if args["--roi"] is not None:
+                roi = objecttracker.region_of_interest.RegionOfInterest.\
+                    from_string(args["--roi"], raw_frame.shape)
+            results = [EngineResult(engine, objecttracker.Pipeline(
+                track_match_radius, roi=roi, background_engine=engine))
+                for engine in engines]
+            reference = results[engines.index(reference_engine)]
+
+        number_of_tracks = []
+        for result in results:
+            start = time.time()
+            tracks_to_save = result.pipeline.process(raw_frame, timestamp,
+                                                     keep_raw_frame=False)
+            number_of_tracks.append((time.time() - start,
+                                     len(tracks_to_save)))
+
+        for result, (seconds, tracks) in zip(results, number_of_tracks):
+            result.add(seconds, tracks, reference.pipeline.fgmask)
+
+    if results is None:
+        print "No frames found."
+    else:
+        for result in results:
+            result.tracks += len(result.pipeline.flush())
+
+        print "%i frames. Overlap is with the '%s' fgmask." % (
+            reference.frames, reference_engine)
+        print "%-22s %8s %11s %10s %8s" % (
+            "Engine", "ms/frame", "Foreground", "Overlap", "Tracks")
+        for result in results:
+            print result
@@ -3,6 +3,7 @@
 import os
 __doc__ = """Usage:
     {filename} [options] <image_directory> [--verbose|--debug]
+    {filename} [options] <image_directory> --from=<time> --to=<time> [--verbose|--debug]
 
 Options:
     -h, --help                      This help message.
@@ -11,6 +12,16 @@ Options:
     --log-filename=logfilename      Name of the log file.
     --frames-path=<path>            Where to find the frames,
                                     [default: /tmp/frames].
+    --from=<time>                   Only replay the frames from this time.
+                                    The image directory must contain the
+                                    hour directories (see count_with_pi.py
+                                    --record-frames-path). Only the hour
+                                    directories in the range are read.
+                                    Format: YYYY-mm-ddTHH:MM[:SS].
+                                    Segments (see count_with_pi.py
+                                    --record-format) are read directly
+                                    from the time.
+    --to=<time>                     Only replay the frames until this time.
     --save-tracks                   Save the tracks to disk. Set the path
                                     by --tracks-save-path
     --tracks-save-path=<path>       Where to save the tracks,
@@ -29,6 +40,14 @@ Options:
                                     If not set, default value is calculated
                                     from frame size and framerate.
                                     [default: 25]
+    --roi=<roi>                     Region of interest. See count_with_pi.py.
+    --background=<engine>           The background model. See
+                                    count_with_pi.py. [default: mog].
+    --motion-gate                   Skip the frames where nothing moves.
+                                    See count_with_pi.py.
+    --morphology=<chain>            The morphological operations run on the
+                                    fgmask. See count_with_pi.py.
+                                    [default: close:15].
 """.format(filename=os.path.basename(__file__))
 
 import cv2
@@ -45,48 +64,55 @@ import os
 LOG = logging.getLogger(__name__)
 
 
-def get_frames(path, raw_frames):
+def get_frames(path, raw_frames, raw_buffer, time_from=None, time_to=None):
     """
     Inserts frames into the raw frames queue.
     Each frame gets a timestamp attached.
 
-    The raw frames must be a multiprocessing.Queue
-    (multiprocessing.queues.Queue).
+    The frame is written to the raw buffer, and only the slot
+    index is put into the queue.
+
+    The raw frames must be a objecttracker.frame_queue.FrameQueue.
+    When it is full, the frame reader waits.
+
+    If time_from and time_to are set, path must contain hour directories,
+    and the frames are found with the manifests (see
+    objecttracker.manifest).
+
+    If path contains segments (see count_with_pi.py --record-format), the
+    frames are read from the segments.
     """
-    assert(isinstance(raw_frames, multiprocessing.queues.Queue))
-
-    # Find all the png files in path and its subdirectories.
-    for root, dirs, files in os.walk(path):
-        LOG.debug("Current dir, '%s': %i files." % (root, len(files)))
-
-        # Sort the files. The files are saved by time stamp, so this
-        # ensures that the frames come in ascending order.
-        files.sort()
-
-        # Find all the png files and put them into the raw frames
-        # queue / buffer.
-        for filename in files:
-            # Filter out only files ending with png.
-            # Example filename: 2015-05-03T12:55:15.462884.png
-            if filename.endswith(".png"):
-                # Extract the timestamp from the filename.
-                # Example filename above.
-                timestamp = datetime.datetime.strptime(
-                    filename,
-                    "%Y-%m-%dT%H:%M:%S.%f.png")
-
-                # Read the file into a frame , which is a numpy.ndarray.
-                raw_frame = cv2.imread(os.path.join(root, filename))
-
-                # Put the frame and timestamp into the buffer / queue.
-                raw_frames.put([raw_frame, timestamp])
-
-                if raw_frames.qsize() > 100:
-                    time.sleep(1)
-
-def do_it(raw_frames, track_match_radius, min_linear_length, stdin):
-    fgbg = cv2.BackgroundSubtractorMOG()
-    tracks = []
+    assert(isinstance(raw_frames, objecttracker.frame_queue.FrameQueue))
+
+    # Find all the png files in path and its subdirectories and put
+    # them into the raw frames queue / buffer. The frames are decoded
+    # directly into the raw buffer by a pool of threads.
+    if len(objecttracker.segment.segment_prefixes(path)) > 0:
+        for raw_frame, timestamp in objecttracker.segment.read_frames(
+                path, time_from, time_to):
+            raw_frames.put([raw_buffer.write(raw_frame), timestamp])
+        return
+
+    files = None
+    if time_from is not None and time_to is not None:
+        files = objecttracker.manifest.frame_files(path, time_from, time_to)
+    frame_source = objecttracker.frame_source.DirectoryFrameSource(
+        path, frame_buffer=raw_buffer, files=files)
+    for raw_slot, timestamp in frame_source:
+        # Put the slot and timestamp into the queue.
+        raw_frames.put([raw_slot, timestamp])
+
+
+def do_it(raw_frames, raw_buffer, track_match_radius, min_linear_length,
+          stdin, roi=None, background_engine="mog", motion_gate=False,
+          morphology_chain="close:15"):
+    gate = None
+    if motion_gate:
+        gate = objecttracker.motion.MotionGate()
+    pipeline = objecttracker.Pipeline(track_match_radius, roi=roi,
+                                      background_engine=background_engine,
+                                      motion_gate=gate,
+                                      morphology_chain=morphology_chain)
     tracks_to_save = []
     ff = True
 
@@ -97,28 +123,24 @@ def do_it(raw_frames, track_match_radius, min_linear_length, stdin):
             ff = False
 
         LOG.debug("Getting frame")
-        raw_frame, timestamp = raw_frames.get(block=True)
+        raw_slot, timestamp = raw_frames.get(block=True)
         LOG.debug("Foreground extractor: Got a frame. Number in queue: %i." %
                   raw_frames.qsize())
 
-        # Get the foreground.
-        fgmask = objecttracker.get_foreground(fgbg, raw_frame)
-    
-        # print np.unique(fgmask)
-        # fgmask = np.array(np.where(fgmask == 255, 255, 0), dtype=np.uint8)
+        # The trackpoints keep the frame, so it is copied out of the
+        # shared buffer.
+        raw_frame = raw_buffer.read(raw_slot).copy()
+        raw_buffer.release(raw_slot)
 
-        # eroded_fgmask = objecttracker.erode(fgmask)
-        kernel = np.ones((15,15), dtype=np.uint8)
-        # fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, kernel)
-        fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_CLOSE, kernel, iterations=1)
+        # Foreground extraction, closing and tracking.
+        tracks_to_save = pipeline.process(raw_frame, timestamp)
 
-        total_tracks = len(tracks) + len(tracks_to_save)
+        total_tracks = len(pipeline.tracks) + len(tracks_to_save)
         # print total_tracks
         # print ""
-        # dilated_fgmask = objecttracker.dilate(fgmask)
         if False and total_tracks > 0:
-            fg = fgmask.copy()
-            for t in tracks:
+            fg = pipeline.fgmask.copy()
+            for t in pipeline.tracks:
                 t.draw_points(fg, (100,))
             for t in tracks_to_save:
                 t.draw_points(fg, (150,))
@@ -132,13 +154,6 @@ def do_it(raw_frames, track_match_radius, min_linear_length, stdin):
                 print "ff"
                 ff = True
 
-        tracks, tracks_to_save = objecttracker.get_tracks_to_save(fgmask,
-                                                                  raw_frame,
-                                                                  timestamp,
-                                                                  tracks,
-                                                                  track_match_radius)
-
-
         cv2.namedWindow('image', cv2.WINDOW_NORMAL)
 
         for track_to_save in tracks_to_save:
@@ -155,15 +170,8 @@ def do_it(raw_frames, track_match_radius, min_linear_length, stdin):
                 else:
                     direction =  "right"
 
-                size = track_to_save.avg_size()
-                if size < 700 and track_to_save.length_avg() < 4:
-                    expected_type = "pers."
-                elif size < 2000:
-                    expected_type = "bike"
-                elif size < 10000:
-                    expected_type = "car"
-                else:
-                    expected_type = "truck"
+                expected_type = objecttracker.counting.classify(
+                    track_to_save.avg_size(), track_to_save.length_avg())
 
             if not valid:
                 text = "Invalid"
@@ -216,10 +224,27 @@ if __name__ == "__main__":
     track_match_radius = int(args["--track-match-radius"]) #min_linear_length / 10
     print "Track match radius", track_match_radius
 
+    time_from = time_to = None
+    if args['--from'] is not None:
+        time_from = objecttracker.manifest.parse_time(args['--from'])
+        time_to = objecttracker.manifest.parse_time(args['--to'])
+
+    roi = None
+    if args['--roi'] is not None:
+        roi = objecttracker.region_of_interest.RegionOfInterest.from_string(
+            args['--roi'], (resolution[1], resolution[0]))
+
     # The frames queue is a list queue with list items.
     # Each item is a list with a timestamp and an image:
     # E.g. [<timestamp>, <image>]
-    raw_frames = multiprocessing.Queue()
+    # No frames must be lost when reading from a directory, so the
+    # frame reader blocks when the queue is full.
+    raw_frames = objecttracker.frame_queue.FrameQueue(100, "block")
+
+    # The frames are kept in shared memory. The queue only carries the
+    # slot indices.
+    raw_buffer = objecttracker.framebuffer.FrameRingBuffer(
+        128, (resolution[1], resolution[0], 3))
 
     # The only purpose of the framereader is to read the frames
     # from the camera / directory and put them into a buffer (frames queue).
@@ -229,7 +254,8 @@ if __name__ == "__main__":
     # be adjusted.
     frame_reader = multiprocessing.Process(
         target=get_frames,
-        args=(args['<image_directory>'], raw_frames)
+        args=(args['<image_directory>'], raw_frames, raw_buffer,
+              time_from, time_to)
         )
     frame_reader.daemon = True
     frame_reader.start()
@@ -240,7 +266,9 @@ if __name__ == "__main__":
     # It also puts the data into the database.
     do_iter = multiprocessing.Process(
         target=do_it,
-        args=(raw_frames, track_match_radius, min_linear_length, new_stdin)
+        args=(raw_frames, raw_buffer, track_match_radius, min_linear_length,
+              new_stdin, roi, args['--background'], args['--motion-gate'],
+              args['--morphology'])
         )
     do_iter.daemon = True
     do_iter.start()
@@ -27,17 +27,125 @@ Options:
                                     images / second. [default: 16].
     --record-frames-path=<path>     Where to save the frames.
                                     [default: /data/frames].
+    --record-format=<format>        How the frames are saved:
+                                    "png": A png file for each frame.
+                                    "segments": Raw frames appended to a
+                                    file for each hour.
+                                    [default: png].
     --save-tracks                   Save the tracks to disk. Set the path
                                     by --tracks-save-path
+    --frame-retention=<policy>      Which pixels the tracks keep, to be
+                                    saved with --save-tracks:
+                                    "all": The whole frame of each
+                                    trackpoint.
+                                    "crops": Only the object (the rest
+                                    of the saved frames is black).
+                                    "middle": The frame in the middle of
+                                    the track.
+                                    "every:<n>": The frame of every n-th
+                                    trackpoint.
+                                    "none": No frames.
+                                    [default: crops].
+    --relink-window=<seconds>       An ended track is kept this long, to be
+                                    connected with a new track of the same
+                                    object, e.g. when it has been hidden
+                                    behind a bus. The tracks are saved
+                                    this much later. 0 to only connect
+                                    with the current tracks. [default: 2].
+    --track-budget=<trackpoints>    Max number of trackpoints kept in a
+                                    track, so a parked car or a slow
+                                    pedestrian does not use more and more
+                                    memory. [default: 256].
+    --track-budget-policy=<policy>  Which trackpoints are kept, when a
+                                    track is over the budget:
+                                    "decimate": Evenly spaced along the
+                                    track.
+                                    "ring": The most recent.
+                                    "max-age:<seconds>": The ones from the
+                                    last seconds.
+                                    "none": All.
+                                    [default: decimate].
+    --stationary-radius=<pixels>    A stopped object, that stays within
+                                    this many pixels of where it stopped,
+                                    only keeps two trackpoints: Where it
+                                    stopped, and where it is. 0 keeps
+                                    them all. Not used by the budget
+                                    policy "none". [default: 2].
+    --counting=<file>               Count the objects crossing the counting
+                                    lines, or entering and exiting the
+                                    counting zones, of the camera in this
+                                    json file, as they move. The counts are
+                                    saved to the counts table. See
+                                    objecttracker/counting.py.
     --tracks-save-path=<path>       Where to save the tracks,
                                     [default: /data/tracks].
     --automatic-white-ballance      Automatically set white ballance.
+    --frame-buffer-slots=<slots>    Number of frames, that can be in the
+                                    pipeline at the same time. The frames
+                                    are kept in shared memory.
+                                    [default: 256].
+    --topology=<topology>           How the frames are processed:
+                                    "multiprocess": One process for each of
+                                    the foreground extraction, closing and
+                                    tracking.
+                                    "fused": All in one process.
+                                    [default: multiprocess].
+    --queue-size=<size>             Max number of frames in each queue
+                                    between the stages. [default: 32].
+    --drop-policy=<policy>          What to do when a queue is full:
+                                    "block", "drop-oldest", "drop-newest"
+                                    or "every-nth" (keep every nth frame,
+                                    see --keep-every-nth). The frame
+                                    reader always blocks, when the frames
+                                    are recorded (--record-frames-only).
+                                    [default: block].
+    --keep-every-nth=<n>            Used by the "every-nth" drop policy.
+                                    [default: 2].
+    --stats-interval=<seconds>      How often the queue sizes and the
+                                    throughput are printed.
+                                    [default: 1800].
+    --stats-file=<path>             Write per stage metrics (frames in/out,
+                                    processing time, time in the input
+                                    queue, idle time and latency
+                                    histograms) as json to this file.
+    --stats-file-interval=<seconds> How often the stats file is written.
+                                    [default: 10].
+    --roi=<roi>                     Region of interest. Only this part of
+                                    the frame is processed. A rectangle
+                                    "x,y,width,height" or a polygon
+                                    "x1,y1;x2,y2;x3,y3;...", in pixels.
+                                    Default: The whole frame.
+    --background=<engine>           The background model: "mog", "mog2",
+                                    "running-average", "running-average-diff"
+                                    (only compared with the background, when
+                                    the frame has changed), "median" or
+                                    "frame-difference". The cheaper models
+                                    can be compared on recorded frames with
+                                    benchmark_background.py.
+                                    [default: mog].
+    --morphology=<chain>            The morphological operations run on the
+                                    fgmask, in one go: A comma separated
+                                    list of <operation>:<size>[:<iterations>]
+                                    where operation is "open", "close",
+                                    "erode" or "dilate", and size is the
+                                    size of the kernel in pixels. E.g.
+                                    "open:5,close:15" to remove noise, and
+                                    then fill holes. "none" for nothing.
+                                    [default: close:15].
+    --motion-gate                   Skip the frames where nothing moves,
+                                    when no objects are tracked. The
+                                    frame is compared with the previous
+                                    frame at 1/8 of the size.
+    --background-update-interval=<frames>
+                                    When frames are skipped by the motion
+                                    gate, the background model is still
+                                    updated every this many frames.
+                                    [default: 16].
 """.format(filename=os.path.basename(__file__))
 
 import time
 import datetime
 import objecttracker
-import multiprocessing
 from picamera.array import PiRGBArray
 from picamera import PiCamera
 import cv2
@@ -61,8 +169,12 @@ else:
 LOG.debug(args)
 
 
-def get_frames(frames_queue, resolution, framerate,
-               automatic_white_ballance=False):
+def get_frames(frames_queue, raw_buffer, resolution, framerate,
+               automatic_white_ballance=False, stopping=None):
+    """
+    Puts the frames of the camera into the frames queue, until stopping
+    (an event) is set. Then the end of the frames is put into the queue.
+    """
     camera = PiCamera()
     camera.resolution = resolution
     camera.framerate = framerate  # 16 #30
@@ -93,20 +205,60 @@ def get_frames(frames_queue, resolution, framerate,
     for frame in camera.capture_continuous(rawCapture,
                                            format="bgr",
                                            use_video_port=True):
-        frames_queue.put([frame.array, datetime.datetime.now()])
+        if stopping is not None and stopping.is_set():
+            break
+        frames_queue.put([raw_buffer.write(frame.array),
+                          datetime.datetime.now()])
         # TODO: Set camera attributes by time or camera darkness or something.
         # It should change very slowly.
         rawCapture.truncate(0)
+    camera.close()
+    LOG.info("Camera stopped.")
+    frames_queue.put_end()
 
 
-def save_frames(frames_queue, save_path):
+def print_stats(stats):
+    print stats
+
+
+def save_frames(frames_queue, raw_buffer, save_path):
+    """
+    Saves the frames in a directory for each hour. Each frame is added
+    to the manifest of the directory, so it can be found without
+    listing the directory.
+    """
+    manifest_writer = objecttracker.manifest.ManifestWriter()
     while True:
-        frame, stamp = frames_queue.get(block=True)
+        item = frames_queue.get(block=True)
+        if item is objecttracker.frame_queue.END_OF_FRAMES:
+            manifest_writer.close()
+            return
+        slot, stamp = item
         directory = os.path.join(save_path, stamp.strftime("%Y%m%dT%H"))
         if not os.path.isdir(directory):
             os.makedirs(directory)
-        cv2.imwrite(os.path.join(directory, "%s.png" % stamp.isoformat()),
-                    frame)
+        filename = "%s.png" % stamp.isoformat()
+        cv2.imwrite(os.path.join(directory, filename), raw_buffer.read(slot))
+        raw_buffer.release(slot)
+        manifest_writer.add(directory, filename)
+
+
+def save_frames_to_segments(frames_queue, raw_buffer, save_path):
+    """
+    Appends the frames to a segment file for each hour.
+    See objecttracker.segment.
+    """
+    if not os.path.isdir(save_path):
+        os.makedirs(save_path)
+    segment_writer = objecttracker.segment.SegmentWriter(save_path)
+    while True:
+        item = frames_queue.get(block=True)
+        if item is objecttracker.frame_queue.END_OF_FRAMES:
+            segment_writer.close()
+            return
+        slot, stamp = item
+        segment_writer.write(raw_buffer.read(slot), stamp)
+        raw_buffer.release(slot)
 
 
 if __name__ == "__main__":
@@ -132,110 +284,177 @@ if __name__ == "__main__":
         track_match_radius = 2 * min_linear_length / int(args['--frame-rate'])
     LOG.info("Track match radius: %i" % (track_match_radius))
 
+    if args['--topology'] not in ("multiprocess", "fused"):
+        raise ValueError("Unknown topology: '%s'." % args['--topology'])
+    # Fails before the processes are started.
+    objecttracker.frame_store.parse_retention(args["--frame-retention"])
+    objecttracker.budget.parse_policy(args["--track-budget-policy"])
+    if args["--counting"] is not None:
+        objecttracker.counting.Counter.from_file(args["--counting"])
+
     if not args["--save-tracks"]:
         LOG.info("Tracks will not be saved... \
 Use --save-tracks to save tracks.")
 
-    raw_frames = multiprocessing.Queue()
-    foreground_frames = multiprocessing.Queue()
-    # eroded_frames = multiprocessing.Queue()
-    closed_frames = multiprocessing.Queue()
-    # dilated_frames = multiprocessing.Queue()
-    tracks_to_save = multiprocessing.Queue()
+    # The frames are kept in shared memory. The queues only carry the
+    # slot indices.
+    frame_shape = (resolution[1], resolution[0])
+    number_of_slots = int(args['--frame-buffer-slots'])
+    raw_buffer = objecttracker.framebuffer.FrameRingBuffer(
+        number_of_slots, frame_shape + (3, ))
+
+    # The foreground masks only cover the region of interest.
+    roi = None
+    mask_shape = frame_shape
+    if args['--roi'] is not None:
+        roi = objecttracker.region_of_interest.RegionOfInterest.from_string(
+            args['--roi'], frame_shape)
+        mask_shape = roi.shape
+    mask_buffer = objecttracker.framebuffer.FrameRingBuffer(
+        number_of_slots, mask_shape)
+
+    # The queues between the stages are bounded. When a stage falls
+    # behind, frames are dropped (or the producer blocks) according to
+    # the drop policy.
+    queue_size = int(args['--queue-size'])
+    drop_policy = args['--drop-policy']
+    if args['--record-frames-only'] and drop_policy != "block":
+        # The recorded frames are reprocessed later, so none are lost.
+        LOG.warning("The drop policy '%s' is not used, when the frames are \
+recorded. No frames are dropped." % drop_policy)
+        drop_policy = "block"
+    keep_every_nth = int(args['--keep-every-nth'])
+    if number_of_slots < 3 * queue_size + 8:
+        LOG.warning("There are fewer frame buffer slots (%i) than the \
+queues can hold. The frame reader will block instead of dropping frames." %
+                    number_of_slots)
+
+    raw_frames = objecttracker.frame_queue.FrameQueue(
+        queue_size, drop_policy, keep_every_nth, buffers=(raw_buffer, ))
+    foreground_frames = objecttracker.frame_queue.FrameQueue(
+        queue_size, drop_policy, buffers=(mask_buffer, raw_buffer))
+    closed_frames = objecttracker.frame_queue.FrameQueue(
+        queue_size, drop_policy, buffers=(mask_buffer, raw_buffer))
+
+    # Tracks are never dropped. They are the counts.
+    tracks_to_save = objecttracker.frame_queue.FrameQueue(queue_size,
+                                                          "block")
+
+    # The supervisor starts the processes, restarts them if they die,
+    # and prints the queue sizes every 30 minutes.
+    supervisor = objecttracker.supervisor.Supervisor(
+        stats_interval=int(args['--stats-interval']),
+        report=print_stats,
+        stats_filename=args['--stats-file'],
+        stats_file_interval=int(args['--stats-file-interval']))
+    # The slots held by a stage that dies are released, when it is
+    # restarted.
+    supervisor.add_buffer(raw_buffer)
+    supervisor.add_buffer(mask_buffer)
+
+    # The motion gate is shared by the foreground extractor and the
+    # tracker, which tells it if objects are tracked.
+    motion_gate = None
+    if args['--motion-gate']:
+        motion_gate = objecttracker.motion.MotionGate(
+            background_interval=int(args['--background-update-interval']))
+
+    # Metrics for each stage. They are written to the stats file.
+    stage_metrics = {}
+    for name in ("Pipeline", "Foreground extractor", "Closer", "Tracker",
+                 "Track saver"):
+        stage_metrics[name] = objecttracker.metrics.StageMetrics(name)
 
     # The frame reader puts the frames into the frames queue.
-    frame_reader = multiprocessing.Process(
-        target=get_frames,
-        args=(raw_frames, resolution, int(args['--frame-rate']),
-              args['--automatic-white-ballance']))
-    frame_reader.daemon = True
-    frame_reader.start()
-    LOG.info("Frames reader started.")
+    supervisor.add_stage(
+        "Frame reader",
+        get_frames,
+        (raw_frames, raw_buffer, resolution, int(args['--frame-rate']),
+         args['--automatic-white-ballance'], supervisor.stopping))
+    supervisor.add_queue("Raw frames", raw_frames)
 
     if args['--record-frames-only']:
-        frame_saver = multiprocessing.Process(target=save_frames,
-            args=(raw_frames, args['--record-frames-path']))
-        frame_saver.daemon = True
-        frame_saver.start()
+        if args['--record-format'] == "segments":
+            frame_saver = save_frames_to_segments
+        else:
+            frame_saver = save_frames
+        supervisor.add_stage(
+            "Frame saver",
+            frame_saver,
+            (raw_frames, raw_buffer, args['--record-frames-path']))
     else:
-        # The main purpose of the foreground extractor is to
-        # separate the foreground from the background.
-        foreground_extractor = multiprocessing.Process(
-            target=objecttracker.foreground_extractor,
-            args=(raw_frames, foreground_frames, args["--save-tracks"])
-            )
-        foreground_extractor.daemon = True
-        foreground_extractor.start()
-
-        
-        closer = multiprocessing.Process(
-            target=objecttracker.closer,
-            args=(foreground_frames, closed_frames)
-            )
-        closer.daemon = True
-        closer.start()
-        LOG.info("Closer started.")
-
-
-        # The erode process takes a foreground frame and erodes the
-        # white pixels.
-        """
-        eroder = multiprocessing.Process(
-            target=objecttracker.eroder,
-            args=(foreground_frames, eroded_frames)
-            )
-        eroder.daemon = True
-        eroder.start()
-        LOG.info("Eroder started.")
-
-        # The dilate process dilates the foreground frame. This is done
-        # after the erode process so that the frame is eroded and dilated.
-        dilater = multiprocessing.Process(
-            target=objecttracker.dilater,
-            args=(eroded_frames, dilated_frames)
-            )
-        dilater.daemon = True
-        dilater.start()
-        LOG.info("Dilater started.")
-        """
-
-        # The tracker creates tracks from the frames.
-        # When a full track is created, it is inserted into
-        # the tracks_to_save_queue.
-        tracker_process = multiprocessing.Process(
-            target=objecttracker.tracker,
-            # args=(dilated_frames, temp_queue, track_match_radius)
-            # args=(dilated_frames, tracks_to_save, track_match_radius)
-            args=(closed_frames, tracks_to_save, track_match_radius)
-            )
-        tracker_process.daemon = True
-        tracker_process.start()
-        LOG.info("Tracker process started.")
+        if args['--topology'] == "fused":
+            # Foreground extraction, closing and tracking in one
+            # process. See objecttracker.Pipeline.
+            supervisor.add_stage(
+                "Pipeline",
+                objecttracker.pipeline_runner,
+                (raw_frames, tracks_to_save, raw_buffer,
+                 track_match_radius, args["--save-tracks"],
+                 stage_metrics["Pipeline"], roi, args["--background"],
+                 motion_gate, args["--morphology"],
+                 args["--frame-retention"],
+                 float(args["--relink-window"]),
+                 int(args["--track-budget"]),
+                 args["--track-budget-policy"],
+                 float(args["--stationary-radius"]),
+                 args["--counting"]))
+            supervisor.add_metrics(stage_metrics["Pipeline"])
+        else:
+            # The main purpose of the foreground extractor is to
+            # separate the foreground from the background.
+            supervisor.add_stage(
+                "Foreground extractor",
+                objecttracker.foreground_extractor,
+                (raw_frames, foreground_frames, raw_buffer, mask_buffer,
+                 stage_metrics["Foreground extractor"], roi,
+                 args["--background"], motion_gate))
+            supervisor.add_metrics(stage_metrics["Foreground extractor"])
+            supervisor.add_queue("foreground frames", foreground_frames)
+
+            supervisor.add_stage(
+                "Closer",
+                objecttracker.closer,
+                (foreground_frames, closed_frames, mask_buffer,
+                 stage_metrics["Closer"], args["--morphology"]))
+            supervisor.add_metrics(stage_metrics["Closer"])
+            supervisor.add_queue("closed frames", closed_frames)
+
+            # Eroding and dilating the foreground frame is done by the
+            # closer as well (see --morphology), instead of in their own
+            # processes. See objecttracker.morphology.
+
+            # The tracker creates tracks from the frames.
+            # When a full track is created, it is inserted into
+            # the tracks_to_save_queue.
+            supervisor.add_stage(
+                "Tracker",
+                objecttracker.tracker,
+                (closed_frames, tracks_to_save, track_match_radius,
+                 mask_buffer, raw_buffer, stage_metrics["Tracker"], roi,
+                 motion_gate, args["--save-tracks"],
+                 args["--frame-retention"],
+                 float(args["--relink-window"]),
+                 int(args["--track-budget"]),
+                 args["--track-budget-policy"],
+                 float(args["--stationary-radius"]),
+                 args["--counting"]))
+            supervisor.add_metrics(stage_metrics["Tracker"])
 
         # The track saver saves the tracks that needs to be saved.
         # It also puts the data into the database.
-        track_saver = multiprocessing.Process(
-            target=objecttracker.track_saver,
-            args=(
-                tracks_to_save,
-                min_linear_length,
-                track_match_radius,
-                args["--tracks-save-path"],
-                args["--save-tracks"]))
-        track_saver.daemon = True
-        track_saver.start()
-        LOG.info("Track saver started.")
-
-        d = datetime.datetime.now()
-        while True:
-            if (datetime.datetime.now() - d).total_seconds() > 60 * 30:
-                d = datetime.datetime.now()
-                print """Raw frames: %i, foreground frames: %i, closed frames: %i, frames to save: %i.""" % (
-                    raw_frames.qsize(),
-                    foreground_frames.qsize(),
-                    closed_frames.qsize(),
-                    tracks_to_save.qsize())
-
-    # Wait for all processes to end, which should never happen.
-    frame_reader.join()
-    print "FIN"
+        supervisor.add_stage(
+            "Track saver",
+            objecttracker.track_saver,
+            (tracks_to_save,
+             min_linear_length,
+             track_match_radius,
+             args["--tracks-save-path"],
+             args["--save-tracks"],
+             stage_metrics["Track saver"]))
+        supervisor.add_metrics(stage_metrics["Track saver"])
+        supervisor.add_queue("tracks to save", tracks_to_save)
+
+    # Run until the program is stopped (Ctrl-C or SIGTERM). The tracks
+    # that are not saved yet, are saved before it stops.
+    supervisor.run()
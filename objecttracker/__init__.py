@@ -4,6 +4,24 @@ import cv2
 import numpy as np
 import connected_components
 import color
+import framebuffer
+import frame_queue
+import supervisor
+import metrics
+import frame_source
+import manifest
+import segment
+import roi as region_of_interest
+import background
+import motion
+import morphology
+import association
+import spatial_index
+import kalman
+import frame_store
+import relink
+import budget
+import counting
 import track
 import trackpoint
 import time
@@ -35,26 +53,15 @@ def labelled2bgr(labelled_fgmask):
     Every point with the number 1 in the example above get the same
     colour in the rgb mask.
     """
-    # Create an empty bgr mask.
-    bgr_mask = np.zeros(
-        (labelled_fgmask.shape[0], labelled_fgmask.shape[1], 3),
-        dtype=np.uint8)
-
     # Determine the number of connected components / labels.
     # The labels are assigned with the next number (i+=1), starting with 1,
     # so the number of labels is the highest (max) label.
-    number_of_connected_components = np.max(labelled_fgmask)
-
-    # If there are no objects in the labelled mask. Just return the empty
-    # bgr mask.
-    if number_of_connected_components > 0:
-        # Get an array of colors.
-        colors = color.get_colors(number_of_connected_components)
+    number_of_connected_components = int(np.max(labelled_fgmask))
 
-        # Assign each colour to a label.
-        for object_id in np.arange(np.max(labelled_fgmask)):
-            bgr_mask[np.where(labelled_fgmask == object_id + 1)] = \
-                colors[object_id]
+    # Colour the whole mask at once with a lookup table, where the
+    # background (0) is black. The table is only created once.
+    palette = color.get_palette(number_of_connected_components)
+    bgr_mask = palette[labelled_fgmask]
 
     # Return the backgound mask with its new, beautiful colours.
     return bgr_mask
@@ -79,67 +86,176 @@ def get_bounding_box(contour):
     return cv2.boundingRect(contour)
 
 
-def get_trackpoints(fgmask, raw_frame, timestamp):
+def get_trackpoints(fgmask, raw_frame, timestamp, roi=None,
+                    feature_frame=None, frame_store=None):
     """
     Gets all the trackpoints from the foreground mask,
     greater than a certain size.
+
+    If the fgmask is cropped to a region of interest (roi), the
+    trackpoints are moved back to the coordinates of the full frame.
+
+    The appearance features (colour etc.) of the trackpoints are computed
+    from the feature frame, or the raw frame if not given. The feature
+    frame is not kept, so it can be reused by the caller.
+
+    If a frame store (frame_store.FrameStore) is given, the trackpoints
+    get handles to the raw frame instead of the raw frame.
     """
     # The area must have a certain size.
-    min_object_area = min(fgmask.shape[0], fgmask.shape[1]) / 4
+    frame_shape = fgmask.shape
+    offset_x, offset_y = 0, 0
+    if roi is not None:
+        frame_shape = roi.frame_shape
+        offset_x, offset_y = roi.offset
+    min_object_area = min(frame_shape[0], frame_shape[1]) / 4
     LOG.debug("Min object area: %i" % (min_object_area))
 
+    # Find all the blobs, and only use blobs of a certain size.
+    blobs = connected_components.find_blobs(fgmask, min_object_area)
+
+    if feature_frame is None:
+        feature_frame = raw_frame
+
+    frames = [raw_frame] * len(blobs.areas)
+    if frame_store is not None and raw_frame is not None:
+        frames = [frame_store.handle(raw_frame, timestamp,
+                                     (x + offset_x, y + offset_y, w, h))
+                  for x, y, w, h in blobs.bounding_boxes.tolist()]
+
     # Collect the trackpoints.
     trackpoints = []
-    # Remember that find countours changes the mask.
-    for cnt in connected_components.find_contours(fgmask.copy()):
-        contour_area = cv2.contourArea(cnt)
-        LOG.debug(contour_area)
-        # Only use contours of a certain size.
-        if contour_area > min_object_area:
-            cx, cy = get_centroid(cnt)
+    if feature_frame is None:
+        for (cx, cy), area, frame in zip(blobs.centroids.tolist(),
+                                         blobs.areas.tolist(), frames):
             trackpoints.append(
-                trackpoint.Trackpoint(timestamp, cx, cy,
-                                      raw_frame, size=contour_area))
+                trackpoint.Trackpoint(timestamp, cx + offset_x,
+                                      cy + offset_y, frame, size=area))
+        return trackpoints
+
+    # Compute the features of all the blobs at once.
+    if roi is not None:
+        feature_frame = roi.crop(feature_frame)
+    blobs.compute_features(feature_frame)
+    for (cx, cy), area, colour, aspect_ratio, fill_ratio, variance, \
+            frame in zip(blobs.centroids.tolist(),
+                         blobs.areas.tolist(),
+                         blobs.mean_colors.tolist(),
+                         blobs.aspect_ratios.tolist(),
+                         blobs.fill_ratios.tolist(),
+                         blobs.intensity_variances.tolist(),
+                         frames):
+        trackpoints.append(
+            trackpoint.Trackpoint(timestamp, cx + offset_x, cy + offset_y,
+                                  frame, size=area, color=tuple(colour),
+                                  aspect_ratio=aspect_ratio,
+                                  fill_ratio=fill_ratio,
+                                  intensity_variance=variance))
     return trackpoints
 
 
 def get_foreground(foreground_background_subtractor,
                    raw_frame,
-                   learning_rate=0.001):
+                   learning_rate=0.001,
+                   blurred_frame=None,
+                   roi=None):
+    """
+    Gets the foreground mask of the raw frame.
+
+    If blurred_frame is given, the blurred frame is written into it
+    instead of allocating a new frame.
+
+    If a region of interest (roi) is given, only the bounding box of the
+    region is processed, and the fgmask has the size of the box.
+    """
     # Extract background.
     resolution = raw_frame.shape[0:2]
+    if roi is not None:
+        raw_frame = roi.crop(raw_frame)
 
     # Blur the frame a little.
-    blurred_frame = cv2.blur(raw_frame, (int(max(resolution) / 50.0), ) * 2)
+    blurred_frame = cv2.blur(raw_frame, (int(max(resolution) / 50.0), ) * 2,
+                             dst=blurred_frame)
 
     # Subtract the foreground from the background.
     fgmask = foreground_background_subtractor.apply(blurred_frame,
                                                     learningRate=learning_rate)
+    if roi is not None:
+        roi.apply_mask(fgmask)
 
     # Remove the smallest noise and holes in objects.
     return fgmask
 
 
 def get_tracks_to_save(fgmask, raw_frame, timestamp, tracks,
-                       track_match_radius):
+                       track_match_radius, roi=None, feature_frame=None,
+                       track_index=None, kalman_bank=None, frame_store=None,
+                       relink_index=None, point_budget=None, counter=None):
+    """
+    If a track index (spatial_index.GridIndex) is given, it is kept
+    up to date with the tracks, and only the tracks near a trackpoint are
+    considered when matching.
+
+    If a Kalman bank (kalman.KalmanBank) is given, the trackpoints are
+    matched with the predicted positions of the tracks, and the filtered
+    positions are added to the tracks. The track index must then be
+    positioned by the bank (position=kalman_bank.position).
+
+    If a frame store (frame_store.FrameStore) is given, the tracks only
+    keep the pixels of the raw frame chosen by its retention policy, and
+    the raw frame can be reused when this returns.
+
+    If a relink index (relink.RelinkIndex) is given, the ended tracks are
+    kept in it for a while, to be connected with a new track of the same
+    object, instead of being connected with the tracks present now (see
+    connect_tracks). The tracks to save are then the ended tracks that
+    were not re-linked. If a counter (counting.Counter) is given too, it
+    is told about the re-linked tracks.
+
+    If a point budget (budget.PointBudget) is given, the tracks keep a
+    bounded number of trackpoints.
+    """
     # Get all trackpoints from the fgmask.
-    trackpoints = get_trackpoints(fgmask, raw_frame, timestamp)
+    trackpoints = get_trackpoints(fgmask, raw_frame, timestamp, roi,
+                                  feature_frame, frame_store)
+
+    # Predict where all the tracks are now.
+    if kalman_bank is not None:
+        kalman_bank.sync(tracks)
+        kalman_bank.predict(timestamp)
+
+    # Only the tracks that have moved to another cell, are moved.
+    if track_index is not None:
+        track_index.sync(tracks)
 
     # Matching trackpoints with tracks.
     tracks = match_trackpoints_with_tracks(trackpoints, tracks,
-                                           track_match_radius)
+                                           track_match_radius, track_index,
+                                           kalman_bank)
 
     for t in tracks:
         t.incr_age()
 
+    if point_budget is not None:
+        for t in tracks:
+            point_budget.apply(t)
+
     # Remove old tracks that are smaller than the diameter of the
     # match circle.
     tracks = prune_tracks(tracks, track_match_radius * 2)
 
     # Split the tracks into tracks to save
-    tracks, tracks_to_save = split_tracks(tracks,
-                                          track_match_radius)
-
+    if relink_index is None:
+        tracks, tracks_to_save = split_tracks(tracks,
+                                              track_match_radius)
+    else:
+        tracks, tracks_to_save = relink_tracks(tracks, timestamp,
+                                               relink_index, counter)
+
+    if frame_store is not None:
+        frame_store.commit(tracks)
+        for t in tracks_to_save:
+            frame_store.finish(t)
 
     return tracks, tracks_to_save
 
@@ -167,6 +283,64 @@ def split_tracks(tracks, track_match_radius):
     return tracks, tracks_to_save
 
 
+def relink_tracks(tracks, timestamp, relink_index, counter=None):
+    """
+    Moves the ended tracks into the relink index, and connects the new
+    tracks with the ended tracks they continue. See relink.RelinkIndex.
+    Returns the tracks and the tracks to save.
+
+    If a counter (counting.Counter) is given, the counts of the new
+    tracks are moved to the ended tracks they continue.
+    """
+    new_tracks = []
+    for t in tracks:
+        if t.age > 10:
+            relink_index.add(t)
+        else:
+            new_tracks.append(t)
+
+    tracks = new_tracks
+    for i, t in enumerate(tracks):
+        if relink_index.is_new(t):
+            ended_track = relink_index.find(t)
+            if ended_track is not None:
+                ended_track.connect_tracks(t)
+                tracks[i] = ended_track
+                if counter is not None:
+                    counter.relink(ended_track, t)
+
+    return tracks, relink_index.expire(timestamp)
+
+
+def flush_tracks(tracks, track_match_radius, relink_index=None,
+                 frame_store=None):
+    """
+    Ends all the tracks, e.g. when there are no more frames, and empties
+    the relink index. Returns the tracks that are long enough to be
+    saved.
+    """
+    tracks_to_save = [t for t in tracks
+                      if t.number_of_trackpoints() > 1 and
+                      t.total_length() > track_match_radius * 2]
+    if relink_index is not None:
+        tracks_to_save += relink_index.flush()
+    if frame_store is not None:
+        for t in tracks_to_save:
+            frame_store.finish(t)
+    return tracks_to_save
+
+
+def number_of_active_tracks(tracks, relink_index=None):
+    """
+    The number of tracks that are not saved yet, including the ended
+    tracks in the relink index. The motion gate must not skip frames
+    while there are any, or the ended tracks are never expired.
+    """
+    if relink_index is None:
+        return len(tracks)
+    return len(tracks) + len(relink_index)
+
+
 def connect_tracks(tracks, tracks_to_save, track_match_radius):
     """
     If e.g. a car is hiding a bike, the bike disappears from the view
@@ -178,10 +352,21 @@ def connect_tracks(tracks, tracks_to_save, track_match_radius):
     LOG.debug("Connecting tracks")
     new_tracks_to_save = []
     new_tracks = []
+
+    # A track can only be connected to a track starting near its end.
+    first_positions = None
+    if len(tracks_to_save) > 0:
+        first_positions = spatial_index.GridIndex(
+            track_match_radius * 3, spatial_index.first_position)
+        for t in tracks:
+            first_positions.add(t)
+
     for track_to_save in tracks_to_save:
         matched_track = None
         max_score = 0
-        for match_track in tracks:
+        last_tp = track_to_save.last_trackpoint
+        for match_track in first_positions.near(last_tp.x, last_tp.y,
+                                                track_match_radius * 3):
             score = track_to_save.match_score_track(
                 match_track,
                 track_match_radius * 3)
@@ -190,8 +375,10 @@ def connect_tracks(tracks, tracks_to_save, track_match_radius):
                 max_score = score
 
         if matched_track is not None and max_score > 0.2:
+            first_positions.remove(matched_track)
             tracks.remove(matched_track)
             tracks.append(track_to_save)
+            first_positions.add(track_to_save)
             track_to_save.connect_tracks(matched_track)
         else:
             new_tracks_to_save.append(track_to_save)
@@ -204,31 +391,63 @@ def get_bgr_fgmask(fgmask):
     Gets a coloured mask with bgr colours.
     """
     # Get a frame with labelled connected components.
-    labelled_fgmask = connected_components.create_labelled_frame(fgmask)
+    labelled_fgmask = connected_components.find_blobs(fgmask).label_image
     bgr_fgmask = labelled2bgr(labelled_fgmask)
     return bgr_fgmask
 
 
-def match_trackpoints_with_tracks(trackpoints, tracks, track_match_radius):
+def match_trackpoints_with_tracks(trackpoints, tracks, track_match_radius,
+                                  track_index=None, kalman_bank=None):
     """
     Matches trackpoints with the most suitable track.
     If not tracks to match, a new track is created.
-    """
-    for tp in trackpoints:
-        best_matched_track = tp.get_best_match(tracks, track_match_radius)
 
-        LOG.debug("Best matched track: %s" % best_matched_track)
-        if best_matched_track is None:
+    The scores of all the trackpoints with all the tracks are calculated
+    at once, and each track gets at most one trackpoint, so the sum of
+    the scores is the highest. See association.
+
+    With a Kalman bank, the scores are from the predicted positions,
+    gated by the predicted covariance (KalmanBank.gate_radii), and all
+    the matched tracks are updated at once. Otherwise each track is
+    smoothed by Track.kalman.
+    """
+    track_positions = None
+    track_radii = None
+    if kalman_bank is not None:
+        track_positions = kalman_bank.positions(tracks)
+        track_radii = kalman_bank.gate_radii(tracks, track_match_radius)
+    scores = association.score_matrix(trackpoints, tracks,
+                                      track_match_radius, track_index,
+                                      track_positions, track_radii)
+    matches = dict(association.assign(scores))
+    LOG.debug("%i of %i trackpoints matched with %i tracks." % (
+        len(matches), len(trackpoints), len(tracks)))
+
+    # The tracks are matched, before new tracks are added.
+    matched_tracks = [tracks[matches[i]] if i in matches else None
+                      for i in range(len(trackpoints))]
+
+    filtered_positions = {}
+    if kalman_bank is not None:
+        rows = sorted(matches)
+        positions = kalman_bank.update(
+            [matched_tracks[i] for i in rows],
+            association.positions([trackpoints[i] for i in rows]))
+        filtered_positions = dict(zip(rows, positions.tolist()))
+
+    for i, (tp, matched_track) in enumerate(zip(trackpoints,
+                                                matched_tracks)):
+        if matched_track is None:
             LOG.debug("Creating new track.")
             t = track.Track()
-            LOG.debug("Adding trackpoint %s" % (tp))
             t.append(tp)
-            LOG.debug("Adding track %s" % (t))
             tracks.append(t)
+        elif kalman_bank is not None:
+            filtered_tp = tp.copy()
+            filtered_tp.x, filtered_tp.y = filtered_positions[i]
+            matched_track.append(filtered_tp)
         else:
-            LOG.debug("Best matched track age: %s" % best_matched_track.age)
-            LOG.debug("Track was matched.")
-            best_matched_track.append(best_matched_track.kalman(tp))
+            matched_track.append(matched_track.kalman(tp))
     return tracks
 
 
@@ -263,11 +482,12 @@ def draw_tracks(tracks, frame):
         t.draw_lines(frame)
         t.draw_points(frame)
 
-def close(frame):
-    kernel = np.ones((15,15), dtype=np.uint8)
-    return cv2.morphologyEx(frame, cv2.MORPH_CLOSE, kernel, iterations=1)
+def close(frame, dst=None):
+    kernel = morphology.get_kernel(cv2.MORPH_RECT, 15)
+    return cv2.morphologyEx(frame, cv2.MORPH_CLOSE, kernel, dst=dst,
+                            iterations=1)
 
-def erode(frame):
+def erode(frame, dst=None):
     """
     To remove noise.
 
@@ -278,118 +498,587 @@ def erode(frame):
     LOG.debug("Eroding (making the black bigger).")
     erode_kernel_size = max(frame.shape[:2]) / 50
     LOG.debug("Erode kernel size: '%s'." % (erode_kernel_size))
-    ERODE_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE,
-                                             (erode_kernel_size,) * 2)
+    ERODE_KERNEL = morphology.get_kernel(cv2.MORPH_ELLIPSE, erode_kernel_size)
 
     # Do the erotion.
-    eroded_frame = cv2.morphologyEx(frame, cv2.MORPH_OPEN, ERODE_KERNEL)
+    eroded_frame = cv2.morphologyEx(frame, cv2.MORPH_OPEN, ERODE_KERNEL,
+                                    dst=dst)
     return eroded_frame
 
 
-def dilate(frame):
+def dilate(frame, dst=None):
     """
     Reduces the black area to make the white areas bigger again.
     """
     # Setting the dilation kernel.
     LOG.debug("Dilating (making it smaller again).")
     dilate_kernel_size = min(frame.shape[:2]) / 50
-    DILATE_KERNEL = np.ones((dilate_kernel_size,) * 2, np.uint8)
+    DILATE_KERNEL = morphology.get_kernel(cv2.MORPH_RECT, dilate_kernel_size)
 
     # Do the dilation.
     dilated_frame = cv2.morphologyEx(frame, cv2.MORPH_CLOSE, DILATE_KERNEL,
-                                     iterations=3)
+                                     dst=dst, iterations=3)
     return dilated_frame
 
 
-def foreground_extractor(raw_frames, foreground_frames, save_raw_frame=False):
+class Pipeline(object):
+    """
+    Runs the foreground extraction, the closing and the tracking in
+    one process, without any queues in between.
+
+    This is an alternative to the foreground_extractor, closer and
+    tracker processes. For small frames the queues between the
+    processes cost more than the work itself.
+
+    The blurred frame and the closed fgmask are allocated once and
+    reused for every frame. If a region of interest (roi) is given, they
+    have the size of the region.
+
+    background_engine is the name of the background model.
+    See background.ENGINES.
+
+    If a motion gate (motion.MotionGate) is given, the frames where
+    nothing moves are skipped, when there are no active tracks.
+
+    morphology_chain is the morphological operations run on the fgmask.
+    See morphology.Morphology.
+
+    If a frame retention policy is given, the trackpoints keep the
+    pixels chosen by the policy in a frame store, instead of the raw
+    frame. See frame_store.FrameStore.
+
+    The ended tracks are kept for relink_window seconds, to be re-linked
+    with the new track of the same object, e.g. after it has been hidden
+    by another object. See relink.RelinkIndex. 0 connects the ended
+    tracks with the current tracks only (see connect_tracks).
+
+    Each track keeps at most max_trackpoints trackpoints, chosen by the
+    budget policy, and a stopped object only keeps two trackpoints, while
+    it stays within stationary_radius pixels. See budget.PointBudget.
+
+    If a counter (counting.Counter) is given, the count events of each
+    frame are in count_events.
+    """
+    def __init__(self, track_match_radius, learning_rate=0.001, roi=None,
+                 background_engine=background.DEFAULT_ENGINE,
+                 motion_gate=None,
+                 morphology_chain=morphology.DEFAULT_CHAIN,
+                 frame_retention=None,
+                 relink_window=relink.DEFAULT_WINDOW,
+                 max_trackpoints=budget.DEFAULT_MAX_TRACKPOINTS,
+                 budget_policy=budget.DEFAULT_POLICY,
+                 stationary_radius=budget.DEFAULT_STATIONARY_RADIUS,
+                 counter=None):
+        self.track_match_radius = track_match_radius
+        self.learning_rate = learning_rate
+        self.roi = roi
+        self.motion_gate = motion_gate
+        self.morphology = morphology.Morphology(morphology_chain)
+        self.fgbg = background.create(background_engine)
+        self.frame_store = None
+        if frame_retention is not None:
+            self.frame_store = frame_store.FrameStore(frame_retention)
+        self.tracks = []
+        self.kalman_bank = kalman.KalmanBank()
+        self.track_index = spatial_index.GridIndex(
+            track_match_radius, self.kalman_bank.position)
+        self.relink_index = None
+        if relink_window > 0:
+            self.relink_index = relink.RelinkIndex(track_match_radius,
+                                                   window=relink_window)
+        self.point_budget = budget.PointBudget(max_trackpoints,
+                                               budget_policy,
+                                               stationary_radius)
+        self.counter = counter
+        self.count_events = []
+        self._blurred_frame = None
+
+        # The closed fgmask of the last frame.
+        self.fgmask = None
+
+    def _allocate(self, raw_frame):
+        """
+        Allocates the buffers, if the frame size has changed.
+        """
+        if self.roi is not None:
+            raw_frame = self.roi.crop(raw_frame)
+        if self._blurred_frame is None or \
+           self._blurred_frame.shape != raw_frame.shape:
+            LOG.debug("Pipeline: Allocating buffers for frame shape %s." %
+                      str(raw_frame.shape))
+            self._blurred_frame = np.empty_like(raw_frame)
+            self.fgmask = np.empty(raw_frame.shape[:2], dtype=np.uint8)
+
+    def warm_up(self, raw_frame):
+        """
+        Trains the background model on the frame, without tracking.
+        """
+        self._allocate(raw_frame)
+        get_foreground(self.fgbg, raw_frame, self.learning_rate,
+                       blurred_frame=self._blurred_frame, roi=self.roi)
+
+    def active_tracks(self):
+        """
+        Gets the tracks that are not saved yet: The active tracks, and the
+        ended tracks that can still be re-linked.
+        """
+        tracks = list(self.tracks)
+        if self.relink_index is not None:
+            tracks += self.relink_index.tracks()
+        return tracks
+
+    def flush(self):
+        """
+        Ends all the active tracks, e.g. when there are no more frames.
+        Returns the tracks that are long enough to be saved.
+        """
+        tracks = flush_tracks(self.tracks, self.track_match_radius,
+                              self.relink_index, self.frame_store)
+        self.tracks = []
+        self.kalman_bank.sync(self.tracks)
+        self.track_index.sync(self.tracks)
+        if self.motion_gate is not None:
+            self.motion_gate.set_active_tracks(0)
+        return tracks
+
+    def process(self, raw_frame, timestamp, keep_raw_frame=True):
+        """
+        Runs one frame through the pipeline and returns the tracks
+        that are finished and should be saved.
+
+        If keep_raw_frame is False, the raw frame is not attached to
+        the trackpoints, and the caller is free to reuse it. With a frame
+        store, the raw frame can always be reused.
+        """
+        self._allocate(raw_frame)
+        self.count_events = []
+        if self.motion_gate is not None:
+            frame = raw_frame
+            if self.roi is not None:
+                frame = self.roi.crop(raw_frame)
+            action = self.motion_gate.check(frame)
+            if action != "process":
+                if action == "background":
+                    get_foreground(
+                        self.fgbg, raw_frame,
+                        self.motion_gate.background_learning_rate(
+                            self.learning_rate),
+                        blurred_frame=self._blurred_frame, roi=self.roi)
+                self.fgmask[:] = 0
+                return []
+
+        fgmask = get_foreground(self.fgbg, raw_frame, self.learning_rate,
+                                blurred_frame=self._blurred_frame,
+                                roi=self.roi)
+        self.morphology.apply(fgmask, dst=self.fgmask)
+
+        feature_frame = raw_frame
+        if not keep_raw_frame:
+            raw_frame = None
+
+        self.tracks, tracks_to_save = get_tracks_to_save(
+            self.fgmask,
+            raw_frame,
+            timestamp,
+            self.tracks,
+            self.track_match_radius,
+            self.roi,
+            feature_frame,
+            self.track_index,
+            self.kalman_bank,
+            self.frame_store,
+            self.relink_index,
+            self.point_budget,
+            self.counter)
+        if self.counter is not None:
+            self.count_events = self.counter.update(self.tracks, timestamp)
+        if self.motion_gate is not None:
+            self.motion_gate.set_active_tracks(
+                number_of_active_tracks(self.tracks, self.relink_index))
+        return tracks_to_save
+
+
+def pipeline_runner(raw_frames, output_tracks, raw_buffer,
+                    track_match_radius, save_raw_frame=False,
+                    stage_metrics=None, roi=None,
+                    background_engine=background.DEFAULT_ENGINE,
+                    motion_gate=None,
+                    morphology_chain=morphology.DEFAULT_CHAIN,
+                    frame_retention=frame_store.DEFAULT_RETENTION,
+                    relink_window=relink.DEFAULT_WINDOW,
+                    max_trackpoints=budget.DEFAULT_MAX_TRACKPOINTS,
+                    budget_policy=budget.DEFAULT_POLICY,
+                    stationary_radius=budget.DEFAULT_STATIONARY_RADIUS,
+                    counting_filename=None):
+    """
+    Runs the whole pipeline (see Pipeline) in one process.
+
+    Takes the raw frames from the raw buffer and puts the tracks
+    to save into the output queue.
+
+    If a counting file is given, the count events of its counting lines
+    and zones (see counting.Counter) are put into the output queue too,
+    as soon as they happen.
+
+    If save_raw_frame is set, the tracks keep the pixels chosen by the
+    frame retention policy. See frame_store.FrameStore.
+
+    At the end of the frames (frame_queue.END_OF_FRAMES), all the tracks
+    are saved, and the end is passed on to the output queue.
+    """
+    if stage_metrics is None:
+        stage_metrics = metrics.StageMetrics("Pipeline")
+
+    if not save_raw_frame:
+        frame_retention = None
+    counter = None
+    if counting_filename is not None:
+        # A re-linked track is not counted again.
+        counter = counting.Counter.from_file(counting_filename,
+                                             memory=relink_window)
+    pipeline = Pipeline(track_match_radius, roi=roi,
+                        background_engine=background_engine,
+                        motion_gate=motion_gate,
+                        morphology_chain=morphology_chain,
+                        frame_retention=frame_retention,
+                        relink_window=relink_window,
+                        max_trackpoints=max_trackpoints,
+                        budget_policy=budget_policy,
+                        stationary_radius=stationary_radius,
+                        counter=counter)
+    while True:
+        LOG.debug("Pipeline: Waiting for a raw frame.")
+        wait_start = time.time()
+        item, queue_wait = raw_frames.get_timed(block=True)
+        if item is frame_queue.END_OF_FRAMES:
+            for t in pipeline.flush():
+                output_tracks.put(t)
+            output_tracks.put_end()
+            return
+        raw_slot, timestamp = item
+        start = time.time()
+        stage_metrics.frame_in(queue_wait, idle=start - wait_start)
+        LOG.debug("Pipeline: Got a frame. Number in queue: %i." %
+                  raw_frames.qsize())
+
+        # The frame store copies what it keeps out of the buffer.
+        tracks_to_save = pipeline.process(raw_buffer.read(raw_slot),
+                                          timestamp,
+                                          keep_raw_frame=save_raw_frame)
+        raw_buffer.release(raw_slot)
+        stage_metrics.observe("processing", time.time() - start)
+        stage_metrics.latency_since(timestamp)
+
+        for event in pipeline.count_events:
+            output_tracks.put(event)
+        for t in tracks_to_save:
+            output_tracks.put(t)
+        stage_metrics.frame_out(len(tracks_to_save))
+
+
+def foreground_extractor(raw_frames, foreground_frames, raw_buffer,
+                         mask_buffer, stage_metrics=None, roi=None,
+                         background_engine=background.DEFAULT_ENGINE,
+                         motion_gate=None):
     """
     Extracts the foreground (fgmask) from the raw frame and
     puts the foreground into the buffer.
+
+    If a region of interest (roi) is given, the masks in the mask buffer
+    have the size of the region.
+
+    background_engine is the name of the background model.
+    See background.ENGINES.
+
+    If a motion gate (motion.MotionGate) is given, the frames where
+    nothing moves are not passed on, when the tracker has no active
+    tracks. The background model is still updated now and then.
+
+    The queues only carry slot indices into the frame buffers:
+    raw_frames: [raw_slot, timestamp]
+    foreground_frames: [mask_slot, raw_slot, timestamp]
+    The end of the frames (frame_queue.END_OF_FRAMES) is passed on, and
+    the stage stops. The same goes for the other stages.
     """
-    fgbg = cv2.BackgroundSubtractorMOG()
+    if stage_metrics is None:
+        stage_metrics = metrics.StageMetrics("Foreground extractor")
+
+    fgbg = background.create(background_engine)
     while True:
         LOG.debug("Foreground extractor: Waiting for a raw frame.")
-        raw_frame, timestamp = raw_frames.get(block=True)
+        wait_start = time.time()
+        item, queue_wait = raw_frames.get_timed(block=True)
+        if item is frame_queue.END_OF_FRAMES:
+            foreground_frames.put_end()
+            return
+        raw_slot, timestamp = item
+        start = time.time()
+        stage_metrics.frame_in(queue_wait, idle=start - wait_start)
         LOG.debug("Foreground extractor: Got a frame. Number in queue: %i." %
                   raw_frames.qsize())
 
+        raw_frame = raw_buffer.read(raw_slot)
+        if motion_gate is not None:
+            frame = raw_frame
+            if roi is not None:
+                frame = roi.crop(raw_frame)
+            action = motion_gate.check(frame)
+            if action != "process":
+                if action == "background":
+                    get_foreground(
+                        fgbg, raw_frame,
+                        motion_gate.background_learning_rate(0.001),
+                        roi=roi)
+                raw_buffer.release(raw_slot)
+                stage_metrics.observe("processing", time.time() - start)
+                continue
+
         # Get the foreground.
-        fgmask = get_foreground(fgbg, raw_frame)
+        fgmask = get_foreground(fgbg, raw_frame, roi=roi)
+        mask_slot = mask_buffer.write(fgmask)
 
-        # Only save the raw frame if it is necassary.
-        if not save_raw_frame:
-            raw_frame = None
+        # The raw frame is passed on in its slot, as the tracker needs it
+        # for the features of the trackpoints. The tracker releases it.
+        stage_metrics.observe("processing", time.time() - start)
 
         # Insert the frame and the timestamp into the buffer.
-        foreground_frames.put([fgmask, raw_frame, timestamp])
+        foreground_frames.put([mask_slot, raw_slot, timestamp])
+        stage_metrics.frame_out()
+
 
+def closer(input_frames, output_frames, mask_buffer, stage_metrics=None,
+           morphology_chain=morphology.DEFAULT_CHAIN):
+    """
+    Closes the fgmask in its slot. The slot is passed on.
+
+    All the morphological operations in morphology_chain (by default only
+    the closing) are done here, in place, so e.g. an opening does not
+    need its own process and queue. See morphology.Morphology.
+    """
+    if stage_metrics is None:
+        stage_metrics = metrics.StageMetrics("Closer")
+
+    fgmask_morphology = morphology.Morphology(morphology_chain)
 
-def closer(input_frames, output_frames):
     while True:
         LOG.debug("Closer: Waiting for a frame.")
-        fgmask, raw_frame, timestamp = input_frames.get(block=True)
+        wait_start = time.time()
+        item, queue_wait = input_frames.get_timed(block=True)
+        if item is frame_queue.END_OF_FRAMES:
+            output_frames.put_end()
+            return
+        mask_slot, raw_slot, timestamp = item
+        start = time.time()
+        stage_metrics.frame_in(queue_wait, idle=start - wait_start)
         LOG.debug("Closer: Got a input frame. Number in queue: %i." %
                   input_frames.qsize())
-        closed_fgmask = close(fgmask)
-        output_frames.put([closed_fgmask, raw_frame, timestamp])
+        fgmask = mask_buffer.read(mask_slot)
+        fgmask_morphology.apply(fgmask, dst=fgmask)
+        stage_metrics.observe("processing", time.time() - start)
+        output_frames.put([mask_slot, raw_slot, timestamp])
+        stage_metrics.frame_out()
+
 
+def eroder(input_frames, output_frames, mask_buffer, stage_metrics=None):
+    if stage_metrics is None:
+        stage_metrics = metrics.StageMetrics("Eroder")
 
-def eroder(input_frames, output_frames):
     while True:
         LOG.debug("Eroder: Waiting for a frame.")
-        fgmask, raw_frame, timestamp = input_frames.get(block=True)
+        wait_start = time.time()
+        item, queue_wait = input_frames.get_timed(block=True)
+        if item is frame_queue.END_OF_FRAMES:
+            output_frames.put_end()
+            return
+        mask_slot, raw_slot, timestamp = item
+        start = time.time()
+        stage_metrics.frame_in(queue_wait, idle=start - wait_start)
         LOG.debug("Eroder: Got a input frame. Number in queue: %i." %
                   input_frames.qsize())
-        eroded_fgmask = erode(fgmask)
-        output_frames.put([eroded_fgmask, raw_frame, timestamp])
+        fgmask = mask_buffer.read(mask_slot)
+        erode(fgmask, dst=fgmask)
+        stage_metrics.observe("processing", time.time() - start)
+        output_frames.put([mask_slot, raw_slot, timestamp])
+        stage_metrics.frame_out()
 
 
-def dilater(input_frames, output_frames):
+def dilater(input_frames, output_frames, mask_buffer, stage_metrics=None):
     """
     Dilates the frame from the input queue and inserts the
     new frame into the output queue.
     """
+    if stage_metrics is None:
+        stage_metrics = metrics.StageMetrics("Dilater")
+
     while True:
         LOG.debug("Dilater: Waiting for a eroded frame.")
-        fgmask, raw_frame, timestamp = input_frames.get(block=True)
+        wait_start = time.time()
+        item, queue_wait = input_frames.get_timed(block=True)
+        if item is frame_queue.END_OF_FRAMES:
+            output_frames.put_end()
+            return
+        mask_slot, raw_slot, timestamp = item
+        start = time.time()
+        stage_metrics.frame_in(queue_wait, idle=start - wait_start)
 
         LOG.debug("Dilater: Got a frame. Number in queue: %i." %
                   input_frames.qsize())
-        dilated_fgmask = dilate(fgmask)
-        output_frames.put([dilated_fgmask, raw_frame, timestamp])
-
+        fgmask = mask_buffer.read(mask_slot)
+        dilate(fgmask, dst=fgmask)
+        stage_metrics.observe("processing", time.time() - start)
+        output_frames.put([mask_slot, raw_slot, timestamp])
+        stage_metrics.frame_out()
+
+
+def tracker(input_frames, output_tracks, track_match_radius, mask_buffer,
+            raw_buffer, stage_metrics=None, roi=None, motion_gate=None,
+            save_raw_frame=False,
+            frame_retention=frame_store.DEFAULT_RETENTION,
+            relink_window=relink.DEFAULT_WINDOW,
+            max_trackpoints=budget.DEFAULT_MAX_TRACKPOINTS,
+            budget_policy=budget.DEFAULT_POLICY,
+            stationary_radius=budget.DEFAULT_STATIONARY_RADIUS,
+            counting_filename=None):
+    """
+    Matches the trackpoints in the fgmasks with the tracks, and puts the
+    finished tracks into the output queue.
+
+    The features of the trackpoints are computed from the raw frame in
+    the raw buffer. If save_raw_frame is set, the pixels chosen by the
+    frame retention policy are copied out of the buffer and kept in the
+    tracks. See frame_store.FrameStore.
+
+    The ended tracks are kept for relink_window seconds, to be re-linked
+    with a new track of the same object, and each track keeps at most
+    max_trackpoints trackpoints (see budget.PointBudget for the
+    stationary_radius). The count events of the counting lines
+    and zones in the counting file are put into the output queue, as soon
+    as they happen. See Pipeline and pipeline_runner.
+
+    If a motion gate is given, the number of active tracks (including
+    the ones that can be re-linked) is set in it, so the foreground
+    extractor does not skip frames while objects are tracked.
+
+    At the end of the frames (frame_queue.END_OF_FRAMES), all the tracks
+    are saved, and the end is passed on to the output queue.
+    """
+    if stage_metrics is None:
+        stage_metrics = metrics.StageMetrics("Tracker")
 
-def tracker(input_frames, output_tracks, track_match_radius):
     tracks = []
+    kalman_bank = kalman.KalmanBank()
+    track_index = spatial_index.GridIndex(track_match_radius,
+                                          kalman_bank.position)
+    store = None
+    if save_raw_frame:
+        store = frame_store.FrameStore(frame_retention)
+    relink_index = None
+    if relink_window > 0:
+        relink_index = relink.RelinkIndex(track_match_radius,
+                                          window=relink_window)
+    point_budget = budget.PointBudget(max_trackpoints, budget_policy,
+                                      stationary_radius)
+    counter = None
+    if counting_filename is not None:
+        # A re-linked track is not counted again.
+        counter = counting.Counter.from_file(counting_filename,
+                                             memory=relink_window)
     while True:
         LOG.debug("Tracker: Waiting for a frame.")
-        fgmask, raw_frame, timestamp = input_frames.get(block=True)
+        wait_start = time.time()
+        item, queue_wait = input_frames.get_timed(block=True)
+        if item is frame_queue.END_OF_FRAMES:
+            # Save all the tracks, also the ones that could be re-linked.
+            for t in flush_tracks(tracks, track_match_radius, relink_index,
+                                  store):
+                output_tracks.put(t)
+            output_tracks.put_end()
+            return
+        mask_slot, raw_slot, timestamp = item
+        start = time.time()
+        stage_metrics.frame_in(queue_wait, idle=start - wait_start)
 
         LOG.debug("Tracker: Got a fgmask. Number in queue: %i." %
                   input_frames.qsize())
-        tracks, tracks_to_save = get_tracks_to_save(fgmask,
-                                                    raw_frame,
-                                                    timestamp,
-                                                    tracks,
-                                                    track_match_radius)
 
+        # The frame store copies what it keeps out of the shared buffer.
+        raw_frame = raw_buffer.read(raw_slot)
+        tracks, tracks_to_save = get_tracks_to_save(
+            mask_buffer.read(mask_slot),
+            raw_frame if save_raw_frame else None,
+            timestamp,
+            tracks,
+            track_match_radius,
+            roi,
+            raw_frame,
+            track_index,
+            kalman_bank,
+            store,
+            relink_index,
+            point_budget,
+            counter)
+        raw_buffer.release(raw_slot)
+        mask_buffer.release(mask_slot)
+        count_events = []
+        if counter is not None:
+            count_events = counter.update(tracks, timestamp)
+        if motion_gate is not None:
+            motion_gate.set_active_tracks(
+                number_of_active_tracks(tracks, relink_index))
+        if store is not None:
+            LOG.debug("Tracker: %i frames (%i bytes) in the frame store." %
+                      (store.number_of_frames, store.nbytes))
+        stage_metrics.observe("processing", time.time() - start)
+        stage_metrics.latency_since(timestamp)
+
+        for event in count_events:
+            output_tracks.put(event)
         for t in tracks_to_save:
             # Putting tracks to save in the save queue.
             output_tracks.put(t)
+        stage_metrics.frame_out(len(tracks_to_save))
 
 
 def track_saver(input_queue, min_linear_length, track_match_radius,
-                trackpoints_save_directory, save_tracks_to_disk=False):
+                trackpoints_save_directory, save_tracks_to_disk=False,
+                stage_metrics=None):
     """
     Process responsible for saving the track to the database and disk.
+    The input queue is a frame_queue.FrameQueue (with the "block"
+    policy, so no tracks are dropped).
+
+    The count events (counting.CountEvent) in the queue are saved to the
+    database as well.
+
+    The latency is from the last frame in the track was captured,
+    until the track is saved.
     """
+    if stage_metrics is None:
+        stage_metrics = metrics.StageMetrics("Track saver")
+
     while True:
         LOG.debug("Tracksaver: Waiting for a track to save.")
-        track_to_save = input_queue.get(block=True)
+        wait_start = time.time()
+        track_to_save, queue_wait = input_queue.get_timed(block=True)
+        if track_to_save is frame_queue.END_OF_FRAMES:
+            LOG.info("Tracksaver: All the tracks are saved.")
+            return
+        start = time.time()
+        stage_metrics.frame_in(queue_wait, idle=start - wait_start)
         LOG.debug("Tracksaver: Got a track to save. Number of tracks to \
 save in queue: %i." % input_queue.qsize())
+        if isinstance(track_to_save, counting.CountEvent):
+            track_to_save.save_to_db()
+            stage_metrics.observe("processing", time.time() - start)
+            stage_metrics.latency_since(track_to_save.timestamp)
+            stage_metrics.frame_out()
+            continue
+
         track_to_save.save_to_db()
         LOG.info(track_to_save)
         if save_tracks_to_disk:
             track_to_save.save_to_disk(min_linear_length, track_match_radius,
                                        trackpoints_save_directory)
+        stage_metrics.observe("processing", time.time() - start)
+        stage_metrics.latency_since(track_to_save.last_trackpoint.timestamp)
+        stage_metrics.frame_out()
@@ -0,0 +1,124 @@
+# coding: utf-8
+import numpy as np
+import logging
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+
+def positions(points):
+    """
+    Gets the (x, y) of the trackpoints as an array with a row for each.
+    """
+    return np.array([(tp.x, tp.y) for tp in points],
+                    dtype=np.float64).reshape(-1, 2)
+
+
+def _scores(distances, radii):
+    radii = np.asarray(radii, dtype=np.float64)
+    scores = 1 - np.minimum(distances, radii) / radii
+    return scores ** 2
+
+
+def score_matrix(trackpoints, tracks, track_match_radius, track_index=None,
+                 track_positions=None, track_radii=None):
+    """
+    Calculates the match scores of all the trackpoints (rows) with all
+    the tracks (columns) at once. The score is the same as
+    Track.match_score_trackpoint: (1 - distance / radius) ** 2 from the
+    last trackpoint of the track, and 0 if it is outside the radius.
+
+    If a track index (spatial_index.GridIndex of the tracks) is given,
+    only the scores of the tracks near each trackpoint are calculated.
+
+    If the track positions (a row for each track) are given, e.g. the
+    positions predicted by a Kalman filter, they are used instead of the
+    last trackpoints. The track index must then use the same positions.
+
+    If the track radii (one for each track) are given, e.g. the gates of
+    a Kalman filter (KalmanBank.gate_radii), each track uses its own
+    radius instead of track_match_radius.
+    """
+    scores = np.zeros((len(trackpoints), len(tracks)))
+    if len(trackpoints) == 0 or len(tracks) == 0:
+        return scores
+
+    if track_positions is None:
+        track_positions = np.array([t.last_position for t in tracks],
+                                   dtype=np.float64)
+
+    if track_radii is None:
+        track_radii = np.full(len(tracks), float(track_match_radius))
+
+    if track_index is None:
+        difference = positions(trackpoints)[:, np.newaxis, :] - \
+            track_positions[np.newaxis, :, :]
+        return _scores(np.sqrt((difference ** 2).sum(axis=2)),
+                       track_radii[np.newaxis, :])
+
+    # The candidate pairs.
+    columns = dict((t, column) for column, t in enumerate(tracks))
+    rows, pair_columns = [], []
+    search_radius = track_radii.max()
+    for row, tp in enumerate(trackpoints):
+        for t in track_index.near(tp.x, tp.y, search_radius):
+            column = columns.get(t)
+            if column is not None:
+                rows.append(row)
+                pair_columns.append(column)
+    if len(rows) == 0:
+        return scores
+
+    difference = positions([trackpoints[row] for row in rows]) - \
+        track_positions[pair_columns]
+    scores[rows, pair_columns] = _scores(
+        np.sqrt((difference ** 2).sum(axis=1)), track_radii[pair_columns])
+    return scores
+
+
+def assign_greedy(scores):
+    """
+    Assigns the pairs with the best scores first. Each trackpoint and
+    each track is only used once.
+    Returns a list of (trackpoint index, track index).
+    """
+    rows, columns = np.nonzero(scores > 0)
+    order = np.argsort(-scores[rows, columns], kind="mergesort")
+    used_rows, used_columns = set(), set()
+    pairs = []
+    for row, column in zip(rows[order].tolist(), columns[order].tolist()):
+        if row in used_rows or column in used_columns:
+            continue
+        used_rows.add(row)
+        used_columns.add(column)
+        pairs.append((row, column))
+    return pairs
+
+
+def assign_optimal(scores):
+    """
+    Assigns the trackpoints to the tracks, so the sum of the scores is
+    the highest (the Hungarian method). Pairs with score 0 are not used.
+    Returns a list of (trackpoint index, track index).
+    """
+    rows, columns = linear_sum_assignment(-scores)
+    return [(row, column)
+            for row, column in zip(rows.tolist(), columns.tolist())
+            if scores[row, column] > 0]
+
+
+def assign(scores):
+    """
+    Assigns the trackpoints to the tracks. Uses the optimal assignment,
+    if scipy is installed, else the greedy.
+    """
+    if scores.size == 0:
+        return []
+    if linear_sum_assignment is not None:
+        return assign_optimal(scores)
+    return assign_greedy(scores)
@@ -0,0 +1,199 @@
+# coding: utf-8
+import numpy as np
+import cv2
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# The default engine. See ENGINES at the bottom.
+DEFAULT_ENGINE = "mog"
+
+
+class BackgroundException(Exception):
+    pass
+
+
+class _GrayBackground(object):
+    """
+    Base class of the numpy / OpenCV background models.
+
+    The models work on the gray frame. A pixel is foreground (255), if it
+    differs more than threshold from the background. All the buffers are
+    allocated on the first frame and reused.
+
+    The models have the same apply method as the OpenCV background
+    subtractors, so they can be used in get_foreground.
+    """
+    def __init__(self, threshold=25):
+        self.threshold = threshold
+        self._gray = None
+        self._difference = None
+        self._fgmask = None
+
+    def _to_gray(self, frame):
+        if self._gray is None or self._gray.shape != frame.shape[:2]:
+            self._gray = np.empty(frame.shape[:2], dtype=np.uint8)
+            self._difference = np.empty_like(self._gray)
+            self._fgmask = np.empty_like(self._gray)
+            self._reset(self._gray)
+        if frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        else:
+            self._gray[:] = frame
+        return self._gray
+
+    def _reset(self, gray):
+        """
+        Called when the buffers are (re)allocated.
+        """
+        pass
+
+    def _foreground(self, background):
+        cv2.absdiff(self._gray, background, dst=self._difference)
+        cv2.threshold(self._difference, self.threshold, 255,
+                      cv2.THRESH_BINARY, dst=self._fgmask)
+        return self._fgmask
+
+
+class RunningAverageBackground(_GrayBackground):
+    """
+    The background is an exponential moving average of the frames:
+        background = (1 - learning_rate) * background + learning_rate * frame
+
+    If frame_difference is set, the background model is only compared
+    with the frame, when the frame differs from the previous frame. When
+    nothing moves, the fgmask is left empty. This is cheaper, but objects
+    that stop are lost at once.
+    """
+    def __init__(self, threshold=25, frame_difference=False):
+        super(RunningAverageBackground, self).__init__(threshold)
+        self.frame_difference = frame_difference
+        self._average = None
+        self._background = None
+        self._previous = None
+
+    def _reset(self, gray):
+        self._average = None
+        self._background = np.empty_like(gray)
+        self._previous = np.empty_like(gray)
+
+    def apply(self, frame, learningRate=0.001):
+        gray = self._to_gray(frame)
+        if self._average is None:
+            # The first frame is the background.
+            self._average = gray.astype(np.float32)
+            self._previous[:] = gray
+            self._fgmask[:] = 0
+            return self._fgmask
+
+        moving = True
+        if self.frame_difference:
+            cv2.absdiff(gray, self._previous, dst=self._difference)
+            moving = self._difference.max() > self.threshold
+            self._previous[:] = gray
+
+        cv2.accumulateWeighted(gray, self._average, learningRate)
+        if not moving:
+            self._fgmask[:] = 0
+            return self._fgmask
+
+        cv2.convertScaleAbs(self._average, dst=self._background)
+        return self._foreground(self._background)
+
+
+class MedianBackground(_GrayBackground):
+    """
+    An approximate median of the frames: Each frame, the background is
+    moved one step towards the frame. Does not need floats at all.
+
+    The background moves at most learning rate * 255 gray levels a frame,
+    and at most one gray level.
+    """
+    def __init__(self, threshold=25):
+        super(MedianBackground, self).__init__(threshold)
+        self._background = None
+        self._step = None
+        self._updates = 0.0
+
+    def _reset(self, gray):
+        self._background = None
+        self._step = np.empty_like(gray)
+        self._updates = 0.0
+
+    def apply(self, frame, learningRate=0.001):
+        gray = self._to_gray(frame)
+        if self._background is None:
+            self._background = gray.copy()
+            self._fgmask[:] = 0
+            return self._fgmask
+
+        fgmask = self._foreground(self._background)
+
+        # Update the background, at most once a frame.
+        self._updates += max(learningRate, 0.0) * 255
+        if self._updates >= 1:
+            self._updates = 0.0
+            # Add one where the frame is brighter, and subtract one where
+            # it is darker. Saturated, so no overflow.
+            np.greater(gray, self._background, out=self._step)
+            cv2.add(self._background, self._step, dst=self._background)
+            np.less(gray, self._background, out=self._step)
+            cv2.subtract(self._background, self._step, dst=self._background)
+        return fgmask
+
+
+class FrameDifferenceBackground(_GrayBackground):
+    """
+    The background is the previous frame. The cheapest model, but only
+    the edges of a moving object with a uniform colour are found, and
+    objects that stop are lost at once.
+    """
+    def __init__(self, threshold=25):
+        super(FrameDifferenceBackground, self).__init__(threshold)
+        self._previous = None
+
+    def _reset(self, gray):
+        self._previous = None
+
+    def apply(self, frame, learningRate=0.001):
+        gray = self._to_gray(frame)
+        if self._previous is None:
+            self._previous = gray.copy()
+            self._fgmask[:] = 0
+            return self._fgmask
+        fgmask = self._foreground(self._previous)
+        self._previous[:] = gray
+        return fgmask
+
+
+def _mog2():
+    # No shadow detection. Shadows would be marked as 127 in the fgmask,
+    # and counted as foreground.
+    return cv2.BackgroundSubtractorMOG2(500, 16, False)
+
+
+# Name: A function creating the model.
+ENGINES = {
+    "mog": lambda: cv2.BackgroundSubtractorMOG(),
+    "mog2": _mog2,
+    "running-average": RunningAverageBackground,
+    "running-average-diff":
+        lambda: RunningAverageBackground(frame_difference=True),
+    "median": MedianBackground,
+    "frame-difference": FrameDifferenceBackground,
+    }
+
+
+def create(engine=DEFAULT_ENGINE):
+    """
+    Creates a background model. See ENGINES.
+
+    The model has an apply(frame, learningRate=...) method, which returns
+    the fgmask, like the OpenCV background subtractors.
+    """
+    if engine not in ENGINES:
+        raise BackgroundException("Unknown background engine: '%s'. Use one \
+of: %s." % (engine, ", ".join(sorted(ENGINES))))
+    LOG.info("Background engine: %s." % engine)
+    return ENGINES[engine]()
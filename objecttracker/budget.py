@@ -0,0 +1,116 @@
+# coding: utf-8
+import numpy as np
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_TRACKPOINTS = 256
+DEFAULT_POLICY = "decimate"
+# Pixels a stopped object can move, and still be stationary.
+DEFAULT_STATIONARY_RADIUS = 2.0
+
+POLICIES = ("decimate", "ring", "max-age:<seconds>", "none")
+
+
+class BudgetException(Exception):
+    pass
+
+
+def parse_policy(text):
+    """
+    Parses a budget policy (see PointBudget).
+    Returns (policy, max age in seconds), where the max age is only used
+    by "max-age".
+    """
+    fields = text.strip().split(":")
+    try:
+        if fields[0] == "max-age" and len(fields) == 2 and \
+           float(fields[1]) > 0:
+            return fields[0], float(fields[1])
+        if fields[0] in POLICIES and len(fields) == 1:
+            return fields[0], None
+    except ValueError:
+        pass
+    raise BudgetException("Unknown track budget policy '%s'. Use one of: \
+%s." % (text, ", ".join(POLICIES)))
+
+
+class PointBudget(object):
+    """
+    Bounds the number of trackpoints a track keeps, so a car parked in
+    the frame, or a slow pedestrian, does not grow its track every frame
+    for days.
+
+    When a track has more than max_trackpoints trackpoints, the policy
+    removes trackpoints until half of them are left:
+        "decimate": Trackpoints evenly spaced along the track are kept.
+        "ring": The most recent trackpoints are kept.
+        "max-age:<seconds>": The trackpoints of the last seconds are
+            kept (and the most recent, if they are still too many).
+        "none": All the trackpoints are kept.
+    The first and the last trackpoint are always kept. As half of the
+    trackpoints are removed at a time, the cost per frame is constant.
+
+    A stationary object, that has not moved more than stationary_radius
+    pixels from where it stopped, keeps two trackpoints: Where it
+    stopped, and where it is now. 0 turns this off. With the policy
+    "none", all the trackpoints are kept, also the stationary ones.
+
+    The aggregates of the track (length, size and number of trackpoints)
+    include the removed trackpoints. See Track.keep_trackpoints.
+
+    Example, each frame after the trackpoints are added:
+        for t in tracks:
+            point_budget.apply(t)
+    """
+    def __init__(self, max_trackpoints=DEFAULT_MAX_TRACKPOINTS,
+                 policy=DEFAULT_POLICY,
+                 stationary_radius=DEFAULT_STATIONARY_RADIUS):
+        self.max_trackpoints = max(int(max_trackpoints), 4)
+        self.policy, self.max_age = parse_policy(policy)
+        self.stationary_radius = stationary_radius
+
+    def _decimate(self, positions, number_of_rows):
+        # Keep the first trackpoint in each piece of the track, when it
+        # is cut into number_of_rows pieces of the same length.
+        lengths = np.hypot(*np.diff(positions, axis=0).T)
+        distances = np.concatenate(([0.0], np.cumsum(lengths)))
+        if distances[-1] == 0:
+            return np.array([], dtype=np.intp)
+        pieces = np.floor(distances / distances[-1] * number_of_rows)
+        return np.unique(pieces[1:-1], return_index=True)[1] + 1
+
+    def apply(self, track):
+        """
+        Removes the trackpoints of the track, that are over the budget.
+        """
+        if self.policy == "none":
+            return
+
+        positions = track.positions
+        n = len(positions)
+        if n >= 3 and self.stationary_radius > 0:
+            # Where it stopped, where it was and where it is.
+            stopped, previous, last = positions[-3:]
+            if np.hypot(*(last - stopped)) < self.stationary_radius and \
+               np.hypot(*(previous - stopped)) < self.stationary_radius:
+                track.keep_trackpoints(np.r_[0:n - 2, n - 1])
+                positions = track.positions
+                n -= 1
+
+        if n <= self.max_trackpoints:
+            return
+
+        # The first and the last trackpoint are always kept.
+        number_of_rows = self.max_trackpoints / 2 - 2
+        if self.policy == "decimate":
+            rows = self._decimate(positions, number_of_rows)
+        else:
+            rows = np.arange(n - 1 - number_of_rows, n - 1)
+            if self.max_age is not None:
+                times = track.times
+                rows = rows[times[rows] >= times[-1] - self.max_age]
+        track.keep_trackpoints(np.r_[0, rows, n - 1])
+        LOG.debug("Track budget: Kept %i of %i trackpoints." %
+                  (len(rows) + 2, n))
@@ -1,22 +1,46 @@
 import numpy as np
 import colorsys
 
+# The colours (and palettes) already calculated, by number of colours.
+_COLORS = {}
+_PALETTES = {}
+
 
 def get_colors(num_colors):
     """
     Gets a number of random colours, that are some spread.
+
+    The colours are only calculated once for each number of colours.
     """
+    if num_colors in _COLORS:
+        return list(_COLORS[num_colors])
+
     colors = []
 
     if num_colors > 0:
-        for i in np.arange(0., 360., 360. / num_colors):
-            np.random.seed([i])
+        random_state = np.random.RandomState()
+        for i in np.linspace(0., 360., num_colors, endpoint=False):
+            random_state.seed(int(i))
             hue = i / 360.
-            lightness = (50 + np.random.rand() * 10) / 100.
-            saturation = (90 + np.random.rand() * 10) / 100.
+            lightness = (50 + random_state.rand() * 10) / 100.
+            saturation = (90 + random_state.rand() * 10) / 100.
             colour = tuple(i * 255
                            for i in colorsys.hls_to_rgb(hue,
                                                         lightness,
                                                         saturation))
             colors.append(colour)
-    return colors
+    _COLORS[num_colors] = colors
+    return list(colors)
+
+
+def get_palette(num_colors):
+    """
+    Gets a lookup table (num_colors + 1 x 3, uint8) with the colours of
+    get_colors. Row 0 (the background) is black, and row i is colour i-1.
+    """
+    if num_colors not in _PALETTES:
+        palette = np.zeros((num_colors + 1, 3), dtype=np.uint8)
+        if num_colors > 0:
+            palette[1:] = np.array(get_colors(num_colors))
+        _PALETTES[num_colors] = palette
+    return _PALETTES[num_colors]
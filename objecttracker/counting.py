@@ -0,0 +1,403 @@
+# coding: utf-8
+import json
+import numpy as np
+import database
+import track
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+TABLE_NAME = "counts"
+
+
+# How the counts table should look.
+def create_counts_table():
+    sqls = []
+
+    value_types = [
+        "id             integer primary key",
+        "date           text",
+        "counter        text",
+        "direction      text",
+        "classification text",
+        "track          text",
+        ]
+    sql = '''CREATE TABLE IF NOT EXISTS %s (%s)''' % \
+        (TABLE_NAME, ", ".join(value_types))
+    sql = " ".join(sql.split())
+    sqls.append(sql)
+    sqls.append("CREATE INDEX IF NOT EXISTS counts_date_index ON %s (date)" %
+                (TABLE_NAME))
+
+    with database.Db() as db:
+        for sql in sqls:
+            LOG.debug(sql)
+            db.execute(sql)
+
+# Create the table.
+create_counts_table()
+
+
+def save_events_to_db(events):
+    """
+    Saves the count events to the db in one transaction.
+    """
+    if len(events) == 0:
+        return
+
+    keys = sorted(events[0].db_values().keys())
+    sql = '''INSERT INTO %s (%s) VALUES (%s)''' % (
+        TABLE_NAME,
+        ", ".join(keys),
+        ", ".join(["?"] * len(keys)))
+    values = [[e.db_values()[key] for key in keys] for e in events]
+    with database.Db() as db:
+        LOG.debug("Saving %i count events to db." % len(events))
+        db.executemany(sql, values)
+
+
+class CountingException(Exception):
+    pass
+
+
+def classify(avg_size, avg_length):
+    """
+    Classifies an object by its average size (pixels) and the average
+    length between its trackpoints (pixels / frame).
+
+    The size is the pixel count of the blobs (see
+    connected_components.Blobs), which for the objects seen here is only
+    a few percent larger than the contour area, so the limits are kept.
+    """
+    if avg_size < 700 and avg_length < 4:
+        return "pers."
+    elif avg_size < 2000:
+        return "bike"
+    elif avg_size < 10000:
+        return "car"
+    return "truck"
+
+
+def _cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def crossings(starts, ends, line_starts, line_ends):
+    """
+    Tests the segments (starts to ends) against the lines (line_starts
+    to line_ends), a segment with a line for each row. The arrays
+    broadcast, so e.g. starts[:, np.newaxis] tests all the segments
+    against all the lines.
+
+    Returns (crossed, to_the_right). to_the_right is True, when the
+    segment ends to the right of the line, seen from the start of the
+    line. A segment starting on the line does not cross it, so an object
+    on the line is only counted once.
+    """
+    lines = line_ends - line_starts
+    segments = ends - starts
+
+    # Which side of the lines the segments start and end (image
+    # coordinates, y is down, so positive is to the right).
+    start_sides = _cross(lines, starts - line_starts) > 0
+    end_sides = _cross(lines, ends - line_starts) > 0
+    # Which side of the segments the lines start and end.
+    line_start_sides = _cross(segments, line_starts - starts)
+    line_end_sides = _cross(segments, line_ends - starts)
+
+    crossed = (start_sides != end_sides) & \
+        (line_start_sides * line_end_sides <= 0)
+    return crossed, end_sides
+
+
+def signed_distances(points, line_starts, line_ends):
+    """
+    The distances of all the points (rows) from all the lines (columns),
+    positive to the right of the line, seen from its start.
+    """
+    lines = (line_ends - line_starts)[np.newaxis, :, :]
+    lengths = np.maximum(np.hypot(lines[..., 0], lines[..., 1]), 1e-9)
+    return _cross(lines, points[:, np.newaxis, :] - line_starts) / lengths
+
+
+def edge_distances(points, polygon):
+    """
+    The distances of the points (a row for each) from the nearest edge
+    of the polygon.
+    """
+    edge_starts = polygon
+    edges = np.roll(polygon, -1, axis=0) - edge_starts
+    offsets = points[:, np.newaxis, :] - edge_starts
+    lengths = np.maximum((edges ** 2).sum(axis=1), 1e-9)
+    # The nearest point on each edge.
+    fractions = np.clip((offsets * edges).sum(axis=2) / lengths, 0, 1)
+    nearest = offsets - fractions[..., np.newaxis] * edges
+    return np.sqrt((nearest ** 2).sum(axis=2)).min(axis=1)
+
+
+def inside(points, polygon):
+    """
+    Checks which of the points (a row for each) are inside the polygon,
+    by counting the edges crossed by a ray from each point.
+    """
+    x, y = points[:, 0, np.newaxis], points[:, 1, np.newaxis]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    straddles = (y1 > y) != (y2 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        edge_x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return (straddles & (x < edge_x)).sum(axis=1) % 2 == 1
+
+
+class CountEvent(object):
+    """
+    An object crossed a counting line ("left" or "right", seen from the
+    start of the line), or entered or exited a counting zone.
+    """
+    __slots__ = ("timestamp", "counter", "direction", "classification",
+                 "track_name")
+
+    def __init__(self, timestamp, counter, direction, classification,
+                 track_name):
+        self.timestamp = timestamp
+        self.counter = counter
+        self.direction = direction
+        self.classification = classification
+        self.track_name = track_name
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __str__(self):
+        return "%s: %s %s %s." % (self.timestamp, self.counter,
+                                  self.classification, self.direction)
+
+    def db_values(self):
+        return {
+            "date": self.timestamp.isoformat(),
+            "counter": self.counter,
+            "direction": self.direction,
+            "classification": self.classification,
+            "track": self.track_name,
+            }
+
+    def save_to_db(self):
+        save_events_to_db([self])
+
+
+class _TrackState(object):
+    """
+    What the counter remembers about a track: For each line the side
+    (1 right, -1 left, 0 not known yet) and where the track was, when it
+    was last more than the margin from the line, and if it has been
+    counted. For each zone if the track is inside (None if not known
+    yet), and the directions counted.
+    """
+    __slots__ = ("sides", "anchors", "counted", "inside", "zone_events",
+                 "last_seen")
+
+    def __init__(self, sides, anchors, inside, last_seen):
+        self.sides = sides
+        self.anchors = anchors
+        self.counted = np.zeros(len(sides), dtype=bool)
+        self.inside = inside
+        self.zone_events = set()
+        self.last_seen = last_seen
+
+
+class Counter(object):
+    """
+    Counts the objects crossing counting lines, or entering and exiting
+    counting zones (polygons), as they move, instead of when their
+    tracks are saved.
+
+    Each frame, the last positions of all the tracks are tested against
+    all the lines and zones at once. A track is only counted, when it has
+    at least min_trackpoints trackpoints, so noise is not counted.
+
+    A line is counted, when the track has moved from more than margin
+    pixels on one side of it, to more than margin pixels on the other
+    side, through the line. Where the track started is the first side,
+    so a crossing before min_trackpoints is counted too. Likewise a zone
+    is entered or exited, when the track is more than margin pixels from
+    its edges. Each track is counted at most once for each line, and
+    once for each direction of each zone, so an object moving along a
+    line, or back and forth over it, is counted once.
+
+    The counter remembers a track for memory seconds after it has gone,
+    so a track re-linked within the relink window (see relink) is not
+    counted again. The new track, that it is re-linked with, may have
+    been counted already, so the counter must be told (see
+    Counter.relink).
+
+    The lines and zones of a camera are in a json file (see from_file):
+    {
+        "lines": [{"name": "Street", "start": [10, 120],
+                   "end": [310, 120]}],
+        "zones": [{"name": "Bike lane",
+                   "points": [[0, 0], [100, 0], [100, 50], [0, 50]]}]
+    }
+
+    Example, each frame:
+        for event in counter.update(tracks, timestamp):
+            event.save_to_db()
+    """
+    def __init__(self, lines=(), zones=(), min_trackpoints=3, margin=2.0,
+                 memory=2.0):
+        self.line_names = [name for name, start, end in lines]
+        self.line_starts = np.array([start for name, start, end in lines],
+                                    dtype=np.float64).reshape(-1, 2)
+        self.line_ends = np.array([end for name, start, end in lines],
+                                  dtype=np.float64).reshape(-1, 2)
+        self.zones = [(name, np.array(points, dtype=np.float64))
+                      for name, points in zones]
+        self.min_trackpoints = min_trackpoints
+        self.margin = margin
+        self.memory = memory
+        self._states = {}
+
+    @classmethod
+    def from_file(cls, filename, min_trackpoints=3, margin=2.0, memory=2.0):
+        try:
+            with open(filename) as f:
+                config = json.load(f)
+            lines = [(l["name"], l["start"], l["end"])
+                     for l in config.get("lines", [])]
+            zones = [(z["name"], z["points"])
+                     for z in config.get("zones", [])]
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            raise CountingException("Could not read the counting lines and \
+zones in '%s': %s" % (filename, e))
+        for name, points in zones:
+            if len(points) < 3:
+                raise CountingException("The counting zone '%s' needs at \
+least 3 points." % name)
+        return cls(lines, zones, min_trackpoints, margin, memory)
+
+    def _sides(self, points):
+        """
+        The side of each line (columns) of the points (rows), 0 if the
+        point is within the margin.
+        """
+        distances = signed_distances(points, self.line_starts,
+                                     self.line_ends)
+        return np.where(distances > self.margin, 1,
+                        np.where(distances < -self.margin, -1, 0))
+
+    def _zone_states(self, points, polygon):
+        """
+        For each point True if it is inside the polygon, and False if it
+        is outside, or None if it is within the margin of an edge.
+        """
+        is_inside = inside(points, polygon)
+        settled = edge_distances(points, polygon) > self.margin
+        return [bool(i) if s else None for i, s in zip(is_inside, settled)]
+
+    def _new_state(self, t, now):
+        first_position = np.array([t.first_position], dtype=np.float64)
+        return _TrackState(
+            self._sides(first_position)[0],
+            np.repeat(first_position, len(self.line_names), axis=0),
+            [self._zone_states(first_position, polygon)[0]
+             for name, polygon in self.zones],
+            now)
+
+    def relink(self, ended_track, new_track):
+        """
+        The new track is connected with the ended track it continues
+        (see relink). The lines and zone directions counted by either
+        are counted for the ended track, and it goes on from where the
+        new track is, so the object is not counted again.
+        """
+        new_state = self._states.pop(new_track, None)
+        if new_state is None:
+            return
+        state = self._states.get(ended_track)
+        if state is not None:
+            new_state.counted |= state.counted
+            new_state.zone_events |= state.zone_events
+        self._states[ended_track] = new_state
+
+    def update(self, tracks, timestamp):
+        """
+        Moves the tracks to their last positions. Returns the count
+        events of the moves.
+        """
+        now = track.to_seconds(timestamp)
+        counted_tracks = []
+        for t in tracks:
+            if t.number_of_trackpoints() < self.min_trackpoints:
+                continue
+            if t not in self._states:
+                self._states[t] = self._new_state(t, now)
+            self._states[t].last_seen = now
+            counted_tracks.append(t)
+        # The tracks gone for longer than memory are forgotten.
+        for t in [t for t, state in self._states.items()
+                  if now - state.last_seen > self.memory]:
+            del self._states[t]
+
+        events = []
+        if len(counted_tracks) == 0:
+            return events
+        positions = np.array([t.last_position for t in counted_tracks],
+                             dtype=np.float64)
+        classifications = {}
+
+        def event(t, counter, direction):
+            if t not in classifications:
+                classifications[t] = classify(t.size_avg(), t.length_avg())
+            events.append(CountEvent(timestamp, counter, direction,
+                                     classifications[t], t.name))
+
+        if len(self.line_names) > 0:
+            states = [self._states[t] for t in counted_tracks]
+            sides = self._sides(positions)
+            last_sides = np.array([state.sides for state in states])
+            anchors = np.array([state.anchors for state in states])
+            counted = np.array([state.counted for state in states])
+
+            # The tracks (rows) that have moved to the other side of the
+            # lines (columns), and are not counted yet.
+            moved = (sides != 0) & (sides != last_sides)
+            rows, columns = np.nonzero(moved & (last_sides != 0) & ~counted)
+            # Through the lines, not around their ends.
+            crossed, to_the_right = crossings(
+                anchors[rows, columns], positions[rows],
+                self.line_starts[columns], self.line_ends[columns])
+            for i, j, right in zip(rows[crossed], columns[crossed],
+                                   to_the_right[crossed]):
+                counted[i, j] = True
+                event(counted_tracks[i], self.line_names[j],
+                      "right" if right else "left")
+
+            last_sides[moved] = sides[moved]
+            rows, columns = np.nonzero(moved)
+            anchors[rows, columns] = positions[rows]
+            for i, state in enumerate(states):
+                state.sides = last_sides[i]
+                state.anchors = anchors[i]
+                state.counted = counted[i]
+
+        for z, (name, polygon) in enumerate(self.zones):
+            for t, is_inside in zip(counted_tracks,
+                                    self._zone_states(positions, polygon)):
+                state = self._states[t]
+                if is_inside is None or state.inside[z] == is_inside:
+                    continue
+                was_inside, state.inside[z] = state.inside[z], is_inside
+                if was_inside is None:
+                    # Started on the edge.
+                    continue
+                direction = "enter" if is_inside else "exit"
+                if (z, direction) not in state.zone_events:
+                    state.zone_events.add((z, direction))
+                    event(t, name, direction)
+
+        for e in events:
+            LOG.info("Count: %s" % e)
+        return events
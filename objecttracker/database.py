@@ -35,6 +35,14 @@ class Db:
         LOG.debug("Committing SQL.")
         self.conn.commit()
 
+    def executemany(self, sql, values):
+        LOG.debug("Executing SQL: '%s' with %i sets of values." % (
+            sql, len(values)))
+        self.c.executemany(sql, values)
+
+        LOG.debug("Committing SQL.")
+        self.conn.commit()
+
     def get_rows(self, sql, where_values=None):
         if where_values is None:
             LOG.debug("Executing SQL: '%s'." % (sql))
@@ -0,0 +1,163 @@
+# coding: utf-8
+import multiprocessing
+import time
+import Queue
+import framebuffer
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# What to do, when the queue is full:
+# block: Wait until there is room in the queue.
+# drop-oldest: Remove the oldest frame in the queue to make room.
+# drop-newest: Drop the frame that is put into the queue.
+# every-nth: Only keep every nth frame and block on the kept ones.
+POLICIES = ("block", "drop-oldest", "drop-newest", "every-nth")
+
+# The number of dropped frames is logged every this many dropped frames.
+DROPPED_LOG_INTERVAL = 100
+
+# Put after the last frame (see FrameQueue.put_end). Each stage passes
+# it on to the next stage, and stops.
+END_OF_FRAMES = None
+
+
+class FrameQueueException(Exception):
+    pass
+
+
+class FrameQueue(object):
+    """
+    A bounded multiprocessing queue with a policy for what to do,
+    when the consumer falls behind.
+
+    The memory and the latency is bounded by the size of the queue.
+    The items are stamped with the time they are put, so the time each
+    item was in the queue is known, when it is taken (see get_timed).
+    Dropped frames are counted, and on_drop (if set) is called with
+    every dropped item, e.g. to release its slots in a frame buffer.
+
+    If the items carry slots of frame buffers, the buffers can be given
+    at the same positions as the slots in the items (see
+    framebuffer.SlotReleaser). The slots of the dropped items are then
+    released, and the slots are marked as queued, or held by the process
+    that got them, so the slots of a process that dies can be released
+    (see framebuffer.FrameRingBuffer.reclaim).
+    """
+    def __init__(self, maxsize, policy="block", nth=1, on_drop=None,
+                 buffers=None):
+        if policy not in POLICIES:
+            raise FrameQueueException("Unknown policy: '%s'. Must be one \
+of: %s." % (policy, ", ".join(POLICIES)))
+        if nth < 1:
+            raise FrameQueueException("nth must be 1 or larger.")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.nth = nth
+        self._slots = None
+        if buffers is not None:
+            self._slots = framebuffer.SlotReleaser(*buffers)
+            if on_drop is None:
+                on_drop = self._slots
+        self.on_drop = on_drop
+        self._queue = multiprocessing.Queue(maxsize)
+        self._frames_in = multiprocessing.Value('L', 0)
+        self._dropped = multiprocessing.Value('L', 0)
+
+    def _drop(self, item):
+        with self._dropped.get_lock():
+            self._dropped.value += 1
+            dropped = self._dropped.value
+        if dropped % DROPPED_LOG_INTERVAL == 1:
+            LOG.warning("%i of %i frames dropped (policy: %s)." % (
+                dropped, self.frames_in(), self.policy))
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Puts the item into the queue, following the policy.
+        Returns False if the item was dropped.
+
+        Raises Queue.Full, if the item could not be put within the
+        timeout (policy block or every-nth). The slots of the item are
+        then held by this process again, like before the put.
+        """
+        with self._frames_in.get_lock():
+            self._frames_in.value += 1
+            number = self._frames_in.value
+
+        if self.policy == "every-nth" and (number - 1) % self.nth != 0:
+            self._drop(item)
+            return False
+
+        if self._slots is not None:
+            self._slots.hold(item, framebuffer.QUEUED)
+
+        stamped_item = (time.time(), item)
+        if self.policy in ("block", "every-nth"):
+            try:
+                self._queue.put(stamped_item, block, timeout)
+            except Queue.Full:
+                if self._slots is not None:
+                    self._slots.hold(item)
+                raise
+            return True
+
+        if self.policy == "drop-newest":
+            try:
+                self._queue.put_nowait(stamped_item)
+            except Queue.Full:
+                LOG.debug("Queue is full. Dropping the newest frame.")
+                self._drop(item)
+                return False
+            return True
+
+        # Drop oldest.
+        while True:
+            try:
+                self._queue.put_nowait(stamped_item)
+                return True
+            except Queue.Full:
+                try:
+                    put_time, oldest_item = self._queue.get_nowait()
+                except Queue.Empty:
+                    # The consumer emptied the queue in the meantime.
+                    continue
+                LOG.debug("Queue is full. Dropping the oldest frame.")
+                self._drop(oldest_item)
+
+    def put_end(self, timeout=None):
+        """
+        Puts END_OF_FRAMES into the queue. It is never dropped.
+        """
+        self._queue.put((time.time(), END_OF_FRAMES), True, timeout)
+
+    def get(self, block=True, timeout=None):
+        return self.get_timed(block, timeout)[0]
+
+    def get_timed(self, block=True, timeout=None):
+        """
+        Gets an item and the number of seconds it was in the queue.
+        """
+        put_time, item = self._queue.get(block, timeout)
+        if self._slots is not None and item is not END_OF_FRAMES:
+            self._slots.hold(item)
+        return item, time.time() - put_time
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def frames_in(self):
+        """
+        Number of items put into the queue, including the dropped ones.
+        """
+        return self._frames_in.value
+
+    def dropped(self):
+        """
+        Number of dropped items.
+        """
+        return self._dropped.value
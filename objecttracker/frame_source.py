@@ -0,0 +1,147 @@
+# coding: utf-8
+import os
+import collections
+import datetime
+from multiprocessing.pool import ThreadPool
+import cv2
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# Example filename: 2015-05-03T12:55:15.462884.png
+FILENAME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f.png"
+
+# The recorded frames are saved in a directory for each hour.
+# Example: 20150503T12
+HOUR_DIRECTORY_FORMAT = "%Y%m%dT%H"
+
+
+class FrameSourceException(Exception):
+    pass
+
+
+def parse_timestamp(filename):
+    """
+    Extracts the timestamp from the filename of a frame.
+    Example filename above.
+
+    The fields are sliced out of the filename, which is a lot faster
+    than strptime. Frames saved exactly on the second have no
+    microseconds in the filename (see datetime.isoformat).
+    """
+    name = os.path.splitext(filename)[0]
+    try:
+        return datetime.datetime(int(name[0:4]),
+                                 int(name[5:7]),
+                                 int(name[8:10]),
+                                 int(name[11:13]),
+                                 int(name[14:16]),
+                                 int(name[17:19]),
+                                 int(name[20:26].ljust(6, "0")))
+    except ValueError:
+        return datetime.datetime.strptime(filename, FILENAME_FORMAT)
+
+
+def frame_files(path):
+    """
+    Finds all the png files in path and its subdirectories.
+    Yields (timestamp, filename) in ascending order.
+    """
+    for root, dirs, files in os.walk(path):
+        LOG.debug("Current dir, '%s': %i files." % (root, len(files)))
+
+        # Walk the subdirectories in order as well.
+        dirs.sort()
+
+        # Sort the png files by their timestamps, so the frames come in
+        # ascending order. The filenames can not be sorted as text, as a
+        # frame saved exactly on the second has no microseconds.
+        frames = sorted((parse_timestamp(filename), filename)
+                        for filename in files if filename.endswith(".png"))
+
+        for timestamp, filename in frames:
+            yield timestamp, os.path.join(root, filename)
+
+
+def read_frames(path):
+    """
+    Reads all the frames in path and its subdirectories.
+    Yields (frame, timestamp).
+    """
+    for timestamp, filename in frame_files(path):
+        yield cv2.imread(filename), timestamp
+
+
+def hour_directories(path):
+    """
+    Gets the hour directories (see HOUR_DIRECTORY_FORMAT) in path,
+    sorted by time.
+    """
+    directories = []
+    for name in os.listdir(path):
+        try:
+            datetime.datetime.strptime(name, HOUR_DIRECTORY_FORMAT)
+        except ValueError:
+            continue
+        if os.path.isdir(os.path.join(path, name)):
+            directories.append(name)
+    return [os.path.join(path, name) for name in sorted(directories)]
+
+
+class DirectoryFrameSource(object):
+    """
+    Reads the frames in a directory (and its subdirectories) in order.
+
+    The png files are decoded by a pool of threads (cv2.imread releases
+    the GIL while decoding). Up to prefetch frames are decoded ahead of
+    the one being returned, so the memory used is bounded.
+
+    If frame_buffer (a framebuffer.FrameRingBuffer) is set, each frame is
+    copied into a slot by the decoding thread, and the slot index is
+    returned instead of the frame. The buffer must have more slots than
+    prefetch, otherwise the threads can end up waiting for each other.
+
+    Example:
+        for frame, timestamp in DirectoryFrameSource("/data/frames"):
+            ...
+    """
+    def __init__(self, path, threads=4, prefetch=16, frame_buffer=None,
+                 files=None):
+        self.path = path
+        self.threads = threads
+        self.prefetch = max(prefetch, 1)
+        self.frame_buffer = frame_buffer
+
+        # (timestamp, filename) pairs. Found in path, if not set.
+        self.files = files
+
+    def _decode(self, filename):
+        frame = cv2.imread(filename)
+        if frame is None:
+            raise FrameSourceException("Could not read '%s'." % filename)
+        if self.frame_buffer is not None:
+            return self.frame_buffer.write(frame)
+        return frame
+
+    def __iter__(self):
+        files = self.files
+        if files is None:
+            files = frame_files(self.path)
+
+        pool = ThreadPool(self.threads)
+        pending = collections.deque()
+        try:
+            for timestamp, filename in files:
+                pending.append(
+                    (pool.apply_async(self._decode, (filename, )), timestamp))
+                if len(pending) >= self.prefetch:
+                    result, timestamp = pending.popleft()
+                    yield result.get(), timestamp
+
+            while len(pending) > 0:
+                result, timestamp = pending.popleft()
+                yield result.get(), timestamp
+        finally:
+            pool.close()
+            pool.join()
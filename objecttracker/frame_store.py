@@ -0,0 +1,212 @@
+# coding: utf-8
+import weakref
+import numpy as np
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# Only keep the objects. A crop is a small part of the frame.
+DEFAULT_RETENTION = "crops"
+
+RETENTIONS = ("all", "crops", "middle", "every:<n>", "none")
+
+
+class FrameStoreException(Exception):
+    pass
+
+
+def parse_retention(text):
+    """
+    Parses a retention policy (see FrameStore).
+    Returns (policy, n), where n is only used by "every".
+    """
+    fields = text.strip().split(":")
+    try:
+        if fields[0] == "every" and len(fields) == 2 and int(fields[1]) > 0:
+            return fields[0], int(fields[1])
+        if fields[0] in RETENTIONS and len(fields) == 1:
+            return fields[0], 1
+    except ValueError:
+        pass
+    raise FrameStoreException("Unknown frame retention '%s'. Use one of: \
+%s." % (text, ", ".join(RETENTIONS)))
+
+
+class FrameHandle(object):
+    """
+    A reference from a trackpoint to the pixels of its frame, or of the
+    object in the frame (a crop). See FrameStore.
+
+    The pixels are only copied when the handle is kept. A pickled handle
+    brings its pixels along, so it can be resolved in another process.
+    """
+    __slots__ = ("timestamp", "shape", "box", "_frame", "_pixels")
+
+    def __init__(self, frame, timestamp, box=None):
+        self.timestamp = timestamp
+        self.shape = frame.shape
+        self.box = box
+        self._frame = frame
+        self._pixels = None
+
+    def __getstate__(self):
+        return self.timestamp, self.shape, self.box, self._pixels
+
+    def __setstate__(self, state):
+        self.timestamp, self.shape, self.box, self._pixels = state
+        self._frame = None
+
+    def resolve(self):
+        """
+        Gets a new frame with the pixels. If only the crop is kept, the
+        rest of the frame is black. None if the pixels were not kept.
+        """
+        if self._pixels is None:
+            return None
+        if self.box is None:
+            return self._pixels.copy()
+        x, y, width, height = self.box
+        frame = np.zeros(self.shape, dtype=self._pixels.dtype)
+        frame[y:y + height, x:x + width] = self._pixels
+        return frame
+
+
+class FrameStore(object):
+    """
+    Keeps the pixels the tracks need to be saved to disk (see
+    Track.save_trackpoints_to_directory), instead of a whole raw frame
+    for every trackpoint.
+
+    The trackpoints get handles (FrameHandle) to the raw frame, that is
+    not copied. After the tracks are matched (commit), the retention
+    policy decides which handles of each track are kept, and only their
+    pixels are copied out of the raw frame:
+        "all": The whole frame of every trackpoint.
+        "crops": The bounding box of the object (plus margin) of every
+            trackpoint.
+        "middle": The frame nearest the middle of the track in time. The
+            frames before the middle are dropped as the track grows.
+        "every:<n>": The frame of every n-th trackpoint added to the
+            track, also if the budget has removed trackpoints since.
+        "none": No frames.
+
+    The copy of a frame is shared by all the handles of the frame. The
+    frames are reference counted by the handles: A frame is freed, when
+    the last handle to it is dropped, e.g. when its track is pruned.
+    The store only keeps weak references, for the statistics.
+
+    Example, each frame:
+        trackpoints = get_trackpoints(..., frame_store=frame_store)
+        (match the trackpoints with the tracks)
+        frame_store.commit(tracks)
+        for t in tracks_to_save:
+            frame_store.finish(t)
+    """
+    def __init__(self, retention=DEFAULT_RETENTION, margin=8):
+        self.retention = retention
+        self.policy, self.n = parse_retention(retention)
+        self.margin = margin
+        self._pending = []
+        self._frames = weakref.WeakValueDictionary()
+
+    @property
+    def number_of_frames(self):
+        """
+        The number of frame copies kept by the handles.
+        """
+        return len(self._frames)
+
+    @property
+    def nbytes(self):
+        return sum(frame.nbytes for frame in self._frames.values())
+
+    def handle(self, frame, timestamp, box=None):
+        """
+        Gets a handle to the frame of a trackpoint. The box (x, y, width,
+        height) is the bounding box of the object in the frame.
+        The frame must not change until commit.
+        """
+        if self.policy != "crops":
+            box = None
+        elif box is not None:
+            x, y, width, height = box
+            x0 = max(x - self.margin, 0)
+            y0 = max(y - self.margin, 0)
+            x1 = min(x + width + self.margin, frame.shape[1])
+            y1 = min(y + height + self.margin, frame.shape[0])
+            box = (x0, y0, x1 - x0, y1 - y0)
+        handle = FrameHandle(frame, timestamp, box)
+        self._pending.append(handle)
+        return handle
+
+    def _keep(self, ordinal):
+        if self.policy == "none":
+            return False
+        if self.policy == "every":
+            return ordinal % self.n == 0
+        return True
+
+    def _load(self, handle):
+        if handle.box is not None:
+            x, y, width, height = handle.box
+            handle._pixels = handle._frame[y:y + height, x:x + width].copy()
+            return
+        pixels = self._frames.get(handle.timestamp)
+        if pixels is None:
+            pixels = handle._frame.copy()
+            self._frames[handle.timestamp] = pixels
+        handle._pixels = pixels
+
+    def commit(self, tracks):
+        """
+        Applies the retention policy to the new trackpoints of the tracks,
+        and copies the pixels of the handles that are kept. The raw frame
+        is not used after this.
+        """
+        for t in tracks:
+            frames = t.frames
+            number_of_trackpoints = len(frames)
+            # The new trackpoints are last. The ordinal (the number of
+            # trackpoints added before) does not change, when the
+            # budget removes trackpoints.
+            first_ordinal = t.number_of_trackpoints() - number_of_trackpoints
+            i = number_of_trackpoints - 1
+            while i >= 0 and isinstance(frames[i], FrameHandle) and \
+                    frames[i]._frame is not None:
+                if self._keep(first_ordinal + i):
+                    self._load(frames[i])
+                else:
+                    frames[i] = None
+                i -= 1
+
+            if self.policy == "middle" and number_of_trackpoints > 0:
+                # The middle of the track in time only moves forward, so
+                # the frames before it can never be the middle, except
+                # the last of them.
+                times = t.times
+                j = np.searchsorted(times, (times[0] + times[-1]) / 2.0) - 2
+                while j >= 0 and frames[j] is not None:
+                    frames[j] = None
+                    j -= 1
+
+        for handle in self._pending:
+            handle._frame = None
+        self._pending = []
+
+    def finish(self, track):
+        """
+        Drops the handles, that are not needed to save the track.
+        """
+        if self.policy != "middle":
+            return
+        frames = track.frames
+        kept = [i for i, frame in enumerate(frames) if frame is not None]
+        if len(kept) == 0:
+            return
+        times = track.times
+        middle_time = (times[0] + times[-1]) / 2.0
+        middle = min(kept, key=lambda i: abs(times[i] - middle_time))
+        for i in kept:
+            if i != middle:
+                frames[i] = None
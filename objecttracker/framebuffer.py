@@ -0,0 +1,169 @@
+# coding: utf-8
+import os
+import ctypes
+import multiprocessing
+import numpy as np
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# Who holds a slot: A free slot, a slot in a queue, or else the pid of
+# the process holding it.
+FREE = 0
+QUEUED = -1
+
+
+class FrameBufferException(Exception):
+    pass
+
+
+class FrameRingBuffer(object):
+    """
+    A ring of preallocated frame slots in shared memory.
+
+    Instead of putting whole frames into a multiprocessing.Queue (where
+    they are pickled, copied through a pipe and unpickled), the frame is
+    written once into a free slot, and only the slot index is put into
+    the queue:
+
+        raw_frames.put([raw_buffer.write(frame), timestamp])
+        ...
+        slot, timestamp = raw_frames.get(block=True)
+        frame = raw_buffer.read(slot)
+        ...
+        raw_buffer.release(slot)
+
+    The slot must be released by the last process using it, otherwise
+    the writer will run out of free slots and block.
+
+    The buffer knows which process holds each slot (see hold), so the
+    slots of a process that has died can be released (see reclaim).
+    A FrameQueue with the buffer marks the slots it carries.
+
+    The buffer must be created before the processes are started, so
+    the shared memory is inherited by the child processes.
+    """
+    def __init__(self, number_of_slots, shape, dtype=np.uint8):
+        self.number_of_slots = number_of_slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slot_size = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        LOG.debug("Allocating %i slots of %i bytes." % (number_of_slots,
+                                                        self.slot_size))
+        self._data = multiprocessing.RawArray(
+            ctypes.c_uint8, self.slot_size * number_of_slots)
+
+        # The free slots. A slot is taken from this queue when a frame is
+        # written and put back, when it is released.
+        self._free_slots = multiprocessing.Queue()
+        for slot in range(number_of_slots):
+            self._free_slots.put(slot)
+        self._holders = multiprocessing.RawArray(ctypes.c_int,
+                                                 number_of_slots)
+
+        self._frames = None
+
+    def __getstate__(self):
+        # The numpy view is recreated in the process using it.
+        state = self.__dict__.copy()
+        state["_frames"] = None
+        return state
+
+    @property
+    def frames(self):
+        """
+        All the slots as one numpy array. Shape: (number_of_slots, ) + shape.
+        """
+        if self._frames is None:
+            self._frames = np.frombuffer(self._data, dtype=self.dtype).reshape(
+                (self.number_of_slots, ) + self.shape)
+        return self._frames
+
+    def acquire(self, block=True, timeout=None):
+        """
+        Gets a free slot. Blocks until a slot is released, if all the
+        slots are in use.
+        """
+        slot = self._free_slots.get(block=block, timeout=timeout)
+        self._holders[slot] = os.getpid()
+        return slot
+
+    def release(self, slot):
+        """
+        Gives the slot back, so it can be written to again.
+        """
+        self._holders[slot] = FREE
+        self._free_slots.put(slot)
+
+    def hold(self, slot, holder=None):
+        """
+        Marks the slot as held by the holder: QUEUED or the pid of a
+        process (default: this process).
+        """
+        if holder is None:
+            holder = os.getpid()
+        self._holders[slot] = holder
+
+    def holder(self, slot):
+        return self._holders[slot]
+
+    def reclaim(self, pid):
+        """
+        Releases the slots held by the process with the pid, e.g. when it
+        has died. Returns the number of slots released.
+        """
+        slots = [slot for slot, holder in enumerate(self._holders)
+                 if holder == pid]
+        for slot in slots:
+            self.release(slot)
+        return len(slots)
+
+    def write(self, frame, block=True, timeout=None):
+        """
+        Copies the frame into a free slot and returns the slot index.
+        """
+        if frame.shape != self.shape:
+            raise FrameBufferException(
+                "Frame shape %s does not match the buffer shape %s." % (
+                    frame.shape, self.shape))
+        slot = self.acquire(block=block, timeout=timeout)
+        np.copyto(self.frames[slot], frame, casting="unsafe")
+        return slot
+
+    def read(self, slot):
+        """
+        Gets the frame in the slot. The frame is a view into the shared
+        memory, so copy it, if it must be kept after the slot is released.
+        """
+        return self.frames[slot]
+
+
+class SlotReleaser(object):
+    """
+    Releases the slots of a queue item, e.g. when a frame is dropped.
+
+    Each slot in the item is released in the buffer at the same
+    position. E.g. SlotReleaser(mask_buffer, raw_buffer) for an item
+    [mask_slot, raw_slot, timestamp]. Slots that are None are skipped.
+    """
+    def __init__(self, *buffers):
+        self.buffers = buffers
+
+    def _slots(self, item):
+        for buffer, slot in zip(self.buffers, item):
+            if buffer is not None and slot is not None:
+                yield buffer, slot
+
+    def __call__(self, item):
+        for buffer, slot in self._slots(item):
+            buffer.release(slot)
+
+    def hold(self, item, holder=None):
+        """
+        Marks the slots of the item as held by the holder. See
+        FrameRingBuffer.hold.
+        """
+        for buffer, slot in self._slots(item):
+            buffer.hold(slot, holder)
@@ -0,0 +1,205 @@
+# coding: utf-8
+import datetime
+import numpy as np
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# The gate is this many standard deviations of the predicted position.
+GATE_SIGMAS = 3.0
+# The gate is kept between these parts of the track match radius.
+MIN_GATE_SCALE = 0.5
+MAX_GATE_SCALE = 2.0
+
+
+def to_seconds(timestamp):
+    return (timestamp - EPOCH).total_seconds()
+
+
+class KalmanBank(object):
+    """
+    Constant velocity Kalman filters for all the active tracks.
+
+    The state (x, y, vx, vy) and the covariance of every track are rows
+    in stacked numpy arrays, so the prediction of all the tracks and the
+    update of all the matched tracks are one vectorized operation each
+    per frame. Positions are in pixels and velocities in pixels / second,
+    and the time between the frames is taken from the timestamps, so a
+    dropped frame is just a longer prediction.
+
+    Example, each frame:
+        bank.sync(tracks)
+        bank.predict(timestamp)
+        positions = bank.positions(tracks)
+        ...
+        filtered_positions = bank.update(matched_tracks, measurements)
+    """
+    def __init__(self, measurement_std=2.0, acceleration_std=200.0,
+                 initial_velocity_std=100.0):
+        self.measurement_variance = measurement_std ** 2
+        self.acceleration_variance = acceleration_std ** 2
+        self.initial_velocity_variance = initial_velocity_std ** 2
+
+        # Row i belongs to self._tracks[i]. Only the first len(self)
+        # rows are used.
+        self._tracks = []
+        self._rows = {}
+        self._states = np.zeros((16, 4))
+        self._covariances = np.zeros((16, 4, 4))
+        self._times = np.zeros(16)
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __contains__(self, track):
+        return track in self._rows
+
+    def add(self, track):
+        """
+        Starts a filter at the last trackpoint of the track. The velocity
+        is from the last two trackpoints, if the track has them.
+        """
+        n = len(self._tracks)
+        if n == len(self._times):
+            self._states = np.resize(self._states, (2 * n, 4))
+            self._covariances = np.resize(self._covariances, (2 * n, 4, 4))
+            self._times = np.resize(self._times, 2 * n)
+
+        positions = track.positions[-2:]
+        times = track.times[-2:]
+        velocity = (0.0, 0.0)
+        if len(times) > 1:
+            dt = times[1] - times[0]
+            if dt > 0:
+                velocity = tuple((positions[1] - positions[0]) / dt)
+
+        self._states[n] = tuple(positions[-1]) + velocity
+        self._covariances[n] = np.diag(
+            [self.measurement_variance] * 2 +
+            [self.initial_velocity_variance] * 2)
+        self._times[n] = times[-1]
+        self._rows[track] = n
+        self._tracks.append(track)
+
+    def remove(self, track):
+        """
+        Removes the filter of the track. The last row is moved into its
+        place, so the used rows stay together.
+        """
+        row = self._rows.pop(track)
+        last_row = len(self._tracks) - 1
+        last_track = self._tracks.pop()
+        if row != last_row:
+            self._states[row] = self._states[last_row]
+            self._covariances[row] = self._covariances[last_row]
+            self._times[row] = self._times[last_row]
+            self._tracks[row] = last_track
+            self._rows[last_track] = row
+
+    def sync(self, tracks):
+        """
+        Makes the bank have a filter for exactly the tracks.
+        """
+        current = set(tracks)
+        for t in [t for t in self._tracks if t not in current]:
+            self.remove(t)
+        for t in tracks:
+            if t not in self._rows:
+                self.add(t)
+
+    def predict(self, timestamp):
+        """
+        Moves all the filters forward to the timestamp.
+        """
+        n = len(self._tracks)
+        if n == 0:
+            return
+        dt = np.maximum(to_seconds(timestamp) - self._times[:n], 0)
+        states = self._states[:n]
+        states[:, 0] += states[:, 2] * dt
+        states[:, 1] += states[:, 3] * dt
+
+        transitions = np.tile(np.eye(4), (n, 1, 1))
+        transitions[:, 0, 2] = dt
+        transitions[:, 1, 3] = dt
+
+        # White noise acceleration.
+        dt2 = dt ** 2
+        dt3 = dt2 * dt / 2
+        dt4 = dt2 * dt2 / 4
+        noise = np.zeros((n, 4, 4))
+        noise[:, 0, 0] = noise[:, 1, 1] = dt4
+        noise[:, 0, 2] = noise[:, 2, 0] = dt3
+        noise[:, 1, 3] = noise[:, 3, 1] = dt3
+        noise[:, 2, 2] = noise[:, 3, 3] = dt2
+
+        self._covariances[:n] = np.einsum(
+            "nij,njk,nlk->nil",
+            transitions, self._covariances[:n], transitions) + \
+            noise * self.acceleration_variance
+        self._times[:n] = to_seconds(timestamp)
+
+    def position(self, track):
+        """
+        The (predicted) position of the track.
+        """
+        state = self._states[self._rows[track]]
+        return state[0], state[1]
+
+    def positions(self, tracks):
+        """
+        The (predicted) positions of the tracks, a row for each.
+        """
+        rows = [self._rows[t] for t in tracks]
+        return self._states[rows, :2].reshape(-1, 2)
+
+    def position_variances(self, tracks):
+        """
+        The variances of the (predicted) x and y of the tracks.
+        """
+        rows = [self._rows[t] for t in tracks]
+        return self._covariances[rows][:, [0, 1], [0, 1]].reshape(-1, 2)
+
+    def gate_radii(self, tracks, track_match_radius, sigmas=GATE_SIGMAS,
+                   min_scale=MIN_GATE_SCALE, max_scale=MAX_GATE_SCALE):
+        """
+        The match radius of each track: sigmas standard deviations of the
+        predicted measurement (the position variance plus the measurement
+        variance). A track that has been predicted for long, or moves
+        erratically, gets a wider gate, and a steady track a narrower.
+        The radius is clamped to [min_scale, max_scale] times the track
+        match radius.
+        """
+        variances = self.position_variances(tracks).max(axis=1) + \
+            self.measurement_variance
+        return np.clip(sigmas * np.sqrt(variances),
+                       min_scale * track_match_radius,
+                       max_scale * track_match_radius)
+
+    def update(self, tracks, measurements):
+        """
+        Updates the filters of the tracks with the measured positions
+        (a row for each track). Returns the filtered positions.
+        """
+        if len(tracks) == 0:
+            return np.zeros((0, 2))
+        rows = [self._rows[t] for t in tracks]
+        states = self._states[rows]
+        covariances = self._covariances[rows]
+
+        innovations = np.asarray(measurements, dtype=np.float64) - \
+            states[:, :2]
+        innovation_covariances = covariances[:, :2, :2] + \
+            np.eye(2) * self.measurement_variance
+        gains = np.einsum("nij,njk->nik", covariances[:, :, :2],
+                          np.linalg.inv(innovation_covariances))
+
+        states += np.einsum("nij,nj->ni", gains, innovations)
+        covariances -= np.einsum("nij,njk->nik", gains,
+                                 covariances[:, :2, :])
+        self._states[rows] = states
+        self._covariances[rows] = covariances
+        return states[:, :2]
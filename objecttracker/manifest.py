@@ -0,0 +1,188 @@
+# coding: utf-8
+import os
+import datetime
+import frame_source
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# Each hour directory has a manifest with the filenames of its frames,
+# one per line, in the order they were saved (ascending time).
+MANIFEST_FILENAME = "frames.idx"
+
+# Accepted formats of the --from and --to arguments.
+TIME_FORMATS = ("%Y-%m-%dT%H:%M:%S.%f",
+                "%Y-%m-%dT%H:%M:%S",
+                "%Y-%m-%dT%H:%M",
+                "%Y-%m-%dT%H",
+                "%Y-%m-%d")
+
+
+class ManifestException(Exception):
+    pass
+
+
+def parse_time(text):
+    """
+    Parses a time given on the command line. See TIME_FORMATS.
+    """
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, time_format)
+        except ValueError:
+            pass
+    raise ManifestException("Could not parse the time '%s'. Use one of the \
+formats: %s." % (text, ", ".join(TIME_FORMATS)))
+
+
+class ManifestWriter(object):
+    """
+    Appends saved frames to the manifest of their hour directory.
+
+    The line is written after the frame is saved, so a reader of the
+    manifest never sees a frame that is not on disk yet.
+
+    If the directory has no manifest, but frames already (e.g. saved by
+    a version without manifests earlier in the hour), the manifest is
+    started with a listing of the directory, so they are not lost.
+    """
+    def __init__(self):
+        self._directory = None
+        self._file = None
+
+    def add(self, directory, filename):
+        if directory != self._directory:
+            self.close()
+            manifest_filename = os.path.join(directory, MANIFEST_FILENAME)
+            filenames = []
+            if not os.path.isfile(manifest_filename):
+                filenames = list_frames(directory)
+            self._file = open(manifest_filename, "a")
+            self._directory = directory
+            if len(filenames) > 0:
+                LOG.debug("No manifest in '%s'. Starting it with %i frames \
+listed in the directory." % (directory, len(filenames)))
+                self._file.writelines(f + "\n" for f in filenames)
+                if filename in filenames:
+                    self._file.flush()
+                    return
+        self._file.write(filename + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._directory = None
+
+
+def list_frames(directory):
+    """
+    Gets the filenames of the frames in the hour directory by listing
+    it, in ascending time.
+    """
+    return sorted((filename for filename in os.listdir(directory)
+                   if filename.endswith(".png")),
+                  key=frame_source.parse_timestamp)
+
+
+def read_manifest(directory, build=True):
+    """
+    Gets the filenames of the frames in the hour directory.
+
+    If the directory has no manifest, the directory is listed. If build is
+    set, the manifest is written, unless it is the current hour, which
+    may still be recorded.
+    """
+    manifest_filename = os.path.join(directory, MANIFEST_FILENAME)
+    if os.path.isfile(manifest_filename):
+        with open(manifest_filename) as f:
+            # A line without .png is a half written line.
+            return [line.rstrip("\n") for line in f
+                    if line.endswith(".png\n")]
+
+    LOG.debug("No manifest in '%s'. Listing the directory." % directory)
+    filenames = list_frames(directory)
+
+    current_hour = datetime.datetime.now().strftime(
+        frame_source.HOUR_DIRECTORY_FORMAT)
+    if build and os.path.basename(directory) < current_hour:
+        try:
+            with open(manifest_filename, "w") as f:
+                f.writelines(filename + "\n" for filename in filenames)
+        except IOError as e:
+            LOG.warning("Could not write the manifest '%s': %s" % (
+                manifest_filename, e))
+    return filenames
+
+
+def bisect_frames(filenames, timestamp, after=False):
+    """
+    Finds where the timestamp is in the filenames (in ascending time),
+    like bisect.bisect_left (or bisect_right, if after is set). Only the
+    timestamps of the filenames compared are parsed.
+    """
+    low, high = 0, len(filenames)
+    while low < high:
+        middle = (low + high) // 2
+        middle_timestamp = frame_source.parse_timestamp(filenames[middle])
+        if middle_timestamp < timestamp or \
+           (after and middle_timestamp == timestamp):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def directory_frame_files(directory, time_from=None, time_to=None):
+    """
+    Yields (timestamp, filename) for the frames in an hour directory
+    from time_from to time_to (both included).
+
+    The manifest is in ascending time, so the first and the last frame
+    are found by bisection.
+    """
+    filenames = read_manifest(directory)
+    start, stop = 0, len(filenames)
+    if time_from is not None:
+        start = bisect_frames(filenames, time_from)
+    if time_to is not None:
+        stop = bisect_frames(filenames, time_to, after=True)
+    for filename in filenames[start:stop]:
+        yield frame_source.parse_timestamp(filename), \
+            os.path.join(directory, filename)
+
+
+def frame_files(path, time_from=None, time_to=None):
+    """
+    Yields (timestamp, filename) for the frames in the hour directories in
+    path, from time_from to time_to (both included).
+
+    If both time_from and time_to are given, the names of the hour
+    directories are calculated, and path is not listed at all.
+    """
+    if time_from is not None and time_to is not None:
+        directories = []
+        hour = time_from.replace(minute=0, second=0, microsecond=0)
+        while hour <= time_to:
+            directory = os.path.join(
+                path, hour.strftime(frame_source.HOUR_DIRECTORY_FORMAT))
+            if os.path.isdir(directory):
+                directories.append(directory)
+            hour += datetime.timedelta(hours=1)
+    else:
+        directories = frame_source.hour_directories(path)
+
+    for directory in directories:
+        hour = datetime.datetime.strptime(os.path.basename(directory),
+                                          frame_source.HOUR_DIRECTORY_FORMAT)
+        if time_from is not None and \
+           hour + datetime.timedelta(hours=1) <= time_from:
+            continue
+        if time_to is not None and hour > time_to:
+            break
+        for timestamp, filename in directory_frame_files(directory,
+                                                          time_from,
+                                                          time_to):
+            yield timestamp, filename
@@ -0,0 +1,117 @@
+# coding: utf-8
+import datetime
+import json
+import multiprocessing
+import os
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in milliseconds. The last
+# bucket holds everything above the highest bound.
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# processing: Time spent on one frame (or track) in the stage.
+# queue_wait: Time the frame (or track) was in the input queue, from it
+#             was put until it was taken (see frame_queue.FrameQueue).
+# idle: Time the stage waited for input.
+# latency: Time from the frame was captured until it left the stage.
+HISTOGRAMS = ("processing", "queue_wait", "idle", "latency")
+
+
+class StageMetrics(object):
+    """
+    Counters and time histograms for a pipeline stage.
+
+    The values are kept in shared memory, so the stage (the only
+    writer) can record them, while e.g. the supervisor reads them
+    from another process.
+
+    Layout of the values:
+    [frames_in, frames_out,
+     <histogram 1: count, sum, bucket 1, ..., bucket n>, ...]
+    """
+    def __init__(self, name):
+        self.name = name
+        self._histogram_size = 2 + len(BUCKETS_MS) + 1
+        self._values = multiprocessing.RawArray(
+            'd', 2 + len(HISTOGRAMS) * self._histogram_size)
+
+    def frame_in(self, queue_wait=None, idle=None):
+        """
+        A frame was taken from the input queue, where it had been for
+        queue_wait seconds. The stage waited idle seconds for it.
+        """
+        self._values[0] += 1
+        if queue_wait is not None:
+            self.observe("queue_wait", queue_wait)
+        if idle is not None:
+            self.observe("idle", idle)
+
+    def frame_out(self, number_of_frames=1):
+        """
+        A frame (or track) was put into the output queue.
+        """
+        self._values[1] += number_of_frames
+
+    def observe(self, histogram, seconds):
+        """
+        Adds a time (in seconds) to a histogram.
+        """
+        offset = 2 + HISTOGRAMS.index(histogram) * self._histogram_size
+        milliseconds = seconds * 1000.0
+        bucket = len(BUCKETS_MS)
+        for i, upper_bound in enumerate(BUCKETS_MS):
+            if milliseconds <= upper_bound:
+                bucket = i
+                break
+        self._values[offset] += 1
+        self._values[offset + 1] += milliseconds
+        self._values[offset + 2 + bucket] += 1
+
+    def latency_since(self, timestamp):
+        """
+        Records the latency from the capture timestamp until now.
+        """
+        self.observe("latency",
+                     (datetime.datetime.now() - timestamp).total_seconds())
+
+    def snapshot(self):
+        """
+        Gets the current values as a dictionary.
+        """
+        values = list(self._values)
+        snapshot = {"name": self.name,
+                    "frames_in": int(values[0]),
+                    "frames_out": int(values[1])}
+        labels = ["<=%ims" % upper_bound for upper_bound in BUCKETS_MS]
+        labels.append(">%ims" % BUCKETS_MS[-1])
+        for i, histogram in enumerate(HISTOGRAMS):
+            offset = 2 + i * self._histogram_size
+            count = int(values[offset])
+            snapshot[histogram] = {
+                "count": count,
+                "avg_ms": values[offset + 1] / count if count > 0 else None,
+                "buckets": [[label, int(v)] for label, v in zip(
+                    labels, values[offset + 2:offset + self._histogram_size])]}
+        return snapshot
+
+
+def write_stats_file(filename, stage_metrics, extra=None):
+    """
+    Writes the metrics of all the stages to a json file.
+
+    The file is written to a temporary file first and then renamed, so
+    a reader never sees a half written file.
+    """
+    stats = {"time": datetime.datetime.now().isoformat(),
+             "stages": [m.snapshot() for m in stage_metrics]}
+    if extra is not None:
+        stats.update(extra)
+
+    temporary_filename = "%s.%i.tmp" % (filename, os.getpid())
+    with open(temporary_filename, "w") as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+    os.rename(temporary_filename, filename)
+    LOG.debug("Stats written to '%s'." % filename)
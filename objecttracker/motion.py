@@ -0,0 +1,96 @@
+# coding: utf-8
+import multiprocessing
+import numpy as np
+import cv2
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+
+class MotionGate(object):
+    """
+    A cheap test of whether anything moves in the frame, run before the
+    expensive blur, background subtraction, closing and contour search.
+
+    The frame is downscaled and compared with the previous (downscaled)
+    frame. If fewer than min_pixels pixels differ more than threshold,
+    and there are no active tracks, the frame is idle and the heavy
+    stages can be skipped. Every background_interval idle frames, the
+    background model should still be updated, so it follows the light.
+
+    The number of active tracks is kept in shared memory, so the gate
+    can be used by the foreground extractor, while the tracker (another
+    process) sets the number of tracks. The gate must be created before
+    the processes are started.
+    """
+    def __init__(self, scale=8, threshold=20, min_pixels=2,
+                 background_interval=16):
+        self.scale = scale
+        self.threshold = threshold
+        self.min_pixels = min_pixels
+        self.background_interval = background_interval
+        self._active_tracks = multiprocessing.RawValue('i', 0)
+        self._previous = None
+        self._small = None
+        self._idle_frames = 0
+
+    def __getstate__(self):
+        # The previous frame belongs to the process using the gate.
+        state = self.__dict__.copy()
+        state["_previous"] = None
+        state["_small"] = None
+        state["_idle_frames"] = 0
+        return state
+
+    def set_active_tracks(self, number_of_tracks):
+        self._active_tracks.value = number_of_tracks
+
+    @property
+    def active_tracks(self):
+        return self._active_tracks.value
+
+    def is_moving(self, frame):
+        """
+        Checks if the frame has changed since the previous frame.
+        """
+        height, width = frame.shape[:2]
+        size = (max(width / self.scale, 1), max(height / self.scale, 1))
+        if self._small is None or self._small.shape[:2] != size[::-1]:
+            self._small = None
+            self._previous = None
+        self._small = cv2.resize(frame, size, dst=self._small,
+                                 interpolation=cv2.INTER_AREA)
+        if self._previous is None:
+            self._previous = self._small.copy()
+            return True
+
+        difference = cv2.absdiff(self._small, self._previous)
+        if difference.ndim == 3:
+            difference = difference.max(axis=2)
+        self._previous[:] = self._small
+        return np.count_nonzero(difference > self.threshold) >= \
+            self.min_pixels
+
+    def check(self, frame):
+        """
+        Decides what to do with the frame:
+        "process": Run the whole pipeline.
+        "background": Only update the background model.
+        "skip": Nothing.
+        """
+        if self.is_moving(frame) or self.active_tracks > 0:
+            self._idle_frames = 0
+            return "process"
+
+        self._idle_frames += 1
+        if self._idle_frames % self.background_interval == 0:
+            return "background"
+        return "skip"
+
+    def background_learning_rate(self, learning_rate):
+        """
+        The background is only updated every background_interval idle
+        frames, so it learns faster those frames.
+        """
+        return min(learning_rate * self.background_interval, 1.0)
@@ -0,0 +1,183 @@
+# coding: utf-8
+import math
+import numpy as np
+import track
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# Seconds an ended track can be re-linked.
+DEFAULT_WINDOW = 2.0
+
+
+class EndedTrack(object):
+    """
+    A track that has ended, with what is needed to predict where its
+    object is: The last position, the velocity (pixels / second) and the
+    heading (degrees, see Track.direction), computed once.
+    """
+    __slots__ = ("track", "end_time", "x", "y", "vx", "vy", "heading")
+
+    def __init__(self, ended_track, velocity_trackpoints=5):
+        self.track = ended_track
+        positions = ended_track.positions[-velocity_trackpoints:]
+        times = ended_track.times[-velocity_trackpoints:]
+        self.end_time = times[-1]
+        self.x, self.y = positions[-1]
+        self.vx, self.vy = 0.0, 0.0
+        if times[-1] > times[0]:
+            self.vx, self.vy = (positions[-1] - positions[0]) / \
+                (times[-1] - times[0])
+        self.heading = ended_track.direction_deg
+
+    def predict(self, time):
+        """
+        Where the object is at the time (seconds), if it kept moving.
+        """
+        gap = time - self.end_time
+        return self.x + self.vx * gap, self.y + self.vy * gap
+
+
+class RelinkIndex(object):
+    """
+    Re-links the track of an object, that disappears behind another
+    object (e.g. a bike behind a bus), with the new track started when
+    it appears again, so the object is counted once.
+
+    The ended tracks are kept for window seconds in buckets of their end
+    times. A new track (with min_trackpoints to max_trackpoints
+    trackpoints) is matched with the tracks that ended in the window
+    before it started: The ended track is moved forward with its velocity
+    to when the new track started, and the heading must be the same
+    within max_heading_difference degrees. There are at most max_tracks
+    ended tracks, so the cost per new track is bounded.
+
+    The ended tracks, that are not re-linked within the window, are
+    returned by expire, to be saved.
+
+    Example, each frame:
+        for t in ended_tracks:
+            relink_index.add(t)
+        for t in new_tracks:
+            ended_track = relink_index.find(t)
+            ...
+        tracks_to_save = relink_index.expire(timestamp)
+    """
+    def __init__(self, track_match_radius, window=DEFAULT_WINDOW,
+                 bucket_seconds=0.5, min_trackpoints=4, max_trackpoints=16,
+                 max_heading_difference=40, max_tracks=64):
+        # Same reach as connect_tracks.
+        self.match_radius = track_match_radius * 3
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.min_trackpoints = min_trackpoints
+        self.max_trackpoints = max_trackpoints
+        self.max_heading_difference = max_heading_difference
+        self.max_tracks = max_tracks
+        self._buckets = {}
+        self._number_of_tracks = 0
+        self._expired = []
+
+    def __len__(self):
+        return self._number_of_tracks
+
+    def tracks(self):
+        """
+        Gets the ended tracks in the index, without removing them.
+        """
+        tracks = list(self._expired)
+        for ended_tracks in self._buckets.values():
+            tracks.extend(e.track for e in ended_tracks)
+        return tracks
+
+    def _bucket(self, time):
+        return int(math.floor(time / self.bucket_seconds))
+
+    def add(self, ended_track):
+        """
+        Adds a track that has ended. If the index is full, the tracks in
+        the oldest bucket are expired.
+        """
+        ended = EndedTrack(ended_track)
+        self._buckets.setdefault(self._bucket(ended.end_time),
+                                 []).append(ended)
+        self._number_of_tracks += 1
+        while self._number_of_tracks > self.max_tracks:
+            oldest = self._buckets.pop(min(self._buckets))
+            self._number_of_tracks -= len(oldest)
+            self._expired.extend(e.track for e in oldest)
+
+    def is_new(self, new_track):
+        """
+        Checks if the track is new enough to be matched.
+        """
+        return self.min_trackpoints <= new_track.number_of_trackpoints() \
+            <= self.max_trackpoints
+
+    def find(self, new_track):
+        """
+        Finds the ended track, that the new track continues, and removes
+        it from the index. None if there is none.
+        """
+        if self._number_of_tracks == 0:
+            return None
+
+        start_time = new_track.times[0]
+        x, y = new_track.first_position
+        heading = new_track.direction_deg
+
+        best, best_bucket, best_score = None, None, 0.2
+        for bucket in range(self._bucket(start_time - self.window),
+                            self._bucket(start_time) + 1):
+            for ended in self._buckets.get(bucket, ()):
+                if not 0 <= start_time - ended.end_time <= self.window:
+                    continue
+                heading_difference = abs(track.diff_degrees(ended.heading,
+                                                             heading))
+                if heading_difference > self.max_heading_difference:
+                    continue
+                predicted_x, predicted_y = ended.predict(start_time)
+                distance = np.hypot(x - predicted_x, y - predicted_y)
+                if distance > self.match_radius:
+                    continue
+                score = track.score_factor(0, self.max_heading_difference,
+                                           heading_difference) * \
+                    track.score_factor(0, self.match_radius, distance) ** 2
+                if score > best_score:
+                    best, best_bucket, best_score = ended, bucket, score
+
+        if best is None:
+            return None
+        LOG.debug("Re-linking a track ended %.2f seconds before. Score: %f."
+                  % (start_time - best.end_time, best_score))
+        self._buckets[best_bucket].remove(best)
+        if len(self._buckets[best_bucket]) == 0:
+            del self._buckets[best_bucket]
+        self._number_of_tracks -= 1
+        return best.track
+
+    def expire(self, timestamp):
+        """
+        Removes and returns the tracks, that ended more than window
+        seconds before the timestamp.
+        """
+        expired, self._expired = self._expired, []
+        last_bucket = self._bucket(track.to_seconds(timestamp) -
+                                   self.window) - 1
+        for bucket in [b for b in self._buckets if b <= last_bucket]:
+            ended_tracks = self._buckets.pop(bucket)
+            self._number_of_tracks -= len(ended_tracks)
+            expired.extend(e.track for e in ended_tracks)
+        return expired
+
+    def flush(self):
+        """
+        Removes and returns all the tracks.
+        """
+        expired, self._expired = self._expired, []
+        for ended_tracks in self._buckets.values():
+            expired.extend(e.track for e in ended_tracks)
+        self._buckets = {}
+        self._number_of_tracks = 0
+        return expired
@@ -0,0 +1,108 @@
+# coding: utf-8
+import numpy as np
+import cv2
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+
+class RegionOfInterestException(Exception):
+    pass
+
+
+class RegionOfInterest(object):
+    """
+    The part of the frame, where objects are detected and tracked,
+    e.g. the road.
+
+    The frame is cropped to the bounding box of the region, before the
+    blur, the background subtraction, the morphology and the contour
+    search, so the cost of these is proportional to the area of the box.
+    If the region is a polygon, the foreground outside the polygon is
+    removed as well.
+
+    Coordinates in the cropped frame are mapped back to the full frame
+    by adding the offset (x, y) of the box.
+    """
+    def __init__(self, points, frame_shape):
+        """
+        points: Two points (top left and bottom right) for a rectangle,
+        or three or more points for a polygon. (x, y) in pixels.
+        frame_shape: The shape of the full frame.
+        """
+        if len(points) < 2:
+            raise RegionOfInterestException(
+                "A region of interest needs at least two points.")
+
+        self.frame_shape = tuple(frame_shape[:2])
+        frame_height, frame_width = self.frame_shape
+        points = np.array(points, dtype=np.int32)
+        points[:, 0] = np.clip(points[:, 0], 0, frame_width - 1)
+        points[:, 1] = np.clip(points[:, 1], 0, frame_height - 1)
+
+        x0, y0 = points.min(axis=0)
+        x1, y1 = points.max(axis=0) + 1
+        self.x, self.y = int(x0), int(y0)
+        self.width, self.height = int(x1 - x0), int(y1 - y0)
+
+        # The polygon as a mask of the bounding box.
+        self.mask = None
+        if len(points) > 2:
+            self.mask = np.zeros((self.height, self.width), dtype=np.uint8)
+            cv2.fillPoly(self.mask, [points - (self.x, self.y)], 255)
+
+        LOG.info("Region of interest: %ix%i at (%i, %i), %.0f%% of the \
+frame." % (self.width, self.height, self.x, self.y, 100 * self.area_ratio))
+
+    @classmethod
+    def from_string(cls, text, frame_shape):
+        """
+        Creates a region of interest from a string:
+        A rectangle: "x,y,width,height". E.g. "0,100,320,80".
+        A polygon: "x1,y1;x2,y2;x3,y3;...". E.g. "0,120;320,80;320,160".
+        """
+        try:
+            if ";" in text:
+                points = [[int(v) for v in point.split(",")]
+                          for point in text.split(";")]
+            else:
+                x, y, width, height = [int(v) for v in text.split(",")]
+                points = [[x, y], [x + width - 1, y + height - 1]]
+        except ValueError:
+            raise RegionOfInterestException(
+                "Could not parse the region of interest '%s'." % text)
+        return cls(points, frame_shape)
+
+    @property
+    def offset(self):
+        return self.x, self.y
+
+    @property
+    def shape(self):
+        """
+        The shape of the cropped frame (without colour channels).
+        """
+        return self.height, self.width
+
+    @property
+    def area_ratio(self):
+        """
+        How much of the full frame, the bounding box covers.
+        """
+        return float(self.width * self.height) / \
+            (self.frame_shape[0] * self.frame_shape[1])
+
+    def crop(self, frame):
+        """
+        Gets the bounding box of the frame. This is a view, not a copy.
+        """
+        return frame[self.y:self.y + self.height, self.x:self.x + self.width]
+
+    def apply_mask(self, fgmask):
+        """
+        Removes the foreground outside the polygon (in place).
+        """
+        if self.mask is not None:
+            cv2.bitwise_and(fgmask, self.mask, dst=fgmask)
+        return fgmask
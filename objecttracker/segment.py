@@ -0,0 +1,204 @@
+# coding: utf-8
+import os
+import json
+import datetime
+import numpy as np
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+# A segment holds the frames of one hour. Example: 20150503T12
+SEGMENT_NAME_FORMAT = "%Y%m%dT%H"
+
+# A segment consists of three files:
+# <name>.json: The shape and dtype of the frames.
+# <name>.frames: The raw frames appended one after another.
+# <name>.index: A record for each frame with the timestamp (seconds since
+#               EPOCH) and the offset of the frame in the frames file.
+HEADER_EXTENSION = ".json"
+FRAMES_EXTENSION = ".frames"
+INDEX_EXTENSION = ".index"
+INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("offset", "<i8")])
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class SegmentException(Exception):
+    pass
+
+
+def to_seconds(timestamp):
+    return (timestamp - EPOCH).total_seconds()
+
+
+def from_seconds(seconds):
+    return EPOCH + datetime.timedelta(microseconds=int(round(seconds * 1e6)))
+
+
+def is_segment(prefix):
+    """
+    Checks if there is a segment at the prefix (path without extension).
+    """
+    return os.path.isfile(prefix + INDEX_EXTENSION)
+
+
+def segment_prefixes(path):
+    """
+    Gets the prefixes (path without extension) of the segments in path,
+    sorted by time.
+    """
+    names = [filename[:-len(INDEX_EXTENSION)]
+             for filename in os.listdir(path)
+             if filename.endswith(INDEX_EXTENSION)]
+    return [os.path.join(path, name) for name in sorted(names)]
+
+
+class SegmentWriter(object):
+    """
+    Appends frames to a segment file for each hour, instead of saving a
+    png file for each frame.
+
+    The frames are saved raw, so the reader can map them directly into
+    memory. The frame is written and flushed before its index record, so
+    a reader never sees a frame that is not written yet.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._prefix = None
+        self._header = None
+        self._frames_file = None
+        self._index_file = None
+
+    def _open(self, prefix, header):
+        self.close()
+        header_filename = prefix + HEADER_EXTENSION
+        if os.path.isfile(header_filename):
+            # Continue an existing segment, e.g. after a restart.
+            with open(header_filename) as f:
+                existing_header = json.load(f)
+            if existing_header != header:
+                raise SegmentException("The frames %s do not match the \
+existing segment '%s' %s." % (header, prefix, existing_header))
+        else:
+            with open(header_filename, "w") as f:
+                json.dump(header, f)
+
+        LOG.info("Writing frames to segment '%s'." % prefix)
+        self._frames_file = open(prefix + FRAMES_EXTENSION, "ab")
+        self._index_file = open(prefix + INDEX_EXTENSION, "ab")
+        self._prefix = prefix
+        self._header = header
+
+    def write(self, frame, timestamp):
+        prefix = os.path.join(self.path,
+                              timestamp.strftime(SEGMENT_NAME_FORMAT))
+        header = {"shape": list(frame.shape), "dtype": frame.dtype.str}
+        if prefix != self._prefix:
+            self._open(prefix, header)
+        elif header != self._header:
+            raise SegmentException("The frame %s does not match the \
+segment '%s' %s." % (header, prefix, self._header))
+
+        self._frames_file.seek(0, os.SEEK_END)
+        offset = self._frames_file.tell()
+        self._frames_file.write(np.ascontiguousarray(frame).data)
+        self._frames_file.flush()
+
+        record = np.array([(to_seconds(timestamp), offset)],
+                          dtype=INDEX_DTYPE)
+        self._index_file.write(record.data)
+        self._index_file.flush()
+
+    def close(self):
+        for f in (self._frames_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._frames_file = None
+        self._index_file = None
+        self._prefix = None
+        self._header = None
+
+
+class SegmentReader(object):
+    """
+    Reads the frames of a segment.
+
+    The frames file is memory mapped, and the frames are read-only numpy
+    views into it, so no frame is copied.
+
+    Example:
+        for frame, timestamp in SegmentReader("/data/frames/20150503T12"):
+            ...
+    """
+    def __init__(self, prefix):
+        self.prefix = prefix
+        with open(prefix + HEADER_EXTENSION) as f:
+            header = json.load(f)
+        self.shape = tuple(header["shape"])
+        self.dtype = np.dtype(str(header["dtype"]))
+        self.frame_size = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        # Only the frames that are completely written.
+        if os.path.getsize(prefix + FRAMES_EXTENSION) > 0:
+            self._data = np.memmap(prefix + FRAMES_EXTENSION,
+                                   dtype=np.uint8, mode="r")
+        else:
+            self._data = np.zeros(0, dtype=np.uint8)
+        index = np.fromfile(prefix + INDEX_EXTENSION, dtype=INDEX_DTYPE)
+        self.index = index[index["offset"] + self.frame_size <=
+                           len(self._data)]
+
+    def __len__(self):
+        return len(self.index)
+
+    def timestamp(self, i):
+        return from_seconds(self.index["timestamp"][i])
+
+    def frame(self, i):
+        offset = self.index["offset"][i]
+        return self._data[offset:offset + self.frame_size].view(
+            self.dtype).reshape(self.shape)
+
+    def find(self, timestamp):
+        """
+        Gets the number of the first frame at or after the timestamp.
+        """
+        return int(np.searchsorted(self.index["timestamp"],
+                                   to_seconds(timestamp)))
+
+    def frames(self, start=0, stop=None):
+        """
+        Yields (frame, timestamp) for the frames from start to stop.
+        """
+        if stop is None:
+            stop = len(self)
+        for i in range(start, min(stop, len(self))):
+            yield self.frame(i), self.timestamp(i)
+
+    def __iter__(self):
+        return self.frames()
+
+
+def read_frames(path, time_from=None, time_to=None):
+    """
+    Yields (frame, timestamp) for the frames in the segments in path,
+    from time_from to time_to (both included).
+    """
+    for prefix in segment_prefixes(path):
+        hour = datetime.datetime.strptime(os.path.basename(prefix),
+                                          SEGMENT_NAME_FORMAT)
+        if time_from is not None and \
+           hour + datetime.timedelta(hours=1) <= time_from:
+            continue
+        if time_to is not None and hour > time_to:
+            break
+
+        reader = SegmentReader(prefix)
+        start, stop = 0, len(reader)
+        if time_from is not None:
+            start = reader.find(time_from)
+        if time_to is not None:
+            stop = reader.find(time_to + datetime.timedelta(microseconds=1))
+        for frame, timestamp in reader.frames(start, stop):
+            yield frame, timestamp
@@ -0,0 +1,97 @@
+# coding: utf-8
+import math
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+
+def last_position(t):
+    """
+    The position of a track in the index: Its last trackpoint.
+    """
+    return t.last_position
+
+
+def first_position(t):
+    return t.first_position
+
+
+class GridIndex(object):
+    """
+    A uniform grid over the frame, where each cell has the items (tracks)
+    positioned in it. With the cell size equal to the search radius,
+    only the 3 x 3 cells around a point have to be searched, instead of
+    all the tracks.
+
+    The index is updated incrementally (see update and sync): An item is
+    only moved, when it has moved to another cell.
+
+    Example:
+        index = GridIndex(track_match_radius)
+        index.sync(tracks)
+        for t in index.near(tp.x, tp.y, track_match_radius):
+            ...
+    """
+    def __init__(self, cell_size, position=last_position):
+        self.cell_size = float(max(cell_size, 1))
+        self.position = position
+        self._cells = {}
+        self._item_cells = {}
+
+    def __len__(self):
+        return len(self._item_cells)
+
+    def __contains__(self, item):
+        return item in self._item_cells
+
+    def _cell(self, x, y):
+        return (int(math.floor(x / self.cell_size)),
+                int(math.floor(y / self.cell_size)))
+
+    def add(self, item):
+        cell = self._cell(*self.position(item))
+        self._cells.setdefault(cell, []).append(item)
+        self._item_cells[item] = cell
+
+    def remove(self, item):
+        cell = self._item_cells.pop(item)
+        items = self._cells[cell]
+        items.remove(item)
+        if len(items) == 0:
+            del self._cells[cell]
+
+    def update(self, item):
+        """
+        Adds the item, or moves it if its position is in another cell.
+        """
+        cell = self._item_cells.get(item)
+        if cell is None:
+            self.add(item)
+        elif cell != self._cell(*self.position(item)):
+            self.remove(item)
+            self.add(item)
+
+    def sync(self, items):
+        """
+        Makes the index contain exactly the items, at their current
+        positions.
+        """
+        current = set(items)
+        for item in [i for i in self._item_cells if i not in current]:
+            self.remove(item)
+        for item in items:
+            self.update(item)
+
+    def near(self, x, y, radius):
+        """
+        Gets the items in the cells within radius of (x, y). Some of them
+        can be further away than radius, but none within are missing.
+        """
+        reach = int(math.ceil(radius / self.cell_size))
+        cx, cy = self._cell(x, y)
+        items = []
+        for i in range(cx - reach, cx + reach + 1):
+            for j in range(cy - reach, cy + reach + 1):
+                items.extend(self._cells.get((i, j), ()))
+        return items
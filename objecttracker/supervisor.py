@@ -0,0 +1,286 @@
+# coding: utf-8
+import os
+import errno
+import fcntl
+import select
+import signal
+import time
+import multiprocessing
+import metrics
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+
+class Supervisor(object):
+    """
+    Starts the stage processes, restarts the ones that die, and reports
+    the queue depths and the throughput.
+
+    The supervisor sleeps until a child process exits (SIGCHLD) or the
+    next stats report is due, so it does not use any cpu in between.
+
+    Example:
+        supervisor = Supervisor(stats_interval=60 * 30)
+        supervisor.add_stage("closer", objecttracker.closer,
+                             (foreground_frames, closed_frames, mask_buffer))
+        supervisor.add_queue("closed frames", closed_frames)
+        supervisor.run()
+
+    A restarted stage starts with a clean state, e.g. the tracker
+    forgets its active tracks. The frame buffer slots held by the dead
+    process are released (see add_buffer), so a stage that keeps dying
+    does not use up the slots, and block the whole pipeline.
+
+    If stats_filename is set, the metrics of the stages (see
+    add_metrics) and the queues are written to the file every
+    stats_file_interval seconds.
+
+    On SIGINT or SIGTERM the stages are stopped (see stop), so the
+    tracks that are not saved yet are saved first.
+    """
+    def __init__(self, stats_interval=60 * 30, min_restart_interval=5,
+                 report=None, stats_filename=None, stats_file_interval=10):
+        self.stats_interval = stats_interval
+        self.min_restart_interval = min_restart_interval
+        self.report = report if report is not None else LOG.info
+        self.stats_filename = stats_filename
+        self.stats_file_interval = stats_file_interval
+        self.stages = []
+        self.queues = []
+        self.stage_metrics = []
+        self.buffers = []
+        self._stop_requested = False
+        # Set by stop. The sources (e.g. the frame reader) must stop
+        # when it is set.
+        self.stopping = multiprocessing.Event()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        for fd in (self._wakeup_read, self._wakeup_write):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def add_stage(self, name, target, args=()):
+        """
+        Adds a stage. The stage is started by start() or run().
+        """
+        self.stages.append({"name": name,
+                            "target": target,
+                            "args": args,
+                            "process": None,
+                            "started": None,
+                            "restarts": 0})
+
+    def add_queue(self, name, queue):
+        """
+        Adds a queue to the stats report. If the queue is a FrameQueue
+        the throughput and the dropped frames are reported as well.
+        """
+        self.queues.append({"name": name,
+                            "queue": queue,
+                            "frames_in": 0})
+
+    def add_metrics(self, stage_metrics):
+        """
+        Adds the metrics of a stage (metrics.StageMetrics) to the
+        stats file.
+        """
+        self.stage_metrics.append(stage_metrics)
+
+    def add_buffer(self, buffer):
+        """
+        Adds a frame buffer (framebuffer.FrameRingBuffer). The slots held
+        by a stage that has died are released, before it is restarted.
+        The queues between the stages must mark the slots (see
+        frame_queue.FrameQueue).
+        """
+        self.buffers.append(buffer)
+
+    def _start_stage(self, stage):
+        process = multiprocessing.Process(target=_run_stage,
+                                          name=stage["name"],
+                                          args=(stage["target"],
+                                                stage["args"]))
+        process.daemon = True
+        process.start()
+        stage["process"] = process
+        stage["started"] = time.time()
+        LOG.info("%s started (pid %i)." % (stage["name"], process.pid))
+
+    def start(self):
+        """
+        Starts all the stages.
+        """
+        for stage in self.stages:
+            self._start_stage(stage)
+
+    def _on_child_exit(self, signum, frame):
+        try:
+            os.write(self._wakeup_write, b"x")
+        except OSError:
+            # The pipe is full. The supervisor is woken up anyway.
+            pass
+
+    def _on_stop(self, signum, frame):
+        self._stop_requested = True
+        # Wake up the supervisor.
+        self._on_child_exit(signum, frame)
+
+    def stop(self, timeout=30):
+        """
+        Stops the stages. The sources see that stopping is set, and put
+        the end of the frames (frame_queue.END_OF_FRAMES) into their
+        queues. The other stages pass it on, e.g. the tracker saves all
+        its tracks, and then stop. The stages still running after
+        timeout seconds are terminated.
+        """
+        self.stopping.set()
+        end = time.time() + timeout
+        for stage in self.stages:
+            process = stage["process"]
+            process.join(max(end - time.time(), 0))
+            if process.is_alive():
+                LOG.warning("%s did not stop. Terminating it." %
+                            stage["name"])
+                process.terminate()
+                process.join()
+            LOG.info("%s stopped." % stage["name"])
+
+    def check_stages(self):
+        """
+        Restarts the stages that have died. A stage that dies right after
+        it was started is not restarted before min_restart_interval has
+        passed.
+
+        Returns the number of seconds until the next pending restart,
+        or None.
+        """
+        next_restart = None
+        for stage in self.stages:
+            process = stage["process"]
+            if process is None or process.is_alive():
+                continue
+
+            wait = stage["started"] + self.min_restart_interval - time.time()
+            if wait > 0:
+                if next_restart is None or wait < next_restart:
+                    next_restart = wait
+                continue
+
+            LOG.error("%s died with exit code %s. Restarting." % (
+                stage["name"], process.exitcode))
+            for buffer in self.buffers:
+                number_of_slots = buffer.reclaim(process.pid)
+                if number_of_slots > 0:
+                    LOG.warning("Released %i frame buffer slots held by %s."
+                                % (number_of_slots, stage["name"]))
+            stage["restarts"] += 1
+            self._start_stage(stage)
+        return next_restart
+
+    def stats(self, elapsed):
+        """
+        Gets a line with queue depths and throughput (frames / second)
+        since the last call.
+        """
+        parts = []
+        for q in self.queues:
+            queue = q["queue"]
+            text = "%s: %i" % (q["name"], queue.qsize())
+            if hasattr(queue, "frames_in"):
+                frames_in = queue.frames_in()
+                text += " (%.1f fps, %i dropped)" % (
+                    (frames_in - q["frames_in"]) / max(elapsed, 1e-6),
+                    queue.dropped())
+                q["frames_in"] = frames_in
+            parts.append(text)
+
+        restarts = ["%s: %i" % (s["name"], s["restarts"])
+                    for s in self.stages if s["restarts"] > 0]
+        if len(restarts) > 0:
+            parts.append("restarts: %s" % ", ".join(restarts))
+        return ", ".join(parts) + "."
+
+    def queue_stats(self):
+        """
+        Gets the current size (and counters) of each queue.
+        """
+        queue_stats = []
+        for q in self.queues:
+            queue = q["queue"]
+            stats = {"name": q["name"], "size": queue.qsize()}
+            if hasattr(queue, "frames_in"):
+                stats["frames_in"] = queue.frames_in()
+                stats["dropped"] = queue.dropped()
+            queue_stats.append(stats)
+        return queue_stats
+
+    def write_stats_file(self):
+        restarts = dict((s["name"], s["restarts"]) for s in self.stages)
+        try:
+            metrics.write_stats_file(self.stats_filename,
+                                     self.stage_metrics,
+                                     {"queues": self.queue_stats(),
+                                      "restarts": restarts})
+        except (IOError, OSError) as e:
+            LOG.error("Could not write the stats file: %s" % e)
+
+    def run(self):
+        """
+        Starts the stages and supervises them, until SIGINT or SIGTERM.
+        """
+        signal.signal(signal.SIGCHLD, self._on_child_exit)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        self.start()
+
+        last_stats = last_stats_file = time.time()
+        next_restart = None
+        while True:
+            timeout = max(last_stats + self.stats_interval - time.time(), 0)
+            if next_restart is not None:
+                timeout = min(timeout, next_restart)
+            if self.stats_filename is not None:
+                timeout = min(timeout, max(
+                    last_stats_file + self.stats_file_interval - time.time(),
+                    0))
+
+            try:
+                select.select([self._wakeup_read], [], [], timeout)
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+
+            # Empty the wakeup pipe.
+            try:
+                while os.read(self._wakeup_read, 512):
+                    pass
+            except OSError:
+                pass
+
+            if self._stop_requested:
+                LOG.info("Stopping the stages.")
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                self.stop()
+                return
+
+            next_restart = self.check_stages()
+
+            now = time.time()
+            if now - last_stats >= self.stats_interval:
+                self.report(self.stats(now - last_stats))
+                last_stats = now
+
+            if self.stats_filename is not None and \
+               now - last_stats_file >= self.stats_file_interval:
+                self.write_stats_file()
+                last_stats_file = now
+
+
+def _run_stage(target, args):
+    # Only the supervisor stops the stages, e.g. on Ctrl-C, so they can
+    # save what they have first. See Supervisor.stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    target(*args)
@@ -4,6 +4,7 @@ import numpy as np
 import cv2
 import os
 from trackpoint import Trackpoint
+import frame_store
 import database
 import logging
 
@@ -46,6 +47,30 @@ def create_tracks_table():
 create_tracks_table()
 
 
+def save_rows_to_db(rows):
+    """
+    Saves a list of track features (see Track.db_values) to the db
+    in one transaction.
+    """
+    if len(rows) == 0:
+        return
+
+    keys = sorted(rows[0].keys())
+    sql = '''INSERT INTO %s (%s) VALUES (%s)''' % (
+        TABLE_NAME,
+        ", ".join(keys),
+        ", ".join(["?"] * len(keys)))
+
+    LOG.debug(sql)
+
+    values = [[row[key] for key in keys] for row in rows]
+    LOG.debug("Values: '%s'." % (values))
+
+    with database.Db() as db:
+        LOG.debug("Saving %i tracks to db." % len(rows))
+        db.executemany(sql, values)
+
+
 def diff_degrees(A, B):
     """
     The difference between two angles in degrees.
@@ -72,13 +97,191 @@ class TrackException(Exception):
     pass
 
 
-class Track:
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# The columns of the trackpoint values of a track. A missing value (None)
+# is stored as nan.
+T, X, Y, SIZE = 0, 1, 2, 3
+COLOR = slice(4, 7)
+ASPECT_RATIO, FILL_RATIO, INTENSITY_VARIANCE = 7, 8, 9
+NUMBER_OF_COLUMNS = 10
+
+FEATURE_COLUMNS = (("color", COLOR),
+                   ("aspect_ratio", ASPECT_RATIO),
+                   ("fill_ratio", FILL_RATIO),
+                   ("intensity_variance", INTENSITY_VARIANCE))
+
+
+def to_seconds(timestamp):
+    """
+    Gets the timestamp as seconds since the epoch, as in Track.times.
+    A number is already seconds.
+    """
+    if isinstance(timestamp, datetime.datetime):
+        return (timestamp - EPOCH).total_seconds()
+    return timestamp
+
+
+def _to_number(value):
+    if value is None:
+        return np.nan
+    return value
+
+
+def _from_number(value):
+    if np.isnan(value):
+        return None
+    return float(value)
+
+
+class TrackpointSequence(object):
+    """
+    The trackpoints of a track, as a read only sequence. The trackpoints
+    are created from the columns of the track when they are read, so
+    changing them does not change the track.
+    """
+    __slots__ = ("_track", )
+
+    def __init__(self, track):
+        self._track = track
+
+    def __len__(self):
+        return self._track._n
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._track._trackpoint(i)
+                    for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Trackpoint index out of range.")
+        return self._track._trackpoint(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._track._trackpoint(i)
+
+
+class Track(object):
+    """
+    The values of the trackpoints (time, position, size and features)
+    are rows in a numpy array, that grows as trackpoints are added,
+    instead of a list of Trackpoint objects. The aggregates, drawing and
+    pickling work on the columns. The trackpoints property gives the
+    trackpoints as Trackpoint objects.
+
+    The aggregates (length, size, number of trackpoints) are kept as
+    running sums, updated when a trackpoint is added, so they do not
+    depend on the length of the track. The totals of the parent tracks
+    are memoized until a parent changes. The aggregates include the
+    trackpoints, that have been removed to bound the memory of a long
+    track (see keep_trackpoints and budget.PointBudget).
+
+    Trackpoints must be added with append / add_trackpoint.
+    """
     def __init__(self):
         self.parent = None
-        self.trackpoints = []
         self.name = datetime.datetime.now().isoformat()
         self.age = 0
 
+        # Only the first self._n rows are used. The frames are not
+        # numbers, so they are in a list.
+        self._data = np.empty((4, NUMBER_OF_COLUMNS))
+        self._n = 0
+        self._count = 0
+        self._frames = []
+        self._datetimes = False
+
+        # Running sums. The version is incremented for each trackpoint.
+        self._length = 0.0
+        self._size_sum = 0
+        self._version = 0
+        self._parent_totals = (None, None)
+
+    def __getstate__(self):
+        # Only the used rows are pickled.
+        state = self.__dict__.copy()
+        state["_data"] = self._data[:self._n].copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if len(self._data) == 0:
+            self._data = np.empty((4, NUMBER_OF_COLUMNS))
+
+    @property
+    def trackpoints(self):
+        return TrackpointSequence(self)
+
+    @property
+    def frames(self):
+        """
+        The frames (or frame_store.FrameHandle) of the trackpoints. The
+        frames can be replaced, e.g. by None when they are not needed.
+        """
+        return self._frames
+
+    @property
+    def positions(self):
+        """
+        The (x, y) of the trackpoints, a row for each.
+        """
+        return self._data[:self._n, X:Y + 1]
+
+    @property
+    def times(self):
+        """
+        The timestamps of the trackpoints, as seconds since the epoch.
+        """
+        return self._data[:self._n, T]
+
+    @property
+    def sizes(self):
+        return self._data[:self._n, SIZE]
+
+    @property
+    def first_position(self):
+        return float(self._data[0, X]), float(self._data[0, Y])
+
+    @property
+    def last_position(self):
+        return float(self._data[self._n - 1, X]), \
+            float(self._data[self._n - 1, Y])
+
+    def _reserve(self, number_of_rows):
+        """
+        Makes room for number_of_rows rows. The array is doubled, so
+        adding a trackpoint is O(1) on average.
+        """
+        if number_of_rows > len(self._data):
+            data = np.empty((max(number_of_rows, 2 * len(self._data)),
+                             NUMBER_OF_COLUMNS))
+            data[:self._n] = self._data[:self._n]
+            self._data = data
+
+    def _timestamp(self, seconds):
+        if self._datetimes:
+            return EPOCH + datetime.timedelta(
+                microseconds=int(round(seconds * 1e6)))
+        return seconds
+
+    def _trackpoint(self, i):
+        row = self._data[i]
+        color = None
+        if not np.isnan(row[COLOR]).any():
+            color = tuple(row[COLOR])
+        return Trackpoint(self._timestamp(row[T]),
+                          _from_number(row[X]),
+                          _from_number(row[Y]),
+                          frame=self._frames[i],
+                          size=_from_number(row[SIZE]),
+                          color=color,
+                          aspect_ratio=_from_number(row[ASPECT_RATIO]),
+                          fill_ratio=_from_number(row[FILL_RATIO]),
+                          intensity_variance=_from_number(
+                              row[INTENSITY_VARIANCE]))
+
     @property
     def direction_deg(self):
         return self.direction(deg=True)
@@ -86,7 +289,7 @@ class Track:
     def direction(self, deg=False):
         if self.number_of_trackpoints() < 2:
             return None
-        return self.trackpoints[0].direction_to(self.trackpoints[-1], deg)
+        return self.first_trackpoint.direction_to(self.last_trackpoint, deg)
 
     def __str__(self):
         return "Length: '%i'. Age: '%i'. Avg size: '%f'. Avg. length \
@@ -96,7 +299,7 @@ between trackpoints: '%f'." % (self.total_length(),
                                self.length_avg())
 
     def size_avg(self):
-        return np.average([tp.size for tp in self.trackpoints])
+        return float(self._size_sum) / self._count
 
     def incr_age(self):
         """
@@ -115,7 +318,45 @@ between trackpoints: '%f'." % (self.total_length(),
         """
         assert(isinstance(trackpoint, Trackpoint))
         self.age = 1
-        self.trackpoints.append(trackpoint)
+        if isinstance(trackpoint.timestamp, datetime.datetime):
+            self._datetimes = True
+
+        n = self._n
+        self._reserve(n + 1)
+        row = self._data[n]
+        row[T] = _to_number(to_seconds(trackpoint.timestamp))
+        row[X] = _to_number(trackpoint.x)
+        row[Y] = _to_number(trackpoint.y)
+        row[SIZE] = _to_number(trackpoint.size)
+        row[COLOR] = np.nan if trackpoint.color is None else trackpoint.color
+        row[ASPECT_RATIO] = _to_number(trackpoint.aspect_ratio)
+        row[FILL_RATIO] = _to_number(trackpoint.fill_ratio)
+        row[INTENSITY_VARIANCE] = _to_number(trackpoint.intensity_variance)
+        self._frames.append(trackpoint.frame)
+
+        if n > 0:
+            self._length += np.hypot(row[X] - self._data[n - 1, X],
+                                     row[Y] - self._data[n - 1, Y])
+        if trackpoint.size is not None:
+            self._size_sum += trackpoint.size
+        self._version += 1
+        self._n = n + 1
+        self._count += 1
+
+    def keep_trackpoints(self, rows):
+        """
+        Keeps only the trackpoints in rows (indexes in trackpoints, in
+        order), and removes the rest, e.g. to bound the memory of a long
+        track. The aggregates still include the removed trackpoints.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        # The trackpoints before the first removed one are not moved.
+        moved = np.flatnonzero(rows != np.arange(len(rows)))
+        start = moved[0] if len(moved) > 0 else len(rows)
+        self._data[start:len(rows)] = self._data[rows[start:]]
+        self._frames[start:] = [self._frames[i] for i in rows[start:]]
+        self._n = len(rows)
+        self._version += 1
 
     def connect_tracks(self, track):
         """
@@ -125,8 +366,22 @@ between trackpoints: '%f'." % (self.total_length(),
         self is currently parent.
         """
         assert(isinstance(track, Track))
-        for tp in track.trackpoints:
-            self.append(tp)
+        if track._n == 0:
+            return
+        if self._n == 0:
+            self._datetimes = track._datetimes
+        else:
+            self._length += np.hypot(*np.subtract(track.first_position,
+                                                  self.last_position))
+        self.age = 1
+        self._reserve(self._n + track._n)
+        self._data[self._n:self._n + track._n] = track._data[:track._n]
+        self._frames.extend(track._frames)
+        self._n += track._n
+        self._count += track._count
+        self._length += track._length
+        self._size_sum += track._size_sum
+        self._version += 1
 
     def set_parent(self, parent):
         """
@@ -135,6 +390,7 @@ between trackpoints: '%f'." % (self.total_length(),
         """
         assert(isinstance(parent, Track))
         self.parent = parent
+        self._parent_totals = (None, None)
 
     def split(self):
         """
@@ -150,33 +406,59 @@ between trackpoints: '%f'." % (self.total_length(),
         t.set_parent(self)
         return t
 
+    def _parents_version(self):
+        """
+        The versions of all the parents. Changes when a trackpoint is
+        added to any of them.
+        """
+        versions = []
+        parent = self.parent
+        while parent is not None:
+            versions.append((id(parent), parent._version))
+            parent = parent.parent
+        return tuple(versions)
+
+    def _totals(self):
+        """
+        Gets (length, size sum, number of trackpoints) of the parents,
+        including the length from the last parent trackpoint to the first
+        trackpoint of this track. Memoized until a parent changes.
+        """
+        version, totals = self._parent_totals
+        if self.parent is None:
+            return 0.0, 0, 0
+        current_version = (self._n > 0, ) + \
+            self._parents_version()
+        if version == current_version:
+            return totals
+
+        parent = self.parent
+        length, size_sum, count = parent._totals()
+        length += parent._length
+        size_sum += parent._size_sum
+        count += parent._count
+        if parent._n > 0 and self._n > 0:
+            # The length between the last parent tracpoint and the this
+            # first trackpoint.
+            length += np.hypot(*np.subtract(self.first_position,
+                                            parent.last_position))
+        totals = (length, size_sum, count)
+        self._parent_totals = (current_version, totals)
+        return totals
+
     def total_length(self, include_parents=False):
         """
         The length of a track, including its parent track.
 
-        Recursively calls it self on the parents, if any.
-
         Example:
         If whe have a track with 4 trackpoints:
         track = [tp1, tp2, tp3, tp4]
         It is the distance between tp1 and tp2, plus the distance between
         t2 and t3, plus the distance between t3 and t4.
         """
-        # The length of all the parents.
-        parent_length = 0
-        if include_parents and self.parent is not None \
-           and len(self.parent.trackpoints) > 0:
-            parent_length += self.parent.total_length(include_parents)
-
-            # The length between the last parent tracpoint and the this
-            # first trackpoint.
-            last_parent_tp = self.parent.trackpoints[-1]
-            parent_length += last_parent_tp.length_to(self.trackpoints[0])
-
-        return parent_length + sum(map(
-            lambda (tp0, tp1): tp0.length_to(tp1),
-            zip(self.trackpoints, self.trackpoints[1:])
-        ))
+        if include_parents:
+            return self._totals()[0] + self._length
+        return self._length
 
     def length_avg(self, include_parents=False):
         """
@@ -188,11 +470,9 @@ between trackpoints: '%f'." % (self.total_length(),
         return self.total_length(include_parents) / number_of_trackpoints - 1
 
     def sum_size(self, include_parents=False):
-        size = 0
-        if self.parent is not None and include_parents:
-            size += self.parent.sum_size(include_parents)
-        size += sum([tp.size for tp in self.trackpoints])
-        return size
+        if include_parents:
+            return self._totals()[1] + self._size_sum
+        return self._size_sum
 
     def avg_size(self, include_parents=False):
         return self.sum_size(include_parents) / \
@@ -202,12 +482,9 @@ between trackpoints: '%f'." % (self.total_length(),
         """
         Returns the number of trackpoints for the track.
         """
-        number_of_trackpoints = 0
-        if include_parents and self.parent is not None:
-            number_of_trackpoints = self.parent.number_of_trackpoints(
-                include_parents=True
-                )
-        return number_of_trackpoints + len(self.trackpoints)
+        if include_parents:
+            return self._totals()[2] + self._count
+        return self._count
 
     def expected_next_point(self):
         # TODO: Handle inherited trackpoints.
@@ -305,7 +582,7 @@ between trackpoints: '%f'." % (self.total_length(),
 
     def match_score_track(self, track, track_match_radius):
         assert(isinstance(track, Track))
-        if len(track.trackpoints) < 4:
+        if track.number_of_trackpoints() < 4:
             LOG.debug("Too small track to connect. Match score: 0")
             return 0
 
@@ -328,20 +605,37 @@ greater than %i. Match score: 0" % threshold)
         Draw the track to the frame.
         """
         # Track lines.
-        lines = np.array([[tp.x, tp.y] for tp in self.trackpoints])
-        cv2.polylines(frame, np.int32([lines]), 0, color, thickness=thickness)
+        cv2.polylines(frame, np.int32([self.positions]), 0, color,
+                      thickness=thickness)
 
-    def draw_points(self, frame, color=(0, 255, 255), thickness=1):
+    def draw_points(self, frame, color=(0, 255, 255), radius=5, thickness=1):
         # Points i each line.
-        for tp in self.trackpoints:
-            tp.draw(frame, color=color, thickness=thickness)
+        for x, y in np.int32(self.positions):
+            cv2.circle(frame, (x, y), radius, color, thickness=thickness)
 
     def linear_length(self):
         """
         Gets the linear distance from the first point to the last in a track.
         """
-        first_tp, last_tp = self.trackpoints[0], self.trackpoints[-1]
-        return first_tp.length_to(last_tp)
+        return np.hypot(*(self.positions[-1] - self.positions[0]))
+
+    def feature_averages(self):
+        """
+        Gets the averages of the appearance features of the trackpoints
+        (see Trackpoint), e.g. for the classification. A feature is None,
+        if none of the trackpoints have it.
+        """
+        averages = {}
+        data = self._data[:self._n]
+        for feature, column in FEATURE_COLUMNS:
+            values = data[:, column]
+            has_value = ~np.isnan(values.reshape(self._n, -1)).any(axis=1)
+            averages[feature] = None
+            if has_value.any():
+                averages[feature] = values[has_value].mean(axis=0)
+        if averages["color"] is not None:
+            averages["color"] = tuple(averages["color"])
+        return averages
 
     def classify(self):
         """
@@ -357,18 +651,18 @@ greater than %i. Match score: 0" % threshold)
         """
         Gets the starting point of the tracks.
         """
-        if len(self.trackpoints) == 0:
+        if self._n == 0:
             return None
-        return self.trackpoints[0]
+        return self._trackpoint(0)
 
     @property
     def last_trackpoint(self):
         """
         Gets the starting point of the tracks.
         """
-        if len(self.trackpoints) == 0:
+        if self._n == 0:
             return None
-        return self.trackpoints[-1]
+        return self._trackpoint(self._n - 1)
 
     def save_to_disk(self, min_linear_length, track_match_radius,
              trackpoints_save_directory=None):
@@ -393,38 +687,28 @@ exist." % trackpoints_save_directory)
         self.save_trackpoints_to_directory(trackpoints_save_directory,
                                            name, track_match_radius)
 
-    def save_to_db(self):
+    def db_values(self):
         """
-        Saves the track features to the db.
+        Gets the track features, that are saved to the db.
         """
         # Date set to middle time stamp.
-        date_str = (self.trackpoints[0].timestamp +
-                    (self.trackpoints[-1].timestamp -
-                     self.trackpoints[0].timestamp) / 2).isoformat()
+        date_str = self._timestamp(
+            (self.times[0] + self.times[-1]) / 2).isoformat()
         key_values = {
             "date": date_str,
             "avg_size": "%.3f" % self.avg_size(),
             "linear_length": "%.3f" % self.linear_length(),
             "total_length": "%.3f" % self.total_length(),
             "direction": "%.3f" % self.direction_deg,
-            "number_of_tp": "%i" % len(self.trackpoints),
+            "number_of_tp": "%i" % self._count,
             }
+        return key_values
 
-        keys = key_values.keys()
-        sql = '''INSERT INTO %s (%s) VALUES (%s)''' % (
-            TABLE_NAME,
-            ", ".join(keys),
-            ", ".join(["?"] * len(keys)))
-
-        LOG.debug(sql)
-
-        values = key_values.values()
-        LOG.debug("Values: '%s'." % ("', '".join(key_values.values())))
-
-        with database.Db() as db:
-            LOG.debug("Saving track to db.")
-            db.execute(sql, values)
-
+    def save_to_db(self):
+        """
+        Saves the track features to the db.
+        """
+        save_rows_to_db([self.db_values()])
         LOG.info("Track saved.")
 
     def save_trackpoints_to_directory(self,
@@ -438,15 +722,21 @@ exist." % trackpoints_save_directory)
                 datetime.datetime.now().isoformat()))
         os.makedirs(track_dir)
         for i, tp in enumerate(self.trackpoints):
-            self.draw_lines(tp.frame, color=(0, 255, 255))
-            self.draw_points(tp.frame, color=(0, 255, 255))
-            tp.draw(tp.frame, color=(255, 0, 255), thickness=3)
+            # The frame handles are only resolved here.
+            frame = tp.frame
+            if isinstance(frame, frame_store.FrameHandle):
+                frame = frame.resolve()
+            if frame is None:
+                continue
+            self.draw_lines(frame, color=(0, 255, 255))
+            self.draw_points(frame, color=(0, 255, 255))
+            tp.draw(frame, color=(255, 0, 255), thickness=3)
             tp.draw(
-                tp.frame,
+                frame,
                 radius=tp_search_radius,
                 color=(0, 255, 0),
                 thickness=1)
-            cv2.imwrite(os.path.join(track_dir, "%0.5i.png" % (i)), tp.frame)
+            cv2.imwrite(os.path.join(track_dir, "%0.5i.png" % (i)), frame)
         LOG.info("'%s' track saved to %s. Track: %s " % (status_name,
                                                          track_dir,
                                                          self))
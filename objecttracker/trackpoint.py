@@ -7,11 +7,24 @@ import logging
 LOG = logging.getLogger(__name__)
 
 
-class Trackpoint:
-    def __init__(self, timestamp, x, y, frame=None, size=None, color=None):
+class Trackpoint(object):
+    # There are many trackpoints, so they do not get a __dict__.
+    __slots__ = ("timestamp", "x", "y", "frame", "size", "color",
+                 "aspect_ratio", "fill_ratio", "intensity_variance")
+
+    def __init__(self, timestamp, x, y, frame=None, size=None, color=None,
+                 aspect_ratio=None, fill_ratio=None, intensity_variance=None):
         """
         A trackpoint is the centroid of the object.
         Each trackpoint is assigned to a tracks.
+
+        color is the mean (b, g, r) colour of the object. The aspect
+        ratio (width / height) and fill ratio are of the bounding box.
+        See connected_components.Blobs.compute_features.
+
+        A track does not keep its trackpoints, but their values in
+        columns (see track.Track). The trackpoints of a track are
+        created from the columns, when they are read.
         """
         self.timestamp = timestamp
         self.x = x
@@ -19,6 +32,16 @@ class Trackpoint:
         self.frame = frame
         self.size = size
         self.color = color
+        self.aspect_ratio = aspect_ratio
+        self.fill_ratio = fill_ratio
+        self.intensity_variance = intensity_variance
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
 
     def __str__(self):
         """
@@ -34,7 +57,9 @@ class Trackpoint:
         Creates a new trackpoint with the same values.
         """
         return Trackpoint(self.timestamp, self.x, self.y,
-                          self.frame, self.size, self.color)
+                          self.frame, self.size, self.color,
+                          self.aspect_ratio, self.fill_ratio,
+                          self.intensity_variance)
 
     def length_to(self, tp):
         """
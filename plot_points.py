@@ -24,6 +24,7 @@ import logging
 import time
 import datetime
 import objecttracker.database
+import objecttracker.counting
 import numpy as np
 import matplotlib
 # matplotlib.use('Agg')
@@ -63,8 +64,8 @@ def create_plot(x_type, y_type, date_from, date_to, output_directory):
           """.format(x_type=x_type, y_type=y_type)
 
     max_size = 7000
-    x_values = {"pers": [], "bike": [], "car": [], "truck": []}
-    y_values = {"pers": [], "bike": [], "car": [], "truck": []}
+    x_values = {"pers.": [], "bike": [], "car": [], "truck": []}
+    y_values = {"pers.": [], "bike": [], "car": [], "truck": []}
     colors = ["r", "g", "c", "y"]
 
     with objecttracker.database.Db() as db:
@@ -74,14 +75,7 @@ def create_plot(x_type, y_type, date_from, date_to, output_directory):
             size = float(row[0])
             speed = float(row[1])
 
-            if size < 700 and speed < 4:
-                expected_type = "pers"
-            elif size < 1300:
-                expected_type = "bike"
-            elif size < 10000:
-                expected_type = "car"
-            else:
-                expected_type = "truck"
+            expected_type = objecttracker.counting.classify(size, speed)
 
             x_values[expected_type].append(size)
             y_values[expected_type].append(speed)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# coding: utf-8
+import os
+__doc__ = """
+Reprocess recorded frames (see count_with_pi.py --record-frames-only) and
+save the tracks to the database. Both hour directories with png files and
+segments (see count_with_pi.py --record-format) are reprocessed.
+
+The hour directories are processed in parallel. Each worker tracks the
+last frames of the previous hour, before it tracks the frames of its own
+hour, so its background model is warmed up, and it knows the objects
+already there when the hour starts. After its own hour, it goes on into
+the next hour, until the tracks that started in its own hour have ended.
+A worker only saves the tracks, that started in its own hour, so a track
+crossing an hour boundary is saved once, and not split in two.
+
+Usage:
+    {filename} [options] [--verbose|--debug] [--from=<hour>] [--to=<hour>]
+
+Options:
+    -h, --help                      This help message.
+    -d, --debug                     Output a lot of info..
+    -v, --verbose                   Output less less info.
+    --log-filename=logfilename      Name of the log file.
+    --frames-path=<path>            Where to find the hour directories,
+                                    [default: /data/frames].
+    --from=<hour>                   First hour to process. Format:
+                                    YYYYmmddTHH, e.g. 20150503T12.
+    --to=<hour>                     Last hour to process (included).
+                                    Format: YYYYmmddTHH.
+    --processes=<n>                 Number of worker processes.
+                                    Default: The number of cpus.
+    --warmup-frames=<n>             Number of frames from the previous hour
+                                    tracked to warm up the background model
+                                    (the tracks found are not saved).
+                                    [default: 200].
+    --track-match-radius=<radius>   Track match radius. See
+                                    count_with_images.py. [default: 25]
+    --roi=<roi>                     Region of interest. See count_with_pi.py.
+    --background=<engine>           The background model. See
+                                    count_with_pi.py. [default: mog].
+    --motion-gate                   Skip the frames where nothing moves.
+                                    See count_with_pi.py.
+    --morphology=<chain>            The morphological operations run on the
+                                    fgmask. See count_with_pi.py.
+                                    [default: close:15].
+""".format(filename=os.path.basename(__file__))
+
+import datetime
+import functools
+import itertools
+import multiprocessing
+import cv2
+import objecttracker
+import logging
+
+# Define the logger
+LOG = logging.getLogger(__name__)
+
+
+def frame_references(source):
+    """
+    Gets (timestamp, read) for the frames of an hour, sorted by time,
+    where read() reads the frame. The source is the path of an hour
+    directory with png files and / or a segment (the same path without
+    extension), e.g. when the record format was changed within the hour.
+    """
+    references = []
+    if objecttracker.segment.is_segment(source):
+        reader = objecttracker.segment.SegmentReader(source)
+        references.extend((reader.timestamp(i),
+                           functools.partial(reader.frame, i))
+                          for i in range(len(reader)))
+    if os.path.isdir(source):
+        references.extend(
+            (timestamp, functools.partial(cv2.imread, filename))
+            for timestamp, filename in
+            objecttracker.manifest.directory_frame_files(source))
+    references.sort(key=lambda reference: reference[0])
+    return references
+
+
+def source_frames(source):
+    """
+    Yields (frame, timestamp) for an hour directory and / or segment.
+    """
+    for timestamp, read in frame_references(source):
+        yield read(), timestamp
+
+
+def warm_up_frames(source, number_of_frames):
+    """
+    Yields (frame, timestamp) for the last frames of an hour directory
+    and / or segment.
+    """
+    for timestamp, read in frame_references(source)[-number_of_frames:]:
+        yield read(), timestamp
+
+
+def source_hour(source):
+    """
+    Gets the (start, end) of the hour of an hour directory or a segment,
+    as seconds since the epoch (see Track.times).
+    """
+    start = datetime.datetime.strptime(
+        os.path.basename(source),
+        objecttracker.frame_source.HOUR_DIRECTORY_FORMAT)
+    end = start + datetime.timedelta(hours=1)
+    return (objecttracker.track.to_seconds(start),
+            objecttracker.track.to_seconds(end))
+
+
+def started_in(t, hour):
+    """
+    Checks if the track started in the hour (start, end).
+    """
+    start, end = hour
+    return start <= t.times[0] < end
+
+
+def reprocess_directory(task):
+    """
+    Tracks the frames in one hour directory (or segment), and the frames
+    around it, that the tracks of the hour need.
+    Returns the directory and the db values of the tracks that started in
+    the hour.
+    """
+    (directory, previous_directory, next_directory, track_match_radius,
+     warmup_frames, roi_text, background_engine, motion_gate,
+     morphology_chain) = task
+    hour = source_hour(directory)
+    frames = source_frames(directory)
+
+    # The region of interest needs the frame size, so peek at the first
+    # frame.
+    roi = None
+    if roi_text is not None:
+        try:
+            first_frame, first_timestamp = next(frames)
+        except StopIteration:
+            return directory, []
+        roi = objecttracker.region_of_interest.RegionOfInterest.from_string(
+            roi_text, first_frame.shape)
+        frames = itertools.chain([(first_frame, first_timestamp)], frames)
+    gate = None
+    if motion_gate:
+        gate = objecttracker.motion.MotionGate()
+    pipeline = objecttracker.Pipeline(track_match_radius, roi=roi,
+                                      background_engine=background_engine,
+                                      motion_gate=gate,
+                                      morphology_chain=morphology_chain)
+
+    # Track the end of the previous hour. This warms up the background
+    # model, and the tracks already there when the hour starts are left
+    # to the worker of the previous hour.
+    if previous_directory is not None and warmup_frames > 0:
+        LOG.debug("Warming up on frames from '%s'." % previous_directory)
+        frames = itertools.chain(
+            warm_up_frames(previous_directory, warmup_frames), frames)
+
+    rows = []
+    for raw_frame, timestamp in frames:
+        for t in pipeline.process(raw_frame, timestamp,
+                                  keep_raw_frame=False):
+            if started_in(t, hour):
+                rows.append(t.db_values())
+
+    # Go on into the next hour, until the tracks that started in this
+    # hour have ended. The tracks that start in the next hour are left to
+    # the worker of the next hour.
+    if next_directory is not None and source_hour(next_directory)[0] == \
+       hour[1]:
+        for raw_frame, timestamp in source_frames(next_directory):
+            if not any(started_in(t, hour)
+                       for t in pipeline.active_tracks()):
+                break
+            for t in pipeline.process(raw_frame, timestamp,
+                                      keep_raw_frame=False):
+                if started_in(t, hour):
+                    rows.append(t.db_values())
+
+    # The tracks that are still active at the end of the frames.
+    for t in pipeline.flush():
+        if started_in(t, hour):
+            rows.append(t.db_values())
+    return directory, rows
+
+
+if __name__ == "__main__":
+    import docopt
+    args = docopt.docopt(__doc__, version="1.0")
+
+    if args["--debug"]:
+        logging.basicConfig(filename=args["--log-filename"],
+                            level=logging.DEBUG)
+    elif args["--verbose"]:
+        logging.basicConfig(filename=args["--log-filename"],
+                            level=logging.INFO)
+    else:
+        logging.basicConfig(filename=args["--log-filename"],
+                            level=logging.WARNING)
+    LOG.info(args)
+
+    # Hour directories with png files and / or segments. An hour with
+    # both is one directory, so it is only reprocessed once.
+    directories = sorted(
+        set(objecttracker.frame_source.hour_directories(
+            args["--frames-path"]) +
+            objecttracker.segment.segment_prefixes(args["--frames-path"])),
+        key=os.path.basename)
+
+    # The previous and the next directories are used for the tracks
+    # crossing the hour boundaries, also when they are outside the time
+    # range.
+    tasks = []
+    for i, directory in enumerate(directories):
+        hour = os.path.basename(directory)
+        if args["--from"] is not None and hour < args["--from"]:
+            continue
+        if args["--to"] is not None and hour > args["--to"]:
+            continue
+        previous_directory = directories[i - 1] if i > 0 else None
+        next_directory = None
+        if i + 1 < len(directories):
+            next_directory = directories[i + 1]
+        tasks.append((directory,
+                      previous_directory,
+                      next_directory,
+                      int(args["--track-match-radius"]),
+                      int(args["--warmup-frames"]),
+                      args["--roi"],
+                      args["--background"],
+                      args["--motion-gate"],
+                      args["--morphology"]))
+    print "Reprocessing %i hour directories." % len(tasks)
+
+    processes = None
+    if args["--processes"] is not None:
+        processes = int(args["--processes"])
+    pool = multiprocessing.Pool(processes)
+
+    # The workers only return the db values, and the tracks are saved
+    # here, so only one process writes to the database.
+    number_of_tracks = 0
+    for directory, rows in pool.imap_unordered(reprocess_directory, tasks):
+        objecttracker.track.save_rows_to_db(rows)
+        number_of_tracks += len(rows)
+        print "%s: %i tracks saved." % (directory, len(rows))
+    pool.close()
+    pool.join()
+
+    print "FIN. %i tracks saved." % number_of_tracks
@@ -0,0 +1,89 @@
+import unittest
+import os
+import sys
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import association
+from objecttracker import spatial_index
+from objecttracker import track
+from objecttracker import trackpoint
+
+
+def create_track(x, y):
+    t = track.Track()
+    t.add_trackpoint(trackpoint.Trackpoint(0, x, y))
+    return t
+
+
+class TestAssociation(unittest.TestCase):
+
+    def setUp(self):
+        self.tracks = [create_track(10, 10), create_track(50, 10)]
+        self.trackpoints = [trackpoint.Trackpoint(1, 48, 10),
+                            trackpoint.Trackpoint(1, 13, 14),
+                            trackpoint.Trackpoint(1, 200, 200)]
+
+    def test_score_matrix(self):
+        scores = association.score_matrix(self.trackpoints, self.tracks, 10)
+        self.assertEqual(scores.shape, (3, 2))
+        self.assertAlmostEqual(scores[0, 1], 0.8 ** 2)
+        self.assertAlmostEqual(scores[1, 0], 0.5 ** 2)
+        # Outside the radius.
+        self.assertEqual(scores[0, 0], 0)
+        self.assertEqual(scores[2].tolist(), [0, 0])
+
+    def test_score_matrix_with_the_index(self):
+        index = spatial_index.GridIndex(10)
+        index.sync(self.tracks)
+        scores = association.score_matrix(self.trackpoints, self.tracks, 10,
+                                          track_index=index)
+        expected = association.score_matrix(self.trackpoints, self.tracks,
+                                             10)
+        self.assertTrue(numpy.allclose(scores, expected))
+
+    def test_score_matrix_with_the_track_positions(self):
+        scores = association.score_matrix(
+            self.trackpoints, self.tracks, 10,
+            track_positions=numpy.array([(48.0, 10.0), (10.0, 10.0)]))
+        self.assertAlmostEqual(scores[0, 0], 1)
+        self.assertEqual(scores[0, 1], 0)
+
+    def test_score_matrix_with_the_track_radii(self):
+        radii = numpy.array([20.0, 4.0])
+        scores = association.score_matrix(self.trackpoints, self.tracks, 10,
+                                          track_radii=radii)
+        self.assertAlmostEqual(scores[1, 0], 0.75 ** 2)
+        self.assertAlmostEqual(scores[0, 1], 0.5 ** 2)
+        index = spatial_index.GridIndex(10)
+        index.sync(self.tracks)
+        self.assertTrue(numpy.allclose(
+            association.score_matrix(self.trackpoints, self.tracks, 10,
+                                     track_index=index, track_radii=radii),
+            scores))
+
+    def test_empty(self):
+        self.assertEqual(
+            association.score_matrix([], self.tracks, 10).shape, (0, 2))
+        self.assertEqual(
+            association.score_matrix(self.trackpoints, [], 10).shape, (3, 0))
+        self.assertEqual(association.assign(numpy.zeros((0, 2))), [])
+
+    def test_greedy_is_one_to_one(self):
+        scores = numpy.array([[0.9, 0.8],
+                              [0.85, 0.0],
+                              [0.0, 0.0]])
+        self.assertEqual(association.assign_greedy(scores), [(0, 0)])
+
+    def test_optimal_is_one_to_one(self):
+        if association.linear_sum_assignment is None:
+            return
+        scores = numpy.array([[0.9, 0.8],
+                              [0.85, 0.0],
+                              [0.0, 0.0]])
+        self.assertEqual(sorted(association.assign_optimal(scores)),
+                         [(0, 1), (1, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
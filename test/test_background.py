@@ -0,0 +1,63 @@
+import unittest
+import os
+import sys
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import background
+
+
+def frame_with_a_box(x):
+    frame = numpy.full((60, 80, 3), 60, numpy.uint8)
+    frame[20:40, x:x + 20] = 200
+    return frame
+
+
+class TestBackground(unittest.TestCase):
+
+    def check_engine(self, engine):
+        model = background.create(engine)
+        empty = numpy.full((60, 80, 3), 60, numpy.uint8)
+        fgmask = model.apply(empty, learningRate=0.1)
+        self.assertEqual(fgmask.shape, (60, 80))
+        self.assertEqual(fgmask.max(), 0)
+        fgmask = model.apply(frame_with_a_box(30), learningRate=0.1)
+        self.assertEqual(fgmask[30, 40], 255)
+        self.assertEqual(fgmask[5, 5], 0)
+        return model
+
+    def test_running_average(self):
+        model = self.check_engine("running-average")
+        fgmask = model.apply(frame_with_a_box(30), learningRate=0.1)
+        self.assertEqual(fgmask[30, 40], 255)
+
+    def test_running_average_difference(self):
+        model = self.check_engine("running-average-diff")
+        # Nothing moves, so the fgmask is empty.
+        fgmask = model.apply(frame_with_a_box(30), learningRate=0.1)
+        self.assertEqual(fgmask.max(), 0)
+
+    def test_median(self):
+        model = self.check_engine("median")
+        fgmask = model.apply(frame_with_a_box(30), learningRate=0.1)
+        self.assertEqual(fgmask[30, 40], 255)
+
+    def test_frame_difference(self):
+        model = self.check_engine("frame-difference")
+        # Only the edges of the moving box are found.
+        fgmask = model.apply(frame_with_a_box(32), learningRate=0.1)
+        self.assertEqual(fgmask[30, 40], 0)
+        self.assertEqual(fgmask[30, 31], 255)
+
+    def test_the_buffers_are_reused(self):
+        model = background.create("median")
+        fgmask = model.apply(frame_with_a_box(30))
+        self.assertIs(model.apply(frame_with_a_box(30)), fgmask)
+
+    def test_unknown_engine(self):
+        self.assertRaises(background.BackgroundException,
+                          background.create, "magic")
+
+
+if __name__ == '__main__':
+    unittest.main()
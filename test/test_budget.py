@@ -0,0 +1,87 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import budget
+from objecttracker import track
+from objecttracker import trackpoint
+
+
+def add_trackpoints(point_budget, t, times, x=None, speed=1):
+    for i in times:
+        t.add_trackpoint(trackpoint.Trackpoint(
+            i, speed * i if x is None else x, 0, size=1))
+        point_budget.apply(t)
+
+
+class TestPointBudget(unittest.TestCase):
+
+    def test_keeps_the_aggregates(self):
+        point_budget = budget.PointBudget(8, "ring")
+        t = track.Track()
+        for i in range(20):
+            t.add_trackpoint(trackpoint.Trackpoint(i, 3 * i, 0, size=1))
+            point_budget.apply(t)
+        # Stopped.
+        for i in range(20, 30):
+            t.add_trackpoint(trackpoint.Trackpoint(i, 57, 0, size=1))
+            point_budget.apply(t)
+        self.assertLessEqual(len(t.trackpoints), 8)
+        self.assertEqual(t.trackpoints[0].x, 0)
+        self.assertEqual(t.trackpoints[-1].timestamp, 29)
+        self.assertEqual(t.trackpoints[-2].timestamp, 19)
+        self.assertEqual(t.number_of_trackpoints(), 30)
+        self.assertEqual(t.total_length(), 57)
+        self.assertEqual(t.sum_size(), 30)
+
+    def test_none_keeps_all_the_trackpoints(self):
+        point_budget = budget.PointBudget(8, "none")
+        t = track.Track()
+        add_trackpoints(point_budget, t, range(10))
+        # Stopped.
+        add_trackpoints(point_budget, t, range(10, 20), x=9)
+        self.assertEqual(len(t.trackpoints), 20)
+
+    def test_stationary_radius(self):
+        t = track.Track()
+        point_budget = budget.PointBudget(64, "decimate",
+                                          stationary_radius=5)
+        add_trackpoints(point_budget, t, range(10), speed=10)
+        # Stops, and then moves less than 5 pixels.
+        add_trackpoints(point_budget, t, range(10, 14), x=90)
+        add_trackpoints(point_budget, t, [14, 15, 16, 17], x=94)
+        self.assertEqual(len(t.trackpoints), 11)
+        self.assertEqual([tp.timestamp for tp in t.trackpoints[-2:]],
+                         [9, 17])
+        t = track.Track()
+        point_budget = budget.PointBudget(64, "decimate",
+                                          stationary_radius=0)
+        add_trackpoints(point_budget, t, range(10))
+        add_trackpoints(point_budget, t, range(10, 14), x=9)
+        self.assertEqual(len(t.trackpoints), 14)
+
+    def test_decimate(self):
+        point_budget = budget.PointBudget(16, "decimate")
+        t = track.Track()
+        add_trackpoints(point_budget, t, range(100))
+        self.assertLessEqual(len(t.trackpoints), 16)
+        self.assertEqual(t.trackpoints[0].timestamp, 0)
+        self.assertEqual(t.trackpoints[-1].timestamp, 99)
+        self.assertEqual(t.number_of_trackpoints(), 100)
+
+    def test_max_age(self):
+        point_budget = budget.PointBudget(16, "max-age:4")
+        t = track.Track()
+        add_trackpoints(point_budget, t, range(17))
+        self.assertEqual([tp.timestamp for tp in t.trackpoints],
+                         [0, 12, 13, 14, 15, 16])
+
+    def test_unknown_policy(self):
+        for text in ("all", "max-age", "max-age:0", "max-age:x"):
+            self.assertRaises(budget.BudgetException,
+                              budget.parse_policy, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import sys
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+import objecttracker
+from objecttracker import color
+
+
+class TestColor(unittest.TestCase):
+
+    def test_the_colors_are_the_same_every_time(self):
+        colors = color.get_colors(5)
+        self.assertEqual(len(colors), 5)
+        colors.append(None)
+        self.assertEqual(color.get_colors(5), colors[:5])
+        self.assertEqual(color.get_colors(0), [])
+
+    def test_the_global_random_state_is_not_changed(self):
+        numpy.random.seed(12)
+        expected = numpy.random.rand()
+        numpy.random.seed(12)
+        color.get_colors(7)
+        self.assertEqual(numpy.random.rand(), expected)
+
+    def test_palette(self):
+        palette = color.get_palette(3)
+        self.assertEqual(palette.shape, (4, 3))
+        self.assertEqual(palette.dtype, numpy.uint8)
+        self.assertEqual(palette[0].tolist(), [0, 0, 0])
+        self.assertIs(color.get_palette(3), palette)
+
+    def test_palette_with_rounding_in_the_hue_step(self):
+        # 360. / 161 adds up to one hue too many with numpy.arange.
+        self.assertEqual(len(color.get_colors(161)), 161)
+        self.assertEqual(color.get_palette(161).shape, (162, 3))
+
+    def test_labelled_mask_to_bgr(self):
+        labelled_fgmask = numpy.zeros((4, 4), numpy.int32)
+        labelled_fgmask[0, 0] = 1
+        labelled_fgmask[3, 3] = 2
+        bgr_mask = objecttracker.labelled2bgr(labelled_fgmask)
+        self.assertEqual(bgr_mask.shape, (4, 4, 3))
+        palette = color.get_palette(2)
+        self.assertEqual(bgr_mask[0, 0].tolist(), palette[1].tolist())
+        self.assertEqual(bgr_mask[3, 3].tolist(), palette[2].tolist())
+        self.assertEqual(bgr_mask[1, 1].tolist(), [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import os
+import sys
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import connected_components
+
+
+def mask_with_holes():
+    fgmask = numpy.zeros((60, 80), numpy.uint8)
+    # A ring, with an object in the hole.
+    fgmask[5:35, 5:35] = 255
+    fgmask[10:30, 10:30] = 0
+    fgmask[15:20, 15:25] = 255
+    # A box with a small hole.
+    fgmask[40:55, 50:75] = 255
+    fgmask[45:48, 60:63] = 0
+    # Two boxes touching at the corners are one object.
+    fgmask[2:6, 45:49] = 255
+    fgmask[6:10, 49:53] = 255
+    return fgmask
+
+
+class TestConnectedComponents(unittest.TestCase):
+
+    def check_backend(self, stats, fgmask):
+        expected = connected_components._stats_opencv(fgmask)
+        result = stats(fgmask)
+        self.assertTrue((result[0] == expected[0]).all())
+        for values, expected_values in zip(result[1:], expected[1:]):
+            self.assertEqual(values.shape, expected_values.shape)
+            self.assertTrue(numpy.allclose(values, expected_values))
+        # Floats, so the average size is not rounded.
+        self.assertEqual(result[2].dtype, numpy.float64)
+
+    def test_the_backends_are_identical(self):
+        fgmask = mask_with_holes()
+        blobs = connected_components.find_blobs(fgmask)
+        self.assertEqual(len(blobs), 4)
+        self.assertEqual(blobs.areas.tolist(),
+                         [32.0, 500.0, 50.0, 366.0])
+        self.check_backend(connected_components._stats_contours, fgmask)
+        if connected_components.ndimage is not None:
+            self.check_backend(connected_components._stats_scipy, fgmask)
+
+    def test_empty_mask(self):
+        fgmask = numpy.zeros((20, 20), numpy.uint8)
+        for stats in (connected_components._stats_opencv,
+                      connected_components._stats_contours):
+            label_image, labels, areas, centroids, bounding_boxes = \
+                stats(fgmask)
+            self.assertEqual(len(labels), 0)
+            self.assertEqual(bounding_boxes.shape, (0, 4))
+
+    def test_min_area(self):
+        blobs = connected_components.find_blobs(mask_with_holes(), 50)
+        self.assertEqual(blobs.areas.tolist(), [500.0, 366.0])
+        self.assertEqual(blobs.bounding_boxes.tolist(),
+                         [[5, 5, 30, 30], [50, 40, 25, 15]])
+
+
+class TestBlobFeatures(unittest.TestCase):
+
+    def test_features(self):
+        fgmask = numpy.zeros((20, 30), numpy.uint8)
+        fgmask[2:6, 2:10] = 255
+        fgmask[10:18, 20:24] = 255
+        fgmask[12:14, 20:22] = 0
+        frame = numpy.zeros((20, 30, 3), numpy.uint8)
+        frame[2:6, 2:10] = (10, 20, 30)
+        frame[10:18, 20:24] = (100, 100, 100)
+        frame[10, 20:24] = (200, 200, 200)
+        # The background is not part of the blob.
+        frame[12:14, 20:22] = 255
+        blobs = connected_components.find_blobs(fgmask)
+        blobs.compute_features(frame)
+        self.assertTrue(numpy.allclose(blobs.mean_colors,
+                                       [(10, 20, 30), (3200 / 28.0, ) * 3]))
+        self.assertTrue(numpy.allclose(blobs.aspect_ratios, [2.0, 0.5]))
+        self.assertTrue(numpy.allclose(blobs.fill_ratios, [1.0, 28 / 32.0]))
+        self.assertAlmostEqual(blobs.intensity_variances[0], 0, places=6)
+        # 4 pixels of 200 and 24 of 100.
+        self.assertAlmostEqual(blobs.intensity_variances[1],
+                               4 / 28.0 * 24 / 28.0 * 100 ** 2, places=3)
+
+    def test_select_keeps_the_features(self):
+        fgmask = numpy.zeros((20, 30), numpy.uint8)
+        fgmask[2:6, 2:10] = 255
+        fgmask[10:18, 20:24] = 255
+        blobs = connected_components.find_blobs(fgmask)
+        blobs.compute_features(numpy.zeros((20, 30, 3), numpy.uint8))
+        selected = blobs.select(blobs.areas > 32)
+        self.assertEqual(len(selected), 0)
+        selected = blobs.select(numpy.array([False, True]))
+        self.assertEqual(selected.aspect_ratios.tolist(), [0.5])
+
+    def test_no_blobs(self):
+        fgmask = numpy.zeros((20, 30), numpy.uint8)
+        blobs = connected_components.find_blobs(fgmask)
+        blobs.compute_features(numpy.zeros((20, 30, 3), numpy.uint8))
+        self.assertEqual(blobs.mean_colors.shape, (0, 3))
+        self.assertEqual(len(blobs.fill_ratios), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import os
+import sys
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+import objecttracker
+from objecttracker import counting
+from objecttracker import relink
+from objecttracker import track
+from objecttracker import trackpoint
+
+
+def summary(events):
+    return [(e.counter, e.direction, e.timestamp) for e in events]
+
+
+class TestCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.counter = counting.Counter(
+            lines=[("Line", (10, 0), (10, 20))],
+            zones=[("Zone", [(15, 0), (30, 0), (30, 20), (15, 20)])])
+        self.track = track.Track()
+
+    def move(self, xs, start=0, y=5):
+        """
+        Adds a trackpoint for each x to the track, one second apart, and
+        updates the counter. Returns the events.
+        """
+        events = []
+        for i, x in enumerate(xs):
+            self.track.add_trackpoint(
+                trackpoint.Trackpoint(start + i, x, y, size=100))
+            events += self.counter.update([self.track], start + i)
+        return events
+
+    def test_counts_lines_and_zones(self):
+        events = self.move([i * 3 for i in range(8)])
+        # Counted, when more than the margin (2 pixels) past the line and
+        # inside the zone.
+        self.assertEqual(summary(events),
+                         [("Line", "left", 5), ("Zone", "enter", 6)])
+        self.assertEqual(events[0].classification, "pers.")
+
+    def test_a_crossing_before_min_trackpoints(self):
+        # Crossed between the first and the second trackpoint.
+        events = self.move([0, 13, 14])
+        self.assertEqual(summary(events), [("Line", "left", 2)])
+
+    def test_jitter_on_the_line_is_not_counted(self):
+        events = self.move([9, 11, 9, 11, 10, 9, 11, 9])
+        self.assertEqual(events, [])
+
+    def test_a_track_is_counted_once_for_each_line(self):
+        events = self.move([0, 3, 6, 14, 6, 0, 14, 0])
+        self.assertEqual(summary(events), [("Line", "left", 3)])
+
+    def test_going_around_the_end_of_the_line(self):
+        events = self.move([0, 3, 6, 12, 16], y=30)
+        self.assertEqual(events, [])
+
+    def test_zone_enter_and_exit(self):
+        # Along the edge of the zone, in, back and forth over the edge,
+        # out, and in and out again.
+        events = self.move([8, 14, 16, 14, 16, 22, 14, 22, 40, 22, 40])
+        self.assertEqual(summary(events),
+                         [("Zone", "enter", 5), ("Zone", "exit", 8)])
+
+    def test_starting_on_the_edge_of_a_zone(self):
+        # It is not known if it entered, but it exits.
+        events = self.move([16, 22, 24, 40])
+        self.assertEqual(summary(events), [("Zone", "exit", 3)])
+
+    def test_a_relinked_track_is_not_counted_again(self):
+        self.move([0, 3, 6, 14])
+        # The track is gone for a second, e.g. hidden and then re-linked.
+        self.assertEqual(self.counter.update([], 4), [])
+        self.assertEqual(self.move([6, 14], start=5), [])
+
+    def test_a_gap_bridged_by_relink_is_counted(self):
+        self.move([0, 2, 4])
+        self.assertEqual(self.counter.update([], 3), [])
+        # It crossed the line, while it was hidden.
+        self.assertEqual(summary(self.move([13, 14], start=4)),
+                         [("Line", "left", 4)])
+
+    def test_an_occlusion_over_the_line_is_counted_once(self):
+        counter = counting.Counter(lines=[("Line", (10, 0), (10, 20))],
+                                   memory=5)
+        relink_index = relink.RelinkIndex(5, window=5)
+        hidden_track = track.Track()
+        new_track = track.Track()
+        tracks = [hidden_track]
+        events = []
+        for time in range(10):
+            if time < 4:
+                hidden_track.add_trackpoint(
+                    trackpoint.Trackpoint(time, 2 * time, 5, size=100))
+            elif time == 4:
+                # Hidden just before the line.
+                hidden_track.age = 11
+            else:
+                # Appears on the line, and is counted, before it is
+                # re-linked with 4 trackpoints.
+                if time == 5:
+                    tracks.append(new_track)
+                new_track.add_trackpoint(
+                    trackpoint.Trackpoint(time, 3 * time - 8, 5, size=100))
+            tracks, tracks_to_save = objecttracker.relink_tracks(
+                tracks, time, relink_index, counter)
+            events += counter.update(tracks, time)
+        self.assertEqual(tracks, [hidden_track])
+        self.assertEqual(summary(events), [("Line", "left", 7)])
+
+    def test_gone_tracks_are_forgotten(self):
+        self.move([0, 3, 6])
+        self.counter.update([], 10)
+        self.assertEqual(self.counter._states, {})
+
+    def test_distances(self):
+        points = numpy.array([(0.0, 5.0), (20.0, 5.0)])
+        distances = counting.signed_distances(
+            points, numpy.array([(10.0, 0.0)]), numpy.array([(10.0, 20.0)]))
+        self.assertEqual(distances[:, 0].tolist(), [10, -10])
+        polygon = numpy.array([(0.0, 0.0), (10.0, 0.0), (10.0, 10.0),
+                               (0.0, 10.0)])
+        self.assertEqual(counting.edge_distances(
+            numpy.array([(5.0, 4.0), (13.0, 14.0)]), polygon).tolist(),
+            [4, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
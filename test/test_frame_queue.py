@@ -0,0 +1,116 @@
+import unittest
+import os
+import sys
+import time
+import Queue
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import frame_queue
+from objecttracker import framebuffer
+
+
+def get_all(queue):
+    items = []
+    try:
+        while True:
+            items.append(queue.get(timeout=0.1))
+    except Queue.Empty:
+        pass
+    return items
+
+
+class TestFrameQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.dropped_items = []
+
+    def create_queue(self, policy, nth=1):
+        return frame_queue.FrameQueue(2, policy, nth,
+                                      on_drop=self.dropped_items.append)
+
+    def test_block_keeps_all_the_frames(self):
+        queue = self.create_queue("block")
+        self.assertTrue(queue.put(1))
+        self.assertTrue(queue.put(2))
+        self.assertRaises(Queue.Full, queue.put, 3, True, 0.01)
+        self.assertEqual(get_all(queue), [1, 2])
+        self.assertEqual(queue.dropped(), 0)
+        self.assertEqual(self.dropped_items, [])
+
+    def test_drop_newest(self):
+        queue = self.create_queue("drop-newest")
+        for item in range(4):
+            queue.put(item)
+        self.assertEqual(get_all(queue), [0, 1])
+        self.assertEqual(self.dropped_items, [2, 3])
+        self.assertEqual(queue.frames_in(), 4)
+        self.assertEqual(queue.dropped(), 2)
+
+    def test_drop_oldest(self):
+        queue = self.create_queue("drop-oldest")
+        for item in range(4):
+            self.assertTrue(queue.put(item))
+        self.assertEqual(get_all(queue), [2, 3])
+        self.assertEqual(self.dropped_items, [0, 1])
+        self.assertEqual(queue.dropped(), 2)
+
+    def test_every_nth(self):
+        queue = self.create_queue("every-nth", nth=3)
+        kept = [queue.put(item) for item in range(6)]
+        self.assertEqual(kept, [True, False, False, True, False, False])
+        self.assertEqual(get_all(queue), [0, 3])
+        self.assertEqual(self.dropped_items, [1, 2, 4, 5])
+
+    def test_the_slots_are_marked(self):
+        buffer = framebuffer.FrameRingBuffer(2, (2, 2))
+        queue = frame_queue.FrameQueue(1, "drop-newest", buffers=(buffer, ))
+        frame = numpy.zeros((2, 2), dtype=numpy.uint8)
+        kept_slot = buffer.write(frame)
+        dropped_slot = buffer.write(frame)
+        queue.put([kept_slot, "timestamp"])
+        self.assertEqual(buffer.holder(kept_slot), framebuffer.QUEUED)
+        queue.put([dropped_slot, "timestamp"])
+        self.assertEqual(buffer.holder(dropped_slot), framebuffer.FREE)
+        self.assertEqual(queue.get(timeout=1), [kept_slot, "timestamp"])
+        self.assertEqual(buffer.holder(kept_slot), os.getpid())
+        self.assertEqual(buffer.acquire(timeout=1), dropped_slot)
+
+    def test_a_put_that_times_out(self):
+        buffer = framebuffer.FrameRingBuffer(2, (2, 2))
+        queue = frame_queue.FrameQueue(1, "block", buffers=(buffer, ))
+        frame = numpy.zeros((2, 2), dtype=numpy.uint8)
+        queue.put([buffer.write(frame), "timestamp"])
+        slot = buffer.write(frame)
+        self.assertRaises(Queue.Full, queue.put, [slot, "timestamp"],
+                          timeout=0.1)
+        # Still held by this process, so it is released, if it dies.
+        self.assertEqual(buffer.holder(slot), os.getpid())
+        self.assertEqual(buffer.reclaim(os.getpid()), 1)
+        self.assertEqual(buffer.acquire(timeout=1), slot)
+
+    def test_time_in_the_queue(self):
+        queue = self.create_queue("block")
+        queue.put(1)
+        time.sleep(0.05)
+        item, queue_wait = queue.get_timed(timeout=1)
+        self.assertEqual(item, 1)
+        self.assertGreaterEqual(queue_wait, 0.05)
+        self.assertLess(queue_wait, 1)
+
+    def test_the_end_is_never_dropped(self):
+        queue = self.create_queue("every-nth", nth=3)
+        queue.put(1)
+        queue.put_end()
+        self.assertEqual(get_all(queue), [1, frame_queue.END_OF_FRAMES])
+        self.assertEqual(self.dropped_items, [])
+
+    def test_unknown_policy(self):
+        self.assertRaises(frame_queue.FrameQueueException,
+                          frame_queue.FrameQueue, 2, "drop-all")
+        self.assertRaises(frame_queue.FrameQueueException,
+                          frame_queue.FrameQueue, 2, "every-nth", 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
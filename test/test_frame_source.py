@@ -0,0 +1,70 @@
+import unittest
+import os
+import sys
+import datetime
+import tempfile
+import shutil
+import numpy
+import cv2
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import frame_source
+from objecttracker import framebuffer
+
+
+class TestFrameSource(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.timestamps = []
+        start = datetime.datetime(2015, 5, 3, 12, 59, 59)
+        for i in range(6):
+            timestamp = start + datetime.timedelta(seconds=i * 0.5)
+            directory = os.path.join(self.path, timestamp.strftime(
+                frame_source.HOUR_DIRECTORY_FORMAT))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            frame = numpy.full((4, 6, 3), i, numpy.uint8)
+            cv2.imwrite(os.path.join(directory,
+                                     "%s.png" % timestamp.isoformat()),
+                        frame)
+            self.timestamps.append(timestamp)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_parse_timestamp(self):
+        self.assertEqual(
+            frame_source.parse_timestamp("2015-05-03T12:55:15.462884.png"),
+            datetime.datetime(2015, 5, 3, 12, 55, 15, 462884))
+        self.assertEqual(
+            frame_source.parse_timestamp("2015-05-03T12:55:15.png"),
+            datetime.datetime(2015, 5, 3, 12, 55, 15))
+
+    def test_hour_directories(self):
+        os.makedirs(os.path.join(self.path, "not an hour"))
+        self.assertEqual(
+            [os.path.basename(d)
+             for d in frame_source.hour_directories(self.path)],
+            ["20150503T12", "20150503T13"])
+
+    def test_frames_are_in_order(self):
+        frames = list(frame_source.DirectoryFrameSource(self.path,
+                                                         threads=3,
+                                                         prefetch=2))
+        self.assertEqual([timestamp for frame, timestamp in frames],
+                         self.timestamps)
+        self.assertEqual([int(frame[0, 0, 0]) for frame, timestamp in frames],
+                         range(6))
+
+    def test_frames_in_a_frame_buffer(self):
+        buffer = framebuffer.FrameRingBuffer(4, (4, 6, 3))
+        source = frame_source.DirectoryFrameSource(self.path, prefetch=2,
+                                                   frame_buffer=buffer)
+        for i, (slot, timestamp) in enumerate(source):
+            self.assertEqual(buffer.read(slot)[0, 0, 0], i)
+            buffer.release(slot)
+
+
+if __name__ == '__main__':
+    unittest.main()
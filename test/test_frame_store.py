@@ -0,0 +1,97 @@
+import unittest
+import os
+import sys
+import pickle
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import budget
+from objecttracker import frame_store
+from objecttracker import track
+from objecttracker import trackpoint
+
+
+class TestFrameStore(unittest.TestCase):
+
+    def add_trackpoints(self, store, t, times, x=None, point_budget=None):
+        """
+        Adds a trackpoint with a frame (filled with the time) for each
+        time, as the pipeline does.
+        """
+        for i in times:
+            frame = numpy.full((4, 4), i, dtype=numpy.uint8)
+            t.add_trackpoint(trackpoint.Trackpoint(
+                i, i if x is None else x, 1, store.handle(frame, i)))
+            if point_budget is not None:
+                point_budget.apply(t)
+            store.commit([t])
+            frame[:] = 255
+
+    def kept_times(self, t):
+        return [tp.timestamp for tp in t.trackpoints if tp.frame is not None]
+
+    def test_every_nth_frame(self):
+        store = frame_store.FrameStore("every:2")
+        t = track.Track()
+        self.add_trackpoints(store, t, range(5))
+        # The frames are copied, when the tracks are matched.
+        frames = [tp.frame for tp in t.trackpoints]
+        self.assertEqual([f is None for f in frames],
+                         [False, True, False, True, False])
+        self.assertEqual(frames[2].resolve()[0, 0], 2)
+        frames = pickle.loads(pickle.dumps(frames, 2))
+        self.assertEqual(frames[4].resolve()[0, 0], 4)
+
+    def test_every_nth_frame_after_the_budget(self):
+        store = frame_store.FrameStore("every:2")
+        point_budget = budget.PointBudget(8, "ring")
+        t = track.Track()
+        self.add_trackpoints(store, t, range(20), point_budget=point_budget)
+        self.assertLess(len(t.trackpoints), 20)
+        kept = self.kept_times(t)
+        self.assertEqual([time % 2 for time in kept], [0] * len(kept))
+        # Stopped, so the budget removes the trackpoint before the last.
+        self.add_trackpoints(store, t, range(20, 25), x=19,
+                             point_budget=point_budget)
+        self.assertEqual(self.kept_times(t)[-2:], [18, 24])
+
+    def test_middle_frame(self):
+        store = frame_store.FrameStore("middle")
+        t = track.Track()
+        # Most of the trackpoints are at the end of the track.
+        self.add_trackpoints(store, t, [0, 1, 2, 3] + range(14, 21))
+        self.assertEqual(self.kept_times(t), [3] + range(14, 21))
+        store.finish(t)
+        self.assertEqual(self.kept_times(t), [14])
+
+    def test_middle_frame_after_the_budget(self):
+        store = frame_store.FrameStore("middle")
+        point_budget = budget.PointBudget(8, "decimate")
+        t = track.Track()
+        self.add_trackpoints(store, t, range(41), point_budget=point_budget)
+        store.finish(t)
+        # The trackpoint nearest the middle, that the budget kept.
+        middle = min(t.times, key=lambda time: abs(time - 20))
+        self.assertEqual(self.kept_times(t), [middle])
+
+    def test_crops(self):
+        store = frame_store.FrameStore("crops", margin=1)
+        frame = numpy.arange(100, dtype=numpy.uint8).reshape(10, 10)
+        handle = store.handle(frame, 0, (4, 4, 2, 2))
+        t = track.Track()
+        t.add_trackpoint(trackpoint.Trackpoint(0, 5, 5, handle))
+        store.commit([t])
+        self.assertEqual(handle.box, (3, 3, 4, 4))
+        resolved = handle.resolve()
+        self.assertEqual(resolved[3, 3], 33)
+        self.assertEqual(resolved[0, 0], 0)
+        self.assertEqual(store.number_of_frames, 0)
+
+    def test_unknown_retention(self):
+        for text in ("some", "every", "every:0", "every:x"):
+            self.assertRaises(frame_store.FrameStoreException,
+                              frame_store.parse_retention, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
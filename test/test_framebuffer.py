@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import Queue
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import framebuffer
+
+
+class TestFrameRingBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.buffers = []
+
+    def tearDown(self):
+        # Take all the free slots, so they have been sent through the
+        # queue, before it is closed.
+        for buffer in self.buffers:
+            try:
+                while True:
+                    buffer.acquire(timeout=0.1)
+            except Queue.Empty:
+                pass
+
+    def create_buffer(self, number_of_slots, shape):
+        buffer = framebuffer.FrameRingBuffer(number_of_slots, shape)
+        self.buffers.append(buffer)
+        return buffer
+
+    def test_write_and_read_a_frame(self):
+        buffer = self.create_buffer(2, (4, 3))
+        frame = numpy.arange(12, dtype=numpy.uint8).reshape(4, 3)
+        slot = buffer.write(frame)
+        self.assertTrue((buffer.read(slot) == frame).all())
+
+    def test_slots_are_reused_when_released(self):
+        buffer = self.create_buffer(2, (4, 3))
+        frame = numpy.zeros((4, 3), dtype=numpy.uint8)
+        slots = [buffer.write(frame), buffer.write(frame)]
+        self.assertEqual(sorted(slots), [0, 1])
+        self.assertRaises(Exception, buffer.write, frame, False)
+        buffer.release(slots[0])
+        self.assertEqual(buffer.write(frame + 7, timeout=1), slots[0])
+        self.assertEqual(buffer.read(slots[0])[0, 0], 7)
+
+    def test_wrong_shape(self):
+        buffer = self.create_buffer(1, (4, 3))
+        self.assertRaises(framebuffer.FrameBufferException, buffer.write,
+                          numpy.zeros((3, 4), dtype=numpy.uint8))
+
+    def test_pickled_buffer_shares_the_frames(self):
+        buffer = self.create_buffer(1, (4, 3))
+        slot = buffer.write(numpy.ones((4, 3), dtype=numpy.uint8))
+        state = buffer.__getstate__()
+        self.assertIsNone(state["_frames"])
+        self.assertEqual(buffer.read(slot).sum(), 12)
+
+    def test_reclaim_the_slots_of_a_process(self):
+        buffer = self.create_buffer(3, (2, 2))
+        frame = numpy.zeros((2, 2), dtype=numpy.uint8)
+        slots = [buffer.write(frame) for i in range(3)]
+        self.assertEqual(buffer.holder(slots[0]), os.getpid())
+        buffer.hold(slots[1], framebuffer.QUEUED)
+        buffer.hold(slots[2], 12345)
+        self.assertEqual(buffer.reclaim(12345), 1)
+        self.assertEqual(buffer.holder(slots[2]), framebuffer.FREE)
+        self.assertEqual(buffer.acquire(timeout=1), slots[2])
+        # The slots held by this process, but not the queued one.
+        self.assertEqual(buffer.reclaim(os.getpid()), 2)
+        self.assertEqual(buffer.holder(slots[1]), framebuffer.QUEUED)
+
+    def test_slot_releaser(self):
+        masks = self.create_buffer(1, (2, 2))
+        raws = self.create_buffer(1, (2, 2))
+        frame = numpy.zeros((2, 2), dtype=numpy.uint8)
+        item = [masks.write(frame), raws.write(frame), None]
+        framebuffer.SlotReleaser(masks, raws)(item)
+        self.assertEqual(masks.acquire(timeout=1), item[0])
+        self.assertEqual(raws.acquire(timeout=1), item[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import os
+import sys
+import datetime
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import kalman
+from objecttracker import track
+from objecttracker import trackpoint
+
+START = datetime.datetime(2015, 5, 3, 12)
+
+
+def at(seconds):
+    return START + datetime.timedelta(seconds=seconds)
+
+
+def create_track(*points):
+    """
+    Creates a track from (seconds, x, y).
+    """
+    t = track.Track()
+    for seconds, x, y in points:
+        t.add_trackpoint(trackpoint.Trackpoint(at(seconds), x, y))
+    return t
+
+
+class TestKalmanBank(unittest.TestCase):
+
+    def test_the_velocity_of_a_new_track(self):
+        bank = kalman.KalmanBank()
+        t = create_track((0, 10, 10), (0.5, 20, 15))
+        bank.add(t)
+        bank.predict(at(1))
+        self.assertTrue(numpy.allclose(bank.position(t), (30, 20)))
+
+    def test_predict_with_a_variable_time_step(self):
+        bank = kalman.KalmanBank()
+        t = create_track((0, 0, 0), (1, 10, 0))
+        bank.add(t)
+        bank.predict(at(1.5))
+        self.assertTrue(numpy.allclose(bank.position(t), (15, 0)))
+        short_variance = bank.position_variances([t])[0, 0]
+        # A dropped frame is just a longer prediction.
+        bank.predict(at(3.5))
+        self.assertTrue(numpy.allclose(bank.position(t), (35, 0)))
+        self.assertGreater(bank.position_variances([t])[0, 0],
+                           short_variance)
+        # Predicting back in time does nothing.
+        bank.predict(at(3))
+        self.assertTrue(numpy.allclose(bank.position(t), (35, 0)))
+
+    def test_update_moves_towards_the_measurement(self):
+        bank = kalman.KalmanBank()
+        t = create_track((0, 0, 0), (1, 10, 0))
+        bank.add(t)
+        bank.predict(at(2))
+        variance = bank.position_variances([t])[0, 0]
+        x, y = bank.update([t], [(24, 0)])[0]
+        self.assertGreater(x, 20)
+        self.assertLess(x, 24)
+        self.assertLess(bank.position_variances([t])[0, 0], variance)
+        self.assertEqual(bank.update([], []).shape, (0, 2))
+
+    def test_gate_radii(self):
+        bank = kalman.KalmanBank()
+        steady = create_track((0, 0, 0), (1, 10, 0))
+        lost = create_track((0, 0, 50), (1, 10, 50))
+        bank.sync([steady, lost])
+        for i in range(2, 10):
+            bank.predict(at(i))
+            bank.update([steady], [(10 * i, 0)])
+        steady_radius, lost_radius = bank.gate_radii([steady, lost], 10)
+        self.assertLess(steady_radius, lost_radius)
+        self.assertGreaterEqual(steady_radius, 5)
+        self.assertEqual(lost_radius, 20)
+
+    def test_add_remove_and_sync(self):
+        bank = kalman.KalmanBank()
+        tracks = [create_track((0, i, i)) for i in range(20)]
+        bank.sync(tracks)
+        self.assertEqual(len(bank), 20)
+        self.assertTrue(numpy.allclose(bank.positions(tracks),
+                                       [(i, i) for i in range(20)]))
+        bank.remove(tracks[3])
+        self.assertNotIn(tracks[3], bank)
+        # The last row was moved into the place of the removed track.
+        self.assertEqual(bank.position(tracks[19]), (19, 19))
+        bank.sync(tracks[10:])
+        self.assertEqual(len(bank), 10)
+        self.assertTrue(numpy.allclose(bank.positions(tracks[10:]),
+                                       [(i, i) for i in range(10, 20)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
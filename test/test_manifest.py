@@ -0,0 +1,97 @@
+import unittest
+import os
+import sys
+import datetime
+import tempfile
+import shutil
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import manifest
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.directory = os.path.join(self.path, "20150503T12")
+        os.makedirs(self.directory)
+        self.timestamps = [datetime.datetime(2015, 5, 3, 12, 0, i / 2,
+                                             (i % 2) * 500000)
+                           for i in range(10)]
+        writer = manifest.ManifestWriter()
+        for timestamp in self.timestamps:
+            filename = "%s.png" % timestamp.isoformat()
+            open(os.path.join(self.directory, filename), "w").close()
+            writer.add(self.directory, filename)
+        writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def timestamps_between(self, time_from, time_to):
+        return [timestamp for timestamp, filename in
+                manifest.directory_frame_files(self.directory, time_from,
+                                               time_to)]
+
+    def test_parse_time(self):
+        self.assertEqual(manifest.parse_time("2015-05-03T12:30"),
+                         datetime.datetime(2015, 5, 3, 12, 30))
+        self.assertEqual(manifest.parse_time("2015-05-03"),
+                         datetime.datetime(2015, 5, 3))
+        self.assertRaises(manifest.ManifestException, manifest.parse_time,
+                          "20150503T12")
+
+    def test_all_frames(self):
+        self.assertEqual(self.timestamps_between(None, None),
+                         self.timestamps)
+
+    def test_range_includes_both_ends(self):
+        self.assertEqual(self.timestamps_between(self.timestamps[2],
+                                                 self.timestamps[5]),
+                         self.timestamps[2:6])
+
+    def test_range_between_frames(self):
+        self.assertEqual(
+            self.timestamps_between(
+                self.timestamps[2] + datetime.timedelta(microseconds=1),
+                self.timestamps[5] - datetime.timedelta(microseconds=1)),
+            self.timestamps[3:5])
+        self.assertEqual(
+            self.timestamps_between(datetime.datetime(2015, 5, 3, 13),
+                                    None),
+            [])
+
+    def test_half_written_line_is_skipped(self):
+        with open(os.path.join(self.directory, manifest.MANIFEST_FILENAME),
+                  "a") as f:
+            f.write("2015-05-03T12:00:05.5")
+        self.assertEqual(len(manifest.read_manifest(self.directory)), 10)
+
+    def test_manifest_is_built_from_the_directory(self):
+        os.remove(os.path.join(self.directory, manifest.MANIFEST_FILENAME))
+        self.assertEqual(self.timestamps_between(None, None),
+                         self.timestamps)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.directory, manifest.MANIFEST_FILENAME)))
+
+    def test_frames_saved_before_the_manifest_are_kept(self):
+        os.remove(os.path.join(self.directory, manifest.MANIFEST_FILENAME))
+        timestamp = datetime.datetime(2015, 5, 3, 12, 0, 5)
+        filename = "%s.png" % timestamp.isoformat()
+        open(os.path.join(self.directory, filename), "w").close()
+        writer = manifest.ManifestWriter()
+        writer.add(self.directory, filename)
+        writer.close()
+        self.assertEqual(self.timestamps_between(None, None),
+                         self.timestamps + [timestamp])
+
+    def test_frame_files_in_the_hours(self):
+        frame_files = list(manifest.frame_files(
+            self.path, datetime.datetime(2015, 5, 3, 12, 0, 4),
+            datetime.datetime(2015, 5, 3, 14)))
+        self.assertEqual([timestamp for timestamp, filename in frame_files],
+                         self.timestamps[8:])
+
+
+if __name__ == '__main__':
+    unittest.main()
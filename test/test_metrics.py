@@ -0,0 +1,56 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+import shutil
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import metrics
+
+
+class TestStageMetrics(unittest.TestCase):
+
+    def test_histograms(self):
+        stage_metrics = metrics.StageMetrics("Tracker")
+        stage_metrics.frame_in(queue_wait=0.5, idle=0.001)
+        stage_metrics.frame_in()
+        stage_metrics.observe("processing", 0.015)
+        stage_metrics.frame_out(3)
+
+        snapshot = stage_metrics.snapshot()
+        self.assertEqual(snapshot["frames_in"], 2)
+        self.assertEqual(snapshot["frames_out"], 3)
+        self.assertEqual(snapshot["queue_wait"]["count"], 1)
+        self.assertEqual(snapshot["queue_wait"]["avg_ms"], 500)
+        self.assertEqual(dict(snapshot["queue_wait"]["buckets"])["<=500ms"],
+                         1)
+        self.assertEqual(dict(snapshot["idle"]["buckets"])["<=1ms"], 1)
+        self.assertEqual(dict(snapshot["processing"]["buckets"])["<=20ms"],
+                         1)
+        self.assertIsNone(snapshot["latency"]["avg_ms"])
+
+    def test_over_the_highest_bucket(self):
+        stage_metrics = metrics.StageMetrics("Tracker")
+        stage_metrics.observe("latency", 60)
+        buckets = stage_metrics.snapshot()["latency"]["buckets"]
+        self.assertEqual(buckets[-1], [">5000ms", 1])
+
+    def test_write_stats_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "stats.json")
+            metrics.write_stats_file(filename,
+                                     [metrics.StageMetrics("Closer")],
+                                     {"restarts": {"Closer": 0}})
+            with open(filename) as f:
+                stats = json.load(f)
+            self.assertEqual(stats["stages"][0]["name"], "Closer")
+            self.assertEqual(stats["restarts"], {"Closer": 0})
+            self.assertEqual(os.listdir(directory), ["stats.json"])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
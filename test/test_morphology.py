@@ -0,0 +1,51 @@
+import unittest
+import os
+import sys
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import morphology
+
+
+class TestMorphology(unittest.TestCase):
+
+    def test_parse_chain(self):
+        self.assertEqual(morphology.parse_chain("open:5, close:15:2"),
+                         [("open", 5, 1), ("close", 15, 2)])
+        self.assertEqual(morphology.parse_chain("none"), [])
+
+    def test_invalid_chain(self):
+        for text in ("shrink:3", "open", "open:big", "open:3:1:1"):
+            self.assertRaises(morphology.MorphologyException,
+                              morphology.parse_chain, text)
+
+    def test_no_operations_copies(self):
+        fgmask = numpy.zeros((8, 8), numpy.uint8)
+        result = morphology.Morphology("none").apply(fgmask)
+        self.assertIsNot(result, fgmask)
+        self.assertTrue((result == fgmask).all())
+
+    def test_close_fills_a_hole(self):
+        fgmask = numpy.zeros((40, 40), numpy.uint8)
+        fgmask[10:30, 10:30] = 255
+        fgmask[19:21, 19:21] = 0
+        morphology.Morphology("close:5").apply(fgmask, dst=fgmask)
+        self.assertEqual(fgmask[20, 20], 255)
+        self.assertEqual(fgmask[5, 5], 0)
+
+    def test_open_removes_noise(self):
+        fgmask = numpy.zeros((40, 40), numpy.uint8)
+        fgmask[10:30, 10:30] = 255
+        fgmask[2, 2] = 255
+        result = morphology.Morphology("open:3").apply(fgmask)
+        self.assertEqual(result[2, 2], 0)
+        self.assertEqual(result[20, 20], 255)
+
+    def test_the_kernels_are_cached(self):
+        first = morphology.Morphology("close:7")
+        second = morphology.Morphology("dilate:7")
+        self.assertIs(first.steps[0][1], second.steps[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import os
+import sys
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import motion
+
+
+class TestMotionGate(unittest.TestCase):
+
+    def setUp(self):
+        self.empty = numpy.full((64, 64, 3), 60, numpy.uint8)
+        self.moved = self.empty.copy()
+        self.moved[16:32, 16:32] = 200
+
+    def test_idle_frames_are_skipped(self):
+        gate = motion.MotionGate(background_interval=4)
+        # The first frame is always processed.
+        self.assertEqual(gate.check(self.empty), "process")
+        checks = [gate.check(self.empty) for i in range(4)]
+        self.assertEqual(checks, ["skip", "skip", "skip", "background"])
+        self.assertEqual(gate.check(self.moved), "process")
+        self.assertEqual(gate.check(self.moved), "skip")
+
+    def test_active_tracks_are_processed(self):
+        gate = motion.MotionGate()
+        gate.check(self.empty)
+        gate.set_active_tracks(1)
+        self.assertEqual(gate.active_tracks, 1)
+        self.assertEqual(gate.check(self.empty), "process")
+        gate.set_active_tracks(0)
+        self.assertEqual(gate.check(self.empty), "skip")
+
+    def test_pickled_gate_shares_the_active_tracks(self):
+        gate = motion.MotionGate()
+        gate.check(self.empty)
+        state = gate.__getstate__()
+        self.assertIsNone(state["_previous"])
+        self.assertIs(state["_active_tracks"], gate._active_tracks)
+
+    def test_background_learning_rate(self):
+        gate = motion.MotionGate(background_interval=16)
+        self.assertAlmostEqual(gate.background_learning_rate(0.01), 0.16)
+        self.assertEqual(gate.background_learning_rate(0.1), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
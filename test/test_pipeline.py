@@ -0,0 +1,130 @@
+import unittest
+import os
+import sys
+import datetime
+import threading
+import Queue
+import numpy
+import cv2
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+import objecttracker
+from objecttracker import frame_queue
+from objecttracker import framebuffer
+from objecttracker import motion
+
+
+def moving_box_frames(number_of_frames, speed=3):
+    """
+    Yields (frame, timestamp) of a box moving from left to right, and
+    then out of the frame.
+    """
+    start = datetime.datetime(2015, 5, 3, 12)
+    for i in range(number_of_frames):
+        frame = numpy.full((240, 320, 3), 60, numpy.uint8)
+        x = i * speed - 40
+        cv2.rectangle(frame, (x, 100), (x + 50, 140), (200, 180, 30), -1)
+        yield frame, start + datetime.timedelta(seconds=i / 16.0)
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_one_track_for_one_object(self):
+        pipeline = objecttracker.Pipeline(
+            12, background_engine="running-average")
+        tracks_to_save = []
+        for frame, timestamp in moving_box_frames(160):
+            tracks_to_save += pipeline.process(frame, timestamp)
+        tracks_to_save += pipeline.flush()
+        self.assertEqual(len(tracks_to_save), 1)
+        first_x, first_y = tracks_to_save[0].first_position
+        last_x, last_y = tracks_to_save[0].last_position
+        self.assertGreater(last_x - first_x, 200)
+        self.assertAlmostEqual(first_y, 120, delta=2)
+
+    def test_the_buffers_are_reused(self):
+        pipeline = objecttracker.Pipeline(
+            12, background_engine="running-average")
+        frames = moving_box_frames(3)
+        pipeline.process(*next(frames))
+        fgmask = pipeline.fgmask
+        for frame, timestamp in frames:
+            pipeline.process(frame, timestamp)
+        self.assertIs(pipeline.fgmask, fgmask)
+
+    def test_flush_ends_the_tracks(self):
+        pipeline = objecttracker.Pipeline(
+            12, background_engine="running-average")
+        for frame, timestamp in moving_box_frames(60):
+            pipeline.process(frame, timestamp)
+        self.assertGreater(len(pipeline.tracks), 0)
+        # Only the track of the box is long enough to be saved.
+        self.assertEqual(len(pipeline.flush()), 1)
+        self.assertEqual(pipeline.tracks, [])
+
+    def test_the_motion_gate_saves_the_ended_tracks(self):
+        pipeline = objecttracker.Pipeline(
+            12, background_engine="running-average",
+            motion_gate=motion.MotionGate())
+        pipeline.warm_up(numpy.full((240, 320, 3), 60, numpy.uint8))
+        tracks_to_save = []
+        # The box leaves the frame after 120 frames, and nothing moves
+        # for the last 5 seconds.
+        for frame, timestamp in moving_box_frames(200):
+            tracks_to_save += pipeline.process(frame, timestamp)
+        # The ended track is saved, when it can not be re-linked any
+        # more, even though nothing moves.
+        self.assertEqual(len(tracks_to_save), 1)
+        self.assertEqual(pipeline.motion_gate.active_tracks, 0)
+        self.assertEqual(pipeline.flush(), [])
+
+
+class TestTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.mask_buffer = framebuffer.FrameRingBuffer(4, (240, 320))
+        self.raw_buffer = framebuffer.FrameRingBuffer(4, (240, 320, 3))
+
+    def tearDown(self):
+        # Take all the free slots, so they have been sent through the
+        # queue, before it is closed.
+        for buffer in (self.mask_buffer, self.raw_buffer):
+            try:
+                while True:
+                    buffer.acquire(timeout=0.1)
+            except Queue.Empty:
+                pass
+
+    def test_the_tracks_are_saved_at_the_end_of_the_frames(self):
+        input_frames = frame_queue.FrameQueue(
+            2, buffers=(self.mask_buffer, self.raw_buffer))
+        output_tracks = frame_queue.FrameQueue(16)
+        stage = threading.Thread(
+            target=objecttracker.tracker,
+            args=(input_frames, output_tracks, 12, self.mask_buffer,
+                  self.raw_buffer))
+        stage.daemon = True
+        stage.start()
+
+        # The box stops in the middle of the frame.
+        for frame, timestamp in moving_box_frames(60):
+            fgmask = numpy.zeros((240, 320), numpy.uint8)
+            fgmask[(frame[:, :, 0] == 200)] = 255
+            input_frames.put([self.mask_buffer.write(fgmask),
+                              self.raw_buffer.write(frame), timestamp])
+        input_frames.put_end()
+        stage.join(10)
+        self.assertFalse(stage.is_alive())
+
+        items = []
+        while True:
+            item = output_tracks.get(timeout=1)
+            if item is frame_queue.END_OF_FRAMES:
+                break
+            items.append(item)
+        self.assertEqual(len(items), 1)
+        self.assertGreater(items[0].total_length(), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import relink
+from objecttracker import track
+from objecttracker import trackpoint
+
+
+def create_track(start, number_of_trackpoints, x, speed):
+    t = track.Track()
+    for i in range(number_of_trackpoints):
+        t.add_trackpoint(trackpoint.Trackpoint(start + i, x + speed * i, 0))
+    return t
+
+
+class TestRelinkIndex(unittest.TestCase):
+
+    def test_relink_index_predicts_the_hidden_object(self):
+        ended_track = track.Track()
+        for i in range(5):
+            ended_track.add_trackpoint(trackpoint.Trackpoint(i, 10 * i, 0))
+        index = relink.RelinkIndex(5, window=2)
+        index.add(ended_track)
+
+        # Moving the other way.
+        backwards = track.Track()
+        for i in range(4):
+            backwards.add_trackpoint(trackpoint.Trackpoint(5 + i, 60 - i, 0))
+        self.assertIsNone(index.find(backwards))
+
+        # Hidden for 2 seconds, where it moved 20 pixels.
+        new_track = track.Track()
+        for i in range(4):
+            new_track.add_trackpoint(trackpoint.Trackpoint(6 + i, 60 + i, 0))
+        self.assertIs(index.find(new_track), ended_track)
+        self.assertEqual(len(index), 0)
+
+    def test_expire_and_flush(self):
+        index = relink.RelinkIndex(5, window=2, bucket_seconds=1)
+        first = create_track(0, 5, 0, 10)
+        second = create_track(2, 5, 100, 10)
+        index.add(first)
+        index.add(second)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(set(index.tracks()), set([first, second]))
+        epoch = datetime.datetime(1970, 1, 1)
+        self.assertEqual(
+            index.expire(epoch + datetime.timedelta(seconds=7.5)), [first])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.flush(), [second])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.tracks(), [])
+
+    def test_a_full_index_expires_the_oldest(self):
+        index = relink.RelinkIndex(5, max_tracks=2)
+        tracks = [create_track(i, 5, 0, 10) for i in range(3)]
+        for t in tracks:
+            index.add(t)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(set(index.flush()), set(tracks))
+
+
+if __name__ == '__main__':
+    unittest.main()
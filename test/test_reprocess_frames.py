@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import datetime
+import tempfile
+import shutil
+import numpy
+import cv2
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+import objecttracker
+import reprocess_frames
+
+
+class TestReprocessFrames(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def record(self, start, number_of_frames, box_start, box_end):
+        """
+        Records frames from start, with a box moving from left to right
+        between box_start and box_end.
+        """
+        writer = objecttracker.segment.SegmentWriter(self.path)
+        for i in range(number_of_frames):
+            timestamp = start + datetime.timedelta(seconds=i / 16.0)
+            frame = numpy.full((240, 320, 3), 60, numpy.uint8)
+            if box_start <= timestamp < box_end:
+                x = int((timestamp - box_start).total_seconds() * 45) - 40
+                cv2.rectangle(frame, (x, 100), (x + 50, 140),
+                              (200, 180, 30), -1)
+            writer.write(frame, timestamp)
+        writer.close()
+
+    def reprocess(self):
+        prefixes = objecttracker.segment.segment_prefixes(self.path)
+        results = {}
+        for i, prefix in enumerate(prefixes):
+            previous_prefix = prefixes[i - 1] if i > 0 else None
+            next_prefix = prefixes[i + 1] if i + 1 < len(prefixes) else None
+            directory, rows = reprocess_frames.reprocess_directory(
+                (prefix, previous_prefix, next_prefix, 12, 200, None,
+                 "running-average", False, "close:15"))
+            results[os.path.basename(directory)] = rows
+        return results
+
+    def test_track_crossing_the_hour_is_saved_once(self):
+        self.record(datetime.datetime(2015, 5, 3, 12, 59, 40), 640,
+                    datetime.datetime(2015, 5, 3, 12, 59, 56),
+                    datetime.datetime(2015, 5, 3, 13, 0, 4))
+        results = self.reprocess()
+        self.assertEqual(len(results["20150503T12"]), 1)
+        self.assertEqual(len(results["20150503T13"]), 0)
+
+    def test_track_in_the_next_hour(self):
+        self.record(datetime.datetime(2015, 5, 3, 12, 59, 40), 640,
+                    datetime.datetime(2015, 5, 3, 13, 0, 4),
+                    datetime.datetime(2015, 5, 3, 13, 0, 12))
+        results = self.reprocess()
+        self.assertEqual(len(results["20150503T12"]), 0)
+        self.assertEqual(len(results["20150503T13"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
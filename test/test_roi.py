@@ -0,0 +1,61 @@
+import unittest
+import os
+import sys
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+import objecttracker
+from objecttracker import roi
+
+
+class TestRegionOfInterest(unittest.TestCase):
+
+    def test_rectangle(self):
+        region = roi.RegionOfInterest.from_string("10,20,30,40", (240, 320))
+        self.assertEqual(region.offset, (10, 20))
+        self.assertEqual(region.shape, (40, 30))
+        self.assertIsNone(region.mask)
+        self.assertAlmostEqual(region.area_ratio, 1200.0 / (240 * 320))
+
+    def test_crop_is_a_view(self):
+        region = roi.RegionOfInterest.from_string("10,20,30,40", (240, 320))
+        frame = numpy.zeros((240, 320, 3), numpy.uint8)
+        cropped = region.crop(frame)
+        self.assertEqual(cropped.shape, (40, 30, 3))
+        cropped[0, 0] = 255
+        self.assertEqual(frame[20, 10, 0], 255)
+
+    def test_rectangle_is_clipped_to_the_frame(self):
+        region = roi.RegionOfInterest.from_string("300,200,100,100",
+                                                  (240, 320))
+        self.assertEqual(region.shape, (40, 20))
+
+    def test_polygon_mask(self):
+        region = roi.RegionOfInterest.from_string("0,0;99,0;0,99",
+                                                  (240, 320))
+        self.assertEqual(region.shape, (100, 100))
+        fgmask = numpy.full(region.shape, 255, numpy.uint8)
+        region.apply_mask(fgmask)
+        self.assertEqual(fgmask[5, 5], 255)
+        self.assertEqual(fgmask[95, 95], 0)
+
+    def test_wrong_region(self):
+        self.assertRaises(roi.RegionOfInterestException,
+                          roi.RegionOfInterest.from_string, "1,2,3",
+                          (240, 320))
+        self.assertRaises(roi.RegionOfInterestException,
+                          roi.RegionOfInterest, [(1, 2)], (240, 320))
+
+    def test_trackpoints_in_the_full_frame(self):
+        region = roi.RegionOfInterest.from_string("100,50,100,100",
+                                                  (240, 320))
+        fgmask = numpy.zeros(region.shape, numpy.uint8)
+        fgmask[10:30, 20:60] = 255
+        trackpoints = objecttracker.get_trackpoints(fgmask, None, 0, region)
+        self.assertEqual(len(trackpoints), 1)
+        self.assertAlmostEqual(trackpoints[0].x, 100 + 39.5)
+        self.assertAlmostEqual(trackpoints[0].y, 50 + 19.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import os
+import sys
+import datetime
+import tempfile
+import shutil
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import segment
+
+
+class TestSegment(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        # Across the hour boundary.
+        start = datetime.datetime(2015, 5, 3, 12, 59, 58)
+        self.timestamps = [start + datetime.timedelta(seconds=i * 0.75)
+                           for i in range(6)]
+        writer = segment.SegmentWriter(self.path)
+        for i, timestamp in enumerate(self.timestamps):
+            writer.write(numpy.full((4, 6, 3), i, numpy.uint8), timestamp)
+        writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_a_segment_for_each_hour(self):
+        prefixes = segment.segment_prefixes(self.path)
+        self.assertEqual([os.path.basename(p) for p in prefixes],
+                         ["20150503T12", "20150503T13"])
+        self.assertTrue(all(segment.is_segment(p) for p in prefixes))
+        self.assertEqual([len(segment.SegmentReader(p)) for p in prefixes],
+                         [3, 3])
+
+    def test_round_trip(self):
+        frames = list(segment.read_frames(self.path))
+        self.assertEqual([timestamp for frame, timestamp in frames],
+                         self.timestamps)
+        for i, (frame, timestamp) in enumerate(frames):
+            self.assertEqual(frame.shape, (4, 6, 3))
+            self.assertTrue((frame == i).all())
+
+    def test_time_range(self):
+        frames = list(segment.read_frames(self.path, self.timestamps[1],
+                                          self.timestamps[4]))
+        self.assertEqual([timestamp for frame, timestamp in frames],
+                         self.timestamps[1:5])
+
+    def test_half_written_frame_is_skipped(self):
+        prefix = segment.segment_prefixes(self.path)[-1]
+        with open(prefix + segment.FRAMES_EXTENSION, "r+b") as f:
+            f.truncate(os.path.getsize(prefix + segment.FRAMES_EXTENSION) -
+                       1)
+        self.assertEqual(len(segment.SegmentReader(prefix)), 2)
+
+    def test_continue_a_segment(self):
+        writer = segment.SegmentWriter(self.path)
+        writer.write(numpy.zeros((4, 6, 3), numpy.uint8),
+                     datetime.datetime(2015, 5, 3, 13, 30))
+        # Frames of another shape can not be added.
+        self.assertRaises(segment.SegmentException, writer.write,
+                          numpy.zeros((4, 4, 3), numpy.uint8),
+                          datetime.datetime(2015, 5, 3, 13, 31))
+        writer.close()
+        reader = segment.SegmentReader(segment.segment_prefixes(self.path)[1])
+        self.assertEqual(len(reader), 4)
+        self.assertEqual(reader.find(datetime.datetime(2015, 5, 3, 13, 1)),
+                         3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import spatial_index
+
+
+class Item(object):
+
+    def __init__(self, x, y):
+        self.last_position = (x, y)
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def test_near(self):
+        index = spatial_index.GridIndex(10)
+        close, far = Item(12, 15), Item(80, 15)
+        index.sync([close, far])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.near(5, 5, 10), [close])
+        self.assertEqual(index.near(100, 100, 10), [])
+        self.assertEqual(len(index.near(40, 15, 40)), 2)
+
+    def test_negative_positions(self):
+        index = spatial_index.GridIndex(10)
+        item = Item(-3, -3)
+        index.add(item)
+        self.assertEqual(index.near(2, 2, 5), [item])
+
+    def test_update_moves_the_item(self):
+        index = spatial_index.GridIndex(10)
+        item = Item(5, 5)
+        index.update(item)
+        item.last_position = (95, 5)
+        index.update(item)
+        self.assertEqual(index.near(5, 5, 10), [])
+        self.assertEqual(index.near(95, 5, 10), [item])
+
+    def test_sync_and_remove(self):
+        index = spatial_index.GridIndex(10)
+        first, second = Item(5, 5), Item(6, 6)
+        index.sync([first, second])
+        index.sync([second])
+        self.assertNotIn(first, index)
+        self.assertIn(second, index)
+        index.remove(second)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index._cells, {})
+
+    def test_other_position(self):
+        index = spatial_index.GridIndex(10, position=lambda item: (0, 0))
+        item = Item(500, 500)
+        index.add(item)
+        self.assertEqual(index.near(0, 0, 1), [item])
+
+
+if __name__ == '__main__':
+    unittest.main()
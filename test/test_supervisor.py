@@ -0,0 +1,73 @@
+import unittest
+import os
+import sys
+import Queue
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
+
+from objecttracker import frame_queue
+from objecttracker import framebuffer
+from objecttracker import supervisor
+
+
+def dying_stage(buffer):
+    # Takes a slot and dies without releasing it.
+    buffer.write(numpy.zeros(buffer.shape, dtype=numpy.uint8))
+    os._exit(1)
+
+
+def source_stage(frames, stopping):
+    number = 0
+    while not stopping.is_set():
+        frames.put(number)
+        number += 1
+    frames.put_end()
+
+
+def counting_stage(frames, counts):
+    number_of_frames = 0
+    while frames.get() is not frame_queue.END_OF_FRAMES:
+        number_of_frames += 1
+    counts.put(number_of_frames)
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def test_restart_releases_the_slots_of_the_dead_stage(self):
+        buffer = framebuffer.FrameRingBuffer(1, (2, 2))
+        stages = supervisor.Supervisor(min_restart_interval=0)
+        stages.add_stage("Dying", dying_stage, (buffer, ))
+        stages.add_buffer(buffer)
+        stages.start()
+        stages.stages[0]["process"].join()
+
+        stages.check_stages()
+        stages.stages[0]["process"].join()
+        self.assertEqual(stages.stages[0]["restarts"], 1)
+        # The restarted stage got the slot again, and died with it.
+        self.assertRaises(Queue.Empty, buffer.acquire, True, 0.1)
+
+    def test_stop_passes_the_end_on(self):
+        stages = supervisor.Supervisor()
+        frames = frame_queue.FrameQueue(4)
+        counts = frame_queue.FrameQueue(1)
+        stages.add_stage("Source", source_stage, (frames, stages.stopping))
+        stages.add_stage("Counter", counting_stage, (frames, counts))
+        stages.start()
+        # The counter only reports at the end of the frames.
+        self.assertRaises(Queue.Empty, counts.get, True, 0.2)
+        stages.stop(timeout=10)
+        self.assertGreater(counts.get(timeout=1), 0)
+        for stage in stages.stages:
+            self.assertEqual(stage["process"].exitcode, 0)
+
+    def test_stats(self):
+        stages = supervisor.Supervisor()
+        queue = Queue.Queue()
+        queue.put(1)
+        stages.add_queue("Frames", queue)
+        self.assertEqual(stages.stats(1.0), "Frames: 1.")
+
+
+if __name__ == '__main__':
+    unittest.main()
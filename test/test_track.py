@@ -1,6 +1,7 @@
 import unittest
 import os
 import sys
+import pickle
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # test/..
 
 from objecttracker import track
@@ -82,6 +83,63 @@ class TestTracks(unittest.TestCase):
                          97.57078)
         self.assertIs(t_child_1.parent, t)
 
+    def test_running_aggregates(self):
+        points = [(0, 0, 10), (3, 4, 20), (6, 8, 30), (6, 0, 40)]
+        t = track.Track()
+        for i, (x, y, size) in enumerate(points):
+            t.add_trackpoint(trackpoint.Trackpoint(i, x, y, size=size))
+        self.assertEqual(t.total_length(), 18)
+        self.assertEqual(t.number_of_trackpoints(), 4)
+        self.assertEqual(t.sum_size(), 100)
+        self.assertEqual(t.size_avg(), 25)
+        self.assertEqual(t.linear_length(), 6)
+
+    def test_running_aggregates_of_connected_tracks(self):
+        t1 = track.Track()
+        t2 = track.Track()
+        for i, (x, y) in enumerate([(0, 0), (0, 10)]):
+            t1.add_trackpoint(trackpoint.Trackpoint(i, x, y, size=2))
+        for i, (x, y) in enumerate([(0, 20), (0, 25)]):
+            t2.add_trackpoint(trackpoint.Trackpoint(i, x, y, size=4))
+        t1.connect_tracks(t2)
+        self.assertEqual(t1.total_length(), 25)
+        self.assertEqual(t1.sum_size(), 12)
+        self.assertEqual(t1.number_of_trackpoints(), 4)
+
+    def test_parent_totals_follow_the_parent(self):
+        parent = track.Track()
+        parent.add_trackpoint(trackpoint.Trackpoint(0, 0, 0, size=1))
+        parent.add_trackpoint(trackpoint.Trackpoint(1, 0, 10, size=1))
+        child, _ = parent.split()
+        child.add_trackpoint(trackpoint.Trackpoint(2, 0, 20, size=1))
+        self.assertEqual(child.total_length(include_parents=True), 20)
+        self.assertEqual(child.number_of_trackpoints(include_parents=True), 3)
+
+        # The memoized parent totals must be recalculated.
+        parent.add_trackpoint(trackpoint.Trackpoint(3, 0, 15, size=1))
+        self.assertEqual(child.total_length(include_parents=True), 20)
+        self.assertEqual(child.number_of_trackpoints(include_parents=True), 4)
+        self.assertEqual(child.sum_size(include_parents=True), 4)
+
+    def test_trackpoints_are_read_from_the_columns(self):
+        t1 = track.Track()
+        t1.add_trackpoint(trackpoint.Trackpoint(0, 1, 2, size=3,
+                                                color=(4, 5, 6)))
+        t2 = track.Track()
+        t2.add_trackpoint(trackpoint.Trackpoint(1, 7, 8))
+        t1.connect_tracks(t2)
+        t1 = pickle.loads(pickle.dumps(t1, 2))
+
+        first_tp, last_tp = t1.trackpoints
+        self.assertEqual((first_tp.x, first_tp.y, first_tp.size),
+                         (1, 2, 3))
+        self.assertEqual(first_tp.color, (4, 5, 6))
+        self.assertEqual((last_tp.timestamp, last_tp.x, last_tp.y), (1, 7, 8))
+        self.assertIsNone(last_tp.size)
+        self.assertIsNone(last_tp.color)
+        self.assertEqual(t1.feature_averages()["color"], (4, 5, 6))
+        self.assertEqual(t1.positions.tolist(), [[1, 2], [7, 8]])
+
     def test_save_track(self):
         trackpoints_1 = [(10, 25), (15, 25), (20, 30),
                          (25, 30), (30, 40), (35, 35)]